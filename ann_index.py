@@ -0,0 +1,190 @@
+# ann_index.py
+# Índice aproximado (IVF) em NumPy puro para o memory_store
+# - quantizador grosso por k-means esférico (cosseno)
+# - listas invertidas com insert/delete incrementais
+# - nprobe = quantas listas visitar por consulta (recall x velocidade)
+from __future__ import annotations
+import os, threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+class _Bucket:
+    """Lista invertida: ids + vetores em arrays que crescem em dobro."""
+    __slots__ = ("ids", "vecs", "n")
+
+    def __init__(self, dim: int, cap: int = 64):
+        self.ids = np.zeros(cap, dtype=np.int64)
+        self.vecs = np.zeros((cap, dim), dtype=np.float32)
+        self.n = 0
+
+    def add(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        need = self.n + len(ids)
+        if need > len(self.ids):
+            cap = max(need, 2 * len(self.ids))
+            self.ids = np.resize(self.ids, cap)
+            self.vecs = np.resize(self.vecs, (cap, self.vecs.shape[1]))
+        self.ids[self.n:need] = ids
+        self.vecs[self.n:need] = vecs
+        self.n = need
+
+    def remove(self, nid: int) -> bool:
+        pos = np.flatnonzero(self.ids[:self.n] == nid)
+        if not len(pos):
+            return False
+        p, last = int(pos[0]), self.n - 1  # troca com o último
+        self.ids[p], self.vecs[p] = self.ids[last], self.vecs[last]
+        self.n = last
+        return True
+
+def _nearest(x: np.ndarray, cent: np.ndarray, block: int = 16384) -> np.ndarray:
+    # argmax de x @ cent.T em blocos (não materializa a matriz N x nlist inteira)
+    out = np.empty(len(x), dtype=np.int64)
+    for lo in range(0, len(x), block):
+        out[lo:lo + block] = np.argmax(x[lo:lo + block] @ cent.T, axis=1)
+    return out
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    # k-means esférico: centróides normalizados, atribuição por produto interno
+    rng = np.random.default_rng(seed)
+    cent = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, cent)
+        sums = np.zeros_like(cent)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():  # re-semeia listas vazias
+            sums[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        cent = sums / np.where(norms == 0, 1.0, norms)
+    return cent.astype(np.float32)
+
+class IVFIndex:
+    """Inverted-file index sobre vetores unitários (score = produto interno)."""
+
+    def __init__(self, dim: int, nlist: Optional[int] = None, nprobe: int = 8,
+                 min_train: int = 4096, retrain_factor: float = 4.0):
+        self.dim = dim
+        self.nlist = nlist            # None = ~sqrt(N) no treino
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self.centroids: Optional[np.ndarray] = None
+        self.buckets: Dict[int, _Bucket] = {}
+        self.where: Dict[int, int] = {}   # id -> lista
+        self.trained_n = 0
+        self.last_id = 0
+        self.dirty = False              # vetores adicionados/removidos depois do último save
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        """(Re)constrói os centróides e redistribui todos os vetores dados."""
+        with self.lock:
+            n = len(ids)
+            k = self.nlist or max(1, min(n, int(np.sqrt(n))))
+            sample = vecs
+            if n > 32 * k:
+                sample = vecs[np.random.default_rng(0).choice(n, size=32 * k, replace=False)]
+            self.centroids = _kmeans(np.asarray(sample, dtype=np.float32), k)
+            self.buckets, self.where = {}, {}
+            self.trained_n = n
+            self._assign(ids, vecs)
+
+    def _assign(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        lists = _nearest(vecs, self.centroids)
+        order = np.argsort(lists, kind="stable")
+        lists, ids, vecs = lists[order], ids[order], vecs[order]
+        bounds = np.flatnonzero(np.diff(lists)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(lists)]):
+            li = int(lists[lo])
+            b = self.buckets.get(li)
+            if b is None:
+                b = self.buckets[li] = _Bucket(self.dim)
+            b.add(ids[lo:hi], vecs[lo:hi])
+            self.where.update(dict.fromkeys(ids[lo:hi].tolist(), li))
+
+    def add(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        vecs = np.asarray(vecs, dtype=np.float32).reshape(len(ids), self.dim)
+        if not len(ids):
+            return
+        with self.lock:
+            if self.trained:
+                self._assign(ids, vecs)
+                self.dirty = True
+            self.last_id = max(self.last_id, int(ids.max()))
+
+    def remove(self, nid: int) -> bool:
+        with self.lock:
+            li = self.where.pop(int(nid), None)
+            if li is None:
+                return False
+            self.dirty = True
+            return self.buckets[li].remove(int(nid))
+
+    def needs_training(self, n_total: int) -> bool:
+        if n_total < self.min_train:
+            return False
+        return not self.trained or n_total > self.retrain_factor * self.trained_n
+
+    def search(self, q: np.ndarray, top_k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            probe = max(1, min(nprobe or self.nprobe, len(self.centroids)))
+            cs = self.centroids @ q
+            lists = np.argpartition(-cs, probe - 1)[:probe]
+            bs = [self.buckets[int(li)] for li in lists if int(li) in self.buckets]
+            bs = [b for b in bs if b.n]
+            if not bs:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            ids = np.concatenate([b.ids[:b.n] for b in bs])
+            vecs = np.concatenate([b.vecs[:b.n] for b in bs])
+        scores = vecs @ q
+        if top_k < len(scores):
+            pos = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            pos = np.arange(len(scores))
+        pos = pos[np.argsort(-scores[pos], kind="stable")]
+        return ids[pos], scores[pos]
+
+    # --- persistência (arquivo .npz ao lado do banco) ---
+    def save(self, path: str) -> None:
+        with self.lock:
+            if not self.trained:
+                return
+            keys = sorted(self.buckets)
+            tmp = path + ".tmp.npz"
+            np.savez(tmp,
+                     meta=np.asarray([self.dim, self.nprobe, self.trained_n, self.last_id], dtype=np.int64),
+                     centroids=self.centroids,
+                     lists=np.asarray(keys, dtype=np.int64),
+                     sizes=np.asarray([self.buckets[k].n for k in keys], dtype=np.int64),
+                     ids=np.concatenate([self.buckets[k].ids[:self.buckets[k].n] for k in keys] or [np.zeros(0, np.int64)]),
+                     vecs=np.concatenate([self.buckets[k].vecs[:self.buckets[k].n] for k in keys]
+                                         or [np.zeros((0, self.dim), np.float32)]))
+            os.replace(tmp, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path: str, **kw) -> Optional["IVFIndex"]:
+        if not os.path.exists(path):
+            return None
+        z = np.load(path)
+        dim, nprobe, trained_n, last_id = (int(v) for v in z["meta"])
+        idx = cls(dim, nprobe=kw.pop("nprobe", nprobe), **kw)
+        idx.centroids = z["centroids"]
+        idx.trained_n, idx.last_id = trained_n, last_id
+        ids, vecs, off = z["ids"], z["vecs"], 0
+        for li, size in zip(z["lists"].tolist(), z["sizes"].tolist()):
+            b = idx.buckets[li] = _Bucket(dim, cap=max(64, size))
+            b.add(ids[off:off + size], vecs[off:off + size])
+            idx.where.update(dict.fromkeys(ids[off:off + size].tolist(), li))
+            off += size
+        return idx
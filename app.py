@@ -2,10 +2,21 @@ import os
 import io
 import json
 import time
+import asyncio
 import logging
+import importlib
+import contextvars
+import uuid
+import codecs
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
 from typing import List, Dict, Any, Tuple, Optional
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+import httpx
+import numpy as np
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.responses import StreamingResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -24,8 +35,44 @@ if not OPENAI_API_KEY:
 API_ACCESS_TOKEN = os.getenv("API_ACCESS_TOKEN", "")
 
 # OpenAI SDK >= 1.x
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 client = OpenAI(api_key=OPENAI_API_KEY)
+# Cliente assíncrono com um único pool HTTP compartilhado por todas as cadeias em voo
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+aclient = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+    timeout=httpx.Timeout(120.0, connect=10.0),
+))
+
+# Cache de respostas do LLM (memória + SQLite); LLM_CACHE=0 desliga.
+# Com LLM_CACHE_MAX_TEMPERATURE=0.0 (padrão) as etapas do /run (temperaturas 0.2 a 0.5) não são cacheadas;
+# 0.5 inclui a cadeia inteira (a mesma pergunta passa a receber sempre a mesma resposta).
+from llm_cache import LLMCache
+LLM_CACHE = LLMCache(
+    path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite") or None,
+    max_items=int(os.getenv("LLM_CACHE_MAX_ITEMS", "1024")),
+    max_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "50000")),
+    ttl_s=float(os.getenv("LLM_CACHE_TTL_S", str(7 * 86400))),
+    max_temperature=float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0")),
+) if os.getenv("LLM_CACHE", "1") != "0" else None
+
+from memory_store import embed as hash_embed
+from semantic_cache import SemanticCache
+from guardian import Guardian, EarlyAbortStats
+from singleflight import SingleFlight, default_key
+from batch import RateLimiter, run_bounded
+from token_budget import TokenCounter, fit_sections
+from session_memory import SessionStore
+from query_cache import QueryCache
+from chunker import Chunker, Chunk
+from local_vectors import HashingEmbedding, LocalCollection
+
+# Executor para trabalho bloqueante (Chroma, PDF) fora do event loop
+IO_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("IO_WORKERS", "16")), thread_name_prefix="io")
+
+async def offload(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_POOL, lambda: fn(*args, **kwargs))
 
 # Logging simples
 logging.basicConfig(level=logging.INFO)
@@ -38,11 +85,44 @@ try:
 except Exception:
     CHROMA_AVAILABLE = False
 
+# Backend da memória longa: chroma (padrão) | local (NumPy + memmap, local_vectors.py) | auto (chroma se instalado)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").strip().lower()
+if VECTOR_BACKEND == "auto":
+    VECTOR_BACKEND = "chroma" if CHROMA_AVAILABLE else "local"
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_store")
+LONG_MEMORY_AVAILABLE = CHROMA_AVAILABLE or VECTOR_BACKEND == "local"
+
+# Orçamento de tokens do bloco de contexto (por requisição: RunRequest.context_tokens)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_PRIORITY = [p.strip() for p in os.getenv("CONTEXT_PRIORITY", "long,short").split(",") if p.strip()]
+TOKENS = TokenCounter(MODEL)
+
+# Fatiamento do KB: documentos viram chunks "<doc_id>#<n>" com metadados parent_id/chunk
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "300"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "50"))
+KB_WRITE_BATCH = int(os.getenv("KB_WRITE_BATCH", "256"))  # chunks por collection.upsert
+KB_CHUNK_FANOUT = 4  # chunks buscados por documento pedido, antes de agrupar por pai
+
 class Memory:
     def __init__(self, collection_name: str = "colabIA"):
-        self.short_context: List[str] = []
-        self.max_short = 10
-        if CHROMA_AVAILABLE:
+        # memória curta por sessão (RunRequest.session_id); sem session_id todos caem na sessão padrão
+        self.max_short = int(os.getenv("SHORT_MEMORY_SIZE", "10"))
+        self.sessions = SessionStore(
+            max_entries=self.max_short,
+            max_sessions=int(os.getenv("SHORT_MEMORY_MAX_SESSIONS", "10000")),
+            ttl_s=float(os.getenv("SHORT_MEMORY_TTL_S", "3600")),
+        )
+        # embeddings de consulta e resultados da busca em cache; add/update sobem a época e invalidam resultados
+        self.qcache = QueryCache(
+            max_embeddings=int(os.getenv("RETRIEVAL_CACHE_EMBEDDINGS", "4096")),
+            max_results=int(os.getenv("RETRIEVAL_CACHE_RESULTS", "2048")),
+            ttl_s=float(os.getenv("RETRIEVAL_CACHE_TTL_S", "300")),
+        )
+        if VECTOR_BACKEND == "local":
+            # mesmo modelo do Chroma se o pacote estiver instalado; senão embedding por hashing (sem download)
+            self.emb_fn = embedding_functions.DefaultEmbeddingFunction() if CHROMA_AVAILABLE else HashingEmbedding()
+            self.collection = LocalCollection(os.path.join(VECTOR_STORE_PATH, collection_name), self.emb_fn)
+        elif CHROMA_AVAILABLE:
             self.chroma_client = chromadb.PersistentClient(path="./chroma_store")
             self.emb_fn = embedding_functions.DefaultEmbeddingFunction()
             self.collection = self.chroma_client.get_or_create_collection(
@@ -51,36 +131,128 @@ class Memory:
         else:
             self.collection = None
 
-    def push_short(self, text: str):
-        self.short_context.append(text)
-        if len(self.short_context) > self.max_short:
-            self.short_context.pop(0)
+    def push_short(self, text: str, session_id: Optional[str] = None):
+        self.sessions.push(text, session_id)
+
+    def short_context(self, session_id: Optional[str] = None) -> List[str]:
+        return self.sessions.get(session_id)
 
     def add_long(self, doc_id: str, text: str, meta: Dict[str, Any] = None):
-        if not CHROMA_AVAILABLE:
-            raise RuntimeError("ChromaDB indisponível no momento.")
+        if not LONG_MEMORY_AVAILABLE:
+            raise RuntimeError("Memória longa indisponível no momento.")
         self.collection.add(documents=[text], metadatas=[meta or {}], ids=[doc_id])
+        self.qcache.bump()
 
     def update_long(self, doc_id: str, text: str, meta: Dict[str, Any] = None):
-        if not CHROMA_AVAILABLE:
-            raise RuntimeError("ChromaDB indisponível no momento.")
-        try:
-            self.collection.delete(ids=[doc_id])
-        except Exception:
-            pass
-        self.add_long(doc_id, text, meta)
+        self.upsert_long_batch([(doc_id, text, meta)])
 
-    def retrieve_long(self, query: str, k: int = 3) -> List[str]:
-        if not CHROMA_AVAILABLE:
+    @staticmethod
+    def chunker() -> Chunker:
+        return Chunker(KB_CHUNK_TOKENS, KB_CHUNK_OVERLAP, TOKENS.count_raw)
+
+    @staticmethod
+    def chunk_rows(doc_id: str, chunks: List[Chunk], meta: Optional[Dict[str, Any]] = None):
+        base = {k: v for k, v in (meta or {}).items() if v is not None}
+        rows = []
+        for c in chunks:
+            m = {**base, "parent_id": doc_id, "chunk": c.index}
+            if c.heading:
+                m["heading"] = c.heading
+            rows.append((f"{doc_id}#{c.index}", c.text, m))
+        return rows
+
+    def write_rows(self, rows: List[Tuple[str, str, Dict[str, Any]]]):
+        """collection.upsert em lotes de KB_WRITE_BATCH, embeddings calculados por lote."""
+        if not LONG_MEMORY_AVAILABLE:
+            raise RuntimeError("Memória longa indisponível no momento.")
+        for i in range(0, len(rows), KB_WRITE_BATCH):
+            part = rows[i:i + KB_WRITE_BATCH]
+            texts = [t for _, t, _ in part]
+            self.collection.upsert(ids=[r[0] for r in part], documents=texts,
+                                   metadatas=[r[2] for r in part], embeddings=self.emb_fn(texts))
+        self.qcache.bump()
+
+    def finish_docs(self, counts: Dict[str, int]):
+        """Remove chunks de versões anteriores (índice >= nº atual) e a entrada antiga sem fatiar."""
+        if not counts:
+            return
+        conds = [{"$and": [{"parent_id": d}, {"chunk": {"$gte": n}}]} for d, n in counts.items()]
+        self.collection.delete(where=conds[0] if len(conds) == 1 else {"$or": conds})
+        self.collection.delete(ids=list(counts))
+        self.qcache.bump()
+
+    def upsert_long_batch(self, docs: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        """Fatia cada documento e grava os chunks do lote todo; chunks velhos do mesmo doc_id saem depois."""
+        if not LONG_MEMORY_AVAILABLE:
+            raise RuntimeError("Memória longa indisponível no momento.")
+        rows, counts = [], {}
+        for doc_id, text, meta in docs:
+            ch = self.chunker()
+            doc_rows = self.chunk_rows(doc_id, ch.feed(text) + ch.close(), meta)
+            counts[doc_id] = len(doc_rows)
+            rows += doc_rows
+        if rows:
+            self.write_rows(rows)
+        self.finish_docs(counts)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.qcache.embedding(query, lambda q: list(map(float, self.emb_fn([q])[0])))
+
+    def retrieve_chunks(self, query: str, n: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Chunks mais próximos, em ordem de relevância: (id, texto, metadados)."""
+        if not LONG_MEMORY_AVAILABLE:
             return []
-        res = self.collection.query(query_texts=[query], n_results=k)
-        return res.get("documents", [[]])[0] if res else []
+        res = self.collection.query(query_embeddings=[self.embed_query(query)], n_results=n,
+                                    include=["documents", "metadatas"])
+        if not res:
+            return []
+        ids, docs = res.get("ids", [[]])[0], res.get("documents", [[]])[0]
+        metas = (res.get("metadatas") or [[]])[0] or [{}] * len(ids)
+        return [(i, d, m or {}) for i, d, m in zip(ids, docs, metas)]
+
+    def retrieve_long_with_ids(self, query: str, k: int = 3) -> List[Tuple[str, str]]:
+        """Top-k documentos: os chunks achados são agrupados por parent_id (ordem do melhor chunk de cada
+        documento) e os trechos de um mesmo documento voltam juntos, na ordem em que aparecem nele."""
+        if not LONG_MEMORY_AVAILABLE:
+            return []
+        def search():
+            groups: "OrderedDict[str, List[Tuple[int, str]]]" = OrderedDict()
+            for cid, doc, meta in self.retrieve_chunks(query, k * KB_CHUNK_FANOUT):
+                parent = meta.get("parent_id", cid)  # entradas sem fatiar (ex.: logs) são o próprio pai
+                if parent in groups or len(groups) < k:
+                    groups.setdefault(parent, []).append((meta.get("chunk", 0), doc))
+            return [(p, "\n[…]\n".join(t for _, t in sorted(parts))) for p, parts in groups.items()]
+        return list(self.qcache.result(query, k, search))
 
-    def context_block(self, query: str) -> str:
-        long_hits = self.retrieve_long(query, k=3)
-        short = "\n".join(self.short_context[-self.max_short:])
-        longb = "\n".join(long_hits)
-        return f"## CONTEXTO CURTO\n{short}\n\n## CONTEXTO LONGO\n{longb}".strip()
+    def retrieve_long(self, query: str, k: int = 3) -> List[str]:
+        return [doc for _, doc in self.retrieve_long_with_ids(query, k=k)]
+
+    def context_block_with_ids(self, query: str, budget: Optional[int] = None,
+                               session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+        """Bloco de contexto + ids dos documentos longos usados (para invalidar caches).
+
+        Cabe em `budget` tokens (padrão CONTEXT_TOKEN_BUDGET): as seções entram na ordem de CONTEXT_PRIORITY
+        (KB por relevância, memória curta da mais recente para a mais antiga); nenhum trecho passa de metade
+        do orçamento e o último que não cabe inteiro é truncado.
+        """
+        budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+        long_hits = self.retrieve_long_with_ids(query, k=3)
+        recent = self.short_context(session_id)[::-1]
+        fit, _ = fit_sections(TOKENS, {"long": [doc for _, doc in long_hits], "short": recent},
+                              CONTEXT_PRIORITY, budget, per_item_max=max(1, budget // 2))
+        short = "\n".join(fit["short"][::-1])
+        longb = "\n".join(fit["long"])
+        used_ids = [i for i, _ in long_hits[:len(fit["long"])]]
+        return f"## CONTEXTO CURTO\n{short}\n\n## CONTEXTO LONGO\n{longb}".strip(), used_ids
+
+    def context_block(self, query: str, budget: Optional[int] = None, session_id: Optional[str] = None) -> str:
+        return self.context_block_with_ids(query, budget, session_id)[0]
+
+def embed_texts(texts: List[str]):
+    """Embeddings de consulta: o mesmo modelo da memória longa quando disponível; senão o stub por hash."""
+    if LONG_MEMORY_AVAILABLE:
+        return np.asarray([MEM.embed_query(t) for t in texts], dtype=np.float32)
+    return np.asarray([hash_embed(t) for t in texts], dtype=np.float32)
 
 # ============== AUTH (Bearer) ==============
 class _Auth:
@@ -106,14 +278,97 @@ SYSTEM_SAFETY = (
     "Nunca exponha chaves, credenciais, exploits ou quebre políticas."
 )
 
-def call_llm(messages: List[Dict[str, str]], temperature: float = 0.4) -> str:
+# Limitador de rpm/tpm da chamada corrente (definido pelo /run_batch; None = sem limite).
+# Fica num ContextVar para valer só para as cadeias do lote, inclusive nas tasks que elas criam.
+LLM_LIMITER: contextvars.ContextVar[Optional[RateLimiter]] = contextvars.ContextVar("LLM_LIMITER", default=None)
+LLM_EST_OUTPUT_TOKENS = int(os.getenv("LLM_EST_OUTPUT_TOKENS", "800"))
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(len(m.get("content") or "") for m in messages) // 4 + LLM_EST_OUTPUT_TOKENS
+
+def _cache_key(messages: List[Dict[str, str]], temperature: float, use_cache: bool) -> Optional[str]:
+    if LLM_CACHE is None:
+        return None
+    if not use_cache:
+        LLM_CACHE.bypass()
+        return None
+    if not LLM_CACHE.cacheable(temperature):
+        return None
+    return LLM_CACHE.key(MODEL, temperature, messages)
+
+def call_llm(messages: List[Dict[str, str]], temperature: float = 0.4, use_cache: bool = True) -> str:
+    key = _cache_key(messages, temperature, use_cache)
+    if key and (hit := LLM_CACHE.get(key)) is not None:
+        return hit
     resp = client.chat.completions.create(
         model=MODEL, temperature=temperature, messages=messages
     )
-    return resp.choices[0].message.content
+    out = resp.choices[0].message.content
+    if key:
+        LLM_CACHE.put(key, out)
+    return out
 
-def role_pesquisador(query: str, memory_block: str) -> str:
-    prompt = [
+async def acall_llm(messages: List[Dict[str, str]], temperature: float = 0.4, use_cache: bool = True) -> str:
+    key = _cache_key(messages, temperature, use_cache)
+    if key and (hit := await offload(LLM_CACHE.get, key)) is not None:  # SQLite fora do event loop
+        return hit
+    limiter, est = LLM_LIMITER.get(), 0
+    if limiter is not None:
+        est = _estimate_tokens(messages)
+        await limiter.acquire(est)
+    resp = await aclient.chat.completions.create(
+        model=MODEL, temperature=temperature, messages=messages
+    )
+    if limiter is not None and getattr(resp, "usage", None):
+        limiter.settle(est, resp.usage.total_tokens)
+    out = resp.choices[0].message.content
+    if key:
+        await offload(LLM_CACHE.put, key, out)
+    return out
+
+async def astream_llm(messages: List[Dict[str, str]], temperature: float = 0.4, use_cache: bool = True,
+                      info: Optional[Dict[str, Any]] = None):
+    """Gera os pedaços de texto da resposta conforme chegam (stream=True).
+
+    Se `info` for dado, recebe info["cached"] = True quando a resposta veio do LLM_CACHE (um pedaço só).
+    """
+    key = _cache_key(messages, temperature, use_cache)
+    if key and (hit := await offload(LLM_CACHE.get, key)) is not None:
+        if info is not None:
+            info["cached"] = True
+        yield hit
+        return
+    limiter, est, extra = LLM_LIMITER.get(), 0, {}
+    if limiter is not None:
+        est = _estimate_tokens(messages)
+        await limiter.acquire(est)
+        extra["stream_options"] = {"include_usage": True}  # uso real no último evento, para o settle
+    stream = await aclient.chat.completions.create(
+        model=MODEL, temperature=temperature, messages=messages, stream=True, **extra
+    )
+    parts, usage = [], None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+    finally:
+        # se o consumidor parar antes do fim (ex.: guardião), fecha a conexão e a geração é cancelada
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+        if limiter is not None:
+            # cortada antes do evento de uso: cobra o prompt + o que foi gerado até ali
+            actual = usage.total_tokens if usage is not None else \
+                TOKENS.count_messages(messages) + TOKENS.count("".join(parts))
+            limiter.settle(est, actual)
+    if key:
+        await offload(LLM_CACHE.put, key, "".join(parts))
+
+def prompt_pesquisador(query: str, memory_block: str) -> List[Dict[str, str]]:
+    return [
         {"role": "system", "content": SYSTEM_SAFETY},
         {"role": "user", "content": (
             f"[PAPEL: PESQUISADOR]\n"
@@ -123,10 +378,9 @@ def role_pesquisador(query: str, memory_block: str) -> str:
             "Saída em tópicos curtos e objetivos."
         )}
     ]
-    return call_llm(prompt)
 
-def role_sintetizador(pesquisa: str) -> str:
-    prompt = [
+def prompt_sintetizador(pesquisa: str) -> List[Dict[str, str]]:
+    return [
         {"role": "system", "content": SYSTEM_SAFETY},
         {"role": "user", "content": (
             f"[PAPEL: SINTETIZADOR]\n"
@@ -135,10 +389,9 @@ def role_sintetizador(pesquisa: str) -> str:
             "deixando claro o raciocínio em passos."
         )}
     ]
-    return call_llm(prompt)
 
-def role_executor(esboco: str, formato: str = "texto") -> str:
-    prompt = [
+def prompt_executor(esboco: str, formato: str = "texto") -> List[Dict[str, str]]:
+    return [
         {"role": "system", "content": SYSTEM_SAFETY},
         {"role": "user", "content": (
             f"[PAPEL: EXECUTOR]\n"
@@ -147,15 +400,53 @@ def role_executor(esboco: str, formato: str = "texto") -> str:
             "Tarefa: produzir a versão final coerente, pronta para uso."
         )}
     ]
-    return call_llm(prompt, temperature=0.5)
+
+def prompt_feedback(fb_text: str, draft_exec: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_SAFETY},
+        {"role": "user", "content": (
+            f"[REVISÃO COM FEEDBACK HUMANO]\n"
+            f"Feedback: {fb_text}\n\n"
+            f"Texto a revisar:\n{draft_exec}\n\n"
+            "Aplique o feedback preservando coerência e clareza."
+        )}
+    ]
+
+def prompt_resumo(draft_exec: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_SAFETY},
+        {"role": "user", "content": (
+            f"Resuma em 8-12 linhas (objetivo, decisões, pontos-chave):\n{draft_exec}"
+        )}
+    ]
+
+def role_pesquisador(query: str, memory_block: str) -> str:
+    return call_llm(prompt_pesquisador(query, memory_block))
+
+def role_sintetizador(pesquisa: str) -> str:
+    return call_llm(prompt_sintetizador(pesquisa))
+
+def role_executor(esboco: str, formato: str = "texto") -> str:
+    return call_llm(prompt_executor(esboco, formato), temperature=0.5)
+
+async def arole_pesquisador(query: str, memory_block: str) -> str:
+    return await acall_llm(prompt_pesquisador(query, memory_block))
+
+async def arole_sintetizador(pesquisa: str) -> str:
+    return await acall_llm(prompt_sintetizador(pesquisa))
+
+async def arole_executor(esboco: str, formato: str = "texto") -> str:
+    return await acall_llm(prompt_executor(esboco, formato), temperature=0.5)
 
 # ============== GUARDIÃO ==============
+# Termos em policy.yaml (seção guardian), compilados num autômato único e recarregados a quente
+GUARDIAN = Guardian(os.getenv("POLICY_PATH", "policy.yaml"))
+# Com GUARDIAN_STREAMING=1 as etapas são geradas em streaming e cortadas na primeira violação
+GUARDIAN_STREAMING = os.getenv("GUARDIAN_STREAMING", "1") != "0"
+EARLY_ABORTS = EarlyAbortStats()
+
 def guardian_check(text: str) -> Tuple[bool, str]:
-    banned = ["exploit", "malware", "doxxing", "private key", "senha="]
-    for b in banned:
-        if b.lower() in text.lower():
-            return False, f"Conteúdo bloqueado por política ('{b}')."
-    return True, "OK"
+    return GUARDIAN.check(text)
 
 # ============== MODELOS (Pydantic) ==============
 class RunRequest(BaseModel):
@@ -163,6 +454,15 @@ class RunRequest(BaseModel):
     formato: str = "texto"
     request_id: Optional[str] = None
     apply_feedback: bool = True
+    no_cache: bool = False  # ignora o cache de respostas do LLM nesta requisição
+    context_tokens: Optional[int] = None  # orçamento do bloco de contexto (padrão CONTEXT_TOKEN_BUDGET)
+    session_id: Optional[str] = None  # memória curta isolada por sessão
+
+class RunBatchRequest(BaseModel):
+    items: List[RunRequest]
+    concurrency: Optional[int] = None  # padrão BATCH_CONCURRENCY
+    rpm: Optional[float] = None        # padrão BATCH_RPM (0 = sem limite)
+    tpm: Optional[float] = None        # padrão BATCH_TPM (0 = sem limite)
 
 class FeedbackRequest(BaseModel):
     request_id: str
@@ -176,6 +476,7 @@ class RunResponse(BaseModel):
     resumo: Optional[str] = None
     blocked_step: Optional[str] = None
     reason: Optional[str] = None
+    prompt_tokens: Optional[int] = None  # tokens do prompt do pesquisador (o que carrega o contexto)
 
 # KB
 class KBUpsertReq(BaseModel):
@@ -218,6 +519,7 @@ class CRMLookupResp(BaseModel):
 class EvalRequest(BaseModel):
     query: str
     formato: str = "texto"
+    no_cache: bool = False
     required: List[str] = []
     prohibited: List[str] = []
     min_hits: int = 1
@@ -245,6 +547,31 @@ class CRMOfferResp(BaseModel):
 app = FastAPI(title="Colaborativo IA API", version="1.2.0")
 MEM = Memory()
 
+# Cache semântico na frente do /run (SEMANTIC_CACHE=0 desliga)
+SEMANTIC_CACHE = SemanticCache(
+    embed_texts,
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX", "2000")),
+    ttl_s=float(os.getenv("SEMANTIC_CACHE_TTL_S", "86400")),
+) if os.getenv("SEMANTIC_CACHE", "1") != "0" else None
+
+# Coalescência de requisições idênticas em voo (/run, /run_pdf, /eval, /kb_query); SINGLEFLIGHT=0 desliga.
+# SINGLEFLIGHT_KEY_FN="modulo:funcao" troca a função de chave (recebe endpoint e corpo, devolve str).
+def flight_key(namespace: str, body: Any) -> str:
+    # request_id só diferencia cópias quando há feedback pendente para ele (é o único uso na cadeia)
+    if isinstance(body, RunRequest) and not (body.apply_feedback and body.request_id and HF.has(body.request_id)):
+        body = body.model_copy(update={"request_id": None})
+    return default_key(namespace, body)
+
+def _load_key_fn(spec: str):
+    mod, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(mod), attr)
+
+FLIGHTS = SingleFlight(
+    key_fn=_load_key_fn(os.environ["SINGLEFLIGHT_KEY_FN"]) if os.getenv("SINGLEFLIGHT_KEY_FN") else flight_key,
+    enabled=os.getenv("SINGLEFLIGHT", "1") != "0",
+)
+
 # UI estática em /ui (sirva ./static/index.html)
 app.mount("/ui", StaticFiles(directory="static", html=True), name="ui")
 
@@ -280,6 +607,20 @@ CRM_DB: Dict[str, CRMRecord] = {
 def health():
     return {"ok": True}
 
+# ============== MÉTRICAS (com auth) ==============
+@app.get("/stats")
+def stats(_=Depends(auth_required)):
+    return {"llm_cache": LLM_CACHE.stats() if LLM_CACHE else None,
+            "semantic_cache": SEMANTIC_CACHE.stats() if SEMANTIC_CACHE else None,
+            "guardian_early_abort": EARLY_ABORTS.stats(),
+            "singleflight": FLIGHTS.stats(),
+            "batch_limiter": BATCH_LIMITER.stats(),
+            "token_counts": TOKENS.stats(),
+            "short_memory": MEM.sessions.stats(),
+            "retrieval_cache": MEM.qcache.stats(),
+            "vector_backend": {"backend": VECTOR_BACKEND if LONG_MEMORY_AVAILABLE else None,
+                               "documents": MEM.collection.count() if MEM.collection is not None else 0}}
+
 # ============== FEEDBACK (com auth) ==============
 class FeedbackStore:
     def __init__(self):
@@ -288,6 +629,8 @@ class FeedbackStore:
         self._store[request_id] = feedback
     def pop(self, request_id: str) -> str:
         return self._store.pop(request_id, "")
+    def has(self, request_id: str) -> bool:
+        return request_id in self._store
 
 HF = FeedbackStore()
 
@@ -297,56 +640,244 @@ def set_feedback(req: FeedbackRequest, _=Depends(auth_required)):
     return {"ok": True}
 
 # ============== ORQUESTRADOR (com auth) ==============
-@app.post("/run", response_model=RunResponse)
-def run(req: RunRequest, _=Depends(auth_required)):
-    ctx = MEM.context_block(req.query)
-
-    draft_pesq = role_pesquisador(req.query, ctx)
-    MEM.push_short(f"[pesquisador]\n{draft_pesq}")
-    ok, why = guardian_check(draft_pesq)
-    if not ok:
-        return RunResponse(status="blocked", blocked_step="pesquisador", reason=why)
-
-    draft_synth = role_sintetizador(draft_pesq)
-    MEM.push_short(f"[sintetizador]\n{draft_synth}")
-    ok, why = guardian_check(draft_synth)
-    if not ok:
-        return RunResponse(status="blocked", blocked_step="sintetizador", reason=why)
-
-    draft_exec = role_executor(draft_synth, formato=req.formato)
-    MEM.push_short(f"[executor]\n{draft_exec}")
-    ok, why = guardian_check(draft_exec)
-    if not ok:
-        return RunResponse(status="blocked", blocked_step="executor", reason=why)
+def semantic_namespace(req: RunRequest) -> str:
+    # a resposta depende do formato e do contexto do pesquisador: memória curta da sessão + orçamento de tokens
+    return f"{req.formato}|{req.session_id or '-'}|{req.context_tokens or CONTEXT_TOKEN_BUDGET}"
 
+async def run_chain_events(req: RunRequest, stream_tokens: bool = False):
+    """Cadeia completa como sequência de eventos (nome, dados); o último é sempre "result".
+
+    Eventos: cache {similarity, query} (acerto no cache semântico), stage {stage, status: start|end},
+    token {stage, text} (executor, se stream_tokens), guardian {stage, ok, reason} e result {RunResponse}.
+    """
+    use_cache = not req.no_cache
+    qvec = None
+    pending_fb = req.apply_feedback and req.request_id and HF.has(req.request_id)
+    if SEMANTIC_CACHE is not None and use_cache and not pending_fb:
+        qvec = await offload(SEMANTIC_CACHE.embed, req.query)
+        hit = SEMANTIC_CACHE.lookup(qvec, namespace=semantic_namespace(req))
+        if hit:
+            yield "cache", {"similarity": round(hit["similarity"], 4), "query": hit["query"]}
+            resp = dict(hit["response"])
+            # o turno entra na memória curta da sessão como se a cadeia tivesse rodado
+            for stage, field in (("pesquisador", "pesquisa"), ("sintetizador", "esboco"), ("executor", "resultado")):
+                MEM.push_short(f"[{stage}]\n{resp[field]}", req.session_id)
+            yield "result", resp
+            return
+
+    yield "stage", {"stage": "contexto", "status": "start"}
+    ctx, ctx_doc_ids = await offload(MEM.context_block_with_ids, req.query, req.context_tokens, req.session_id)
+    prompt_tokens = TOKENS.count_messages(prompt_pesquisador(req.query, ctx))
+    yield "stage", {"stage": "contexto", "status": "end", "prompt_tokens": prompt_tokens}
+
+    llm_calls = 0
+    drafts: Dict[str, str] = {}
+    steps = [
+        ("pesquisador", lambda: prompt_pesquisador(req.query, ctx), 0.4),
+        ("sintetizador", lambda: prompt_sintetizador(drafts["pesquisador"]), 0.4),
+        ("executor", lambda: prompt_executor(drafts["sintetizador"], req.formato), 0.5),
+    ]
+    for stage, build, temp in steps:
+        yield "stage", {"stage": stage, "status": "start"}
+        if GUARDIAN_STREAMING or (stream_tokens and stage == "executor"):
+            # guardião incremental: a primeira violação interrompe a geração em curso
+            scanner = GUARDIAN.stream() if GUARDIAN_STREAMING else None
+            parts, hit, t0, info = [], None, time.perf_counter(), {}
+            async with aclosing(astream_llm(build(), temperature=temp, use_cache=use_cache, info=info)) as gen:
+                async for piece in gen:
+                    parts.append(piece)
+                    if stream_tokens and stage == "executor":
+                        yield "token", {"stage": stage, "text": piece}
+                    if scanner is not None and (hit := scanner.feed(piece)):
+                        break
+            drafts[stage] = "".join(parts)
+            if scanner is not None:
+                if hit:
+                    EARLY_ABORTS.aborted(stage, len(parts), time.perf_counter() - t0)
+                elif not info.get("cached"):  # só gerações reais entram na média
+                    EARLY_ABORTS.completed(stage, len(parts), time.perf_counter() - t0)
+                ok, why = (False, GUARDIAN.reason(hit)) if hit else (True, "OK")
+            else:
+                ok, why = guardian_check(drafts[stage])
+        else:
+            drafts[stage] = await acall_llm(build(), temperature=temp, use_cache=use_cache)
+            ok, why = guardian_check(drafts[stage])
+        llm_calls += 1
+        MEM.push_short(f"[{stage}]\n{drafts[stage]}", req.session_id)
+        yield "stage", {"stage": stage, "status": "end"}
+        yield "guardian", {"stage": stage, "ok": ok, "reason": why}
+        if not ok:
+            yield "result", RunResponse(status="blocked", blocked_step=stage, reason=why,
+                                        prompt_tokens=prompt_tokens).model_dump()
+            return
+
+    draft_exec = drafts["executor"]
     if req.apply_feedback and req.request_id:
         fb_text = HF.pop(req.request_id)
         if fb_text:
-            regen_prompt = [
-                {"role": "system", "content": SYSTEM_SAFETY},
-                {"role": "user", "content": (
-                    f"[REVISÃO COM FEEDBACK HUMANO]\n"
-                    f"Feedback: {fb_text}\n\n"
-                    f"Texto a revisar:\n{draft_exec}\n\n"
-                    "Aplique o feedback preservando coerência e clareza."
-                )}
-            ]
-            draft_exec = call_llm(regen_prompt, temperature=0.4)
-
-    resumo_prompt = [
-        {"role": "system", "content": SYSTEM_SAFETY},
-        {"role": "user", "content": (
-            f"Resuma em 8-12 linhas (objetivo, decisões, pontos-chave):\n{draft_exec}"
-        )}
-    ]
-    resumo = call_llm(resumo_prompt, temperature=0.2)
-    if CHROMA_AVAILABLE:
+            yield "stage", {"stage": "feedback", "status": "start"}
+            draft_exec = await acall_llm(prompt_feedback(fb_text, draft_exec), temperature=0.4, use_cache=use_cache)
+            llm_calls += 1
+            yield "stage", {"stage": "feedback", "status": "end"}
+
+    yield "stage", {"stage": "resumo", "status": "start"}
+    resumo = await acall_llm(prompt_resumo(draft_exec), temperature=0.2, use_cache=use_cache)
+    llm_calls += 1
+    yield "stage", {"stage": "resumo", "status": "end"}
+    if LONG_MEMORY_AVAILABLE:
         try:
-            MEM.add_long(doc_id=f"log-{hash(draft_exec)}", text=resumo, meta={"kind": "resumo_exec"})
+            await offload(MEM.add_long, doc_id=f"log-{hash(draft_exec)}", text=resumo, meta={"kind": "resumo_exec"})
         except Exception:
             pass
 
-    return RunResponse(status="ok", pesquisa=draft_pesq, esboco=draft_synth, resultado=draft_exec, resumo=resumo)
+    result = RunResponse(status="ok", pesquisa=drafts["pesquisador"], esboco=drafts["sintetizador"],
+                         resultado=draft_exec, resumo=resumo, prompt_tokens=prompt_tokens).model_dump()
+    if qvec is not None:
+        SEMANTIC_CACHE.store(qvec, req.query, result, doc_ids=ctx_doc_ids, namespace=semantic_namespace(req),
+                             llm_calls=llm_calls)
+    yield "result", result
+
+async def run_chain(req: RunRequest) -> RunResponse:
+    async def compute():
+        result = None
+        async for event, data in run_chain_events(req):
+            if event == "result":
+                result = data
+        return RunResponse(**result)
+    return await FLIGHTS.do("run", req, compute)
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/run", response_model=RunResponse)
+async def run(req: RunRequest, _=Depends(auth_required)):
+    return await run_chain(req)
+
+@app.post("/run_stream")
+async def run_stream(req: RunRequest, _=Depends(auth_required)):
+    """Mesma cadeia do /run em Server-Sent Events (etapas, tokens do executor, guardião e resultado)."""
+    async def gen():
+        try:
+            async for event, data in run_chain_events(req, stream_tokens=True):
+                yield sse(event, data)
+        except Exception as e:
+            logging.exception("run_stream falhou")
+            yield sse("error", {"detail": str(e)})
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ============== LOTE (com auth) ==============
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_LIMITER = RateLimiter(rpm=float(os.getenv("BATCH_RPM", "0")), tpm=float(os.getenv("BATCH_TPM", "0")))
+
+async def _ndjson_items(chunks):
+    # linha a linha conforme o corpo chega: run_bounded só puxa o próximo item quando há vaga, então o corpo
+    # é lido no ritmo do lote; uma linha inválida vira erro só daquele item (o worker relança a exceção guardada)
+    async for ln in _lines(chunks):
+        if ln.strip():
+            try:
+                yield RunRequest(**json.loads(ln))
+            except Exception as e:
+                yield e
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse que continua lendo o corpo da requisição enquanto responde.
+
+    Com ASGI < 2.4 (uvicorn) o Starlette chama receive() em paralelo para detectar a desconexão e engoliria os
+    pedaços do corpo. Aqui uma task só lê o receive(): o corpo vai para `content(chunks)` por uma fila curta
+    (contrapressão até o cliente) e o http.disconnect é repassado ao detector do Starlette.
+    """
+
+    def __init__(self, content, max_chunks: int = 16, **kw):
+        self._body: asyncio.Queue = asyncio.Queue(max_chunks)
+        self._gone = asyncio.Event()
+        super().__init__(content(self._chunks()), **kw)
+
+    async def _chunks(self):
+        while (chunk := await self._body.get()) is not None:
+            yield chunk
+
+    async def _pump(self, receive) -> None:
+        more = True
+        while True:
+            msg = await receive()
+            if msg["type"] == "http.disconnect":
+                break
+            if more and msg["type"] == "http.request":
+                if msg.get("body"):
+                    await self._body.put(msg["body"])
+                more = msg.get("more_body", False)
+                if not more:
+                    await self._body.put(None)
+        self._gone.set()
+        if more:  # cliente caiu no meio do upload: encerra a leitura dos itens
+            await self._body.put(None)
+
+    async def _disconnected(self):
+        await self._gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def __call__(self, scope, receive, send) -> None:
+        pump = asyncio.ensure_future(self._pump(receive))
+        try:
+            await super().__call__(scope, self._disconnected, send)
+        finally:
+            pump.cancel()
+
+def _query_number(q, name: str, cast, default=None):
+    raw = q.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Parâmetro {name} inválido: {raw!r}")
+
+async def run_batch_lines(items, concurrency: int, limiter: RateLimiter):
+    """Roda as cadeias com concorrência limitada; uma linha NDJSON por item, na ordem em que terminam."""
+    async def worker(item):
+        if isinstance(item, Exception):
+            raise item
+        LLM_LIMITER.set(limiter)  # cada item roda na sua própria task: o limitador não vaza para fora do lote
+        t0 = time.perf_counter()
+        resp = await run_chain(item)
+        return resp, time.perf_counter() - t0
+
+    async for i, item, out, err in run_bounded(items, worker, concurrency):
+        rid = getattr(item, "request_id", None) or f"batch-{i}"
+        if err is not None:
+            line = {"index": i, "request_id": rid, "status": "error", "error": str(err)}
+        else:
+            resp, secs = out
+            line = {"index": i, "request_id": rid, "status": resp.status, "seconds": round(secs, 3),
+                    "result": resp.model_dump()}
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+@app.post("/run_batch")
+async def run_batch(request: Request, _=Depends(auth_required)):
+    """Lote de RunRequest: JSON {"items": [...], "concurrency", "rpm", "tpm"} ou NDJSON (um RunRequest por linha,
+    parâmetros na query string). Responde NDJSON conforme cada cadeia termina, marcado com request_id."""
+    if "ndjson" in request.headers.get("content-type", ""):
+        q = request.query_params
+        concurrency = _query_number(q, "concurrency", int, BATCH_CONCURRENCY)
+        rpm, tpm = _query_number(q, "rpm", float), _query_number(q, "tpm", float)
+        items = None  # lidos do corpo enquanto a resposta já sai (DuplexStreamingResponse)
+    else:
+        try:
+            body = RunBatchRequest(**(await request.json()))
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Corpo inválido: {e}")
+        items, concurrency, rpm, tpm = body.items, body.concurrency or BATCH_CONCURRENCY, body.rpm, body.tpm
+    concurrency = max(1, concurrency)
+    # limites explícitos valem só para este lote; sem eles usa o limitador global (cota compartilhada)
+    limiter = BATCH_LIMITER if rpm is None and tpm is None else \
+        RateLimiter(rpm=float(rpm or 0), tpm=float(tpm or 0))
+    headers = {"X-Accel-Buffering": "no"}
+    if items is None:
+        return DuplexStreamingResponse(lambda chunks: run_batch_lines(_ndjson_items(chunks), concurrency, limiter),
+                                       media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(run_batch_lines(items, concurrency, limiter), media_type="application/x-ndjson",
+                             headers=headers)
 
 # ============== PDF (com auth) ==============
 class _PDF(FPDF):
@@ -372,8 +903,13 @@ def make_pdf(title: str, body: str, resumo: str = "") -> bytes:
     return bytes(pdf.output(dest="S"))
 
 @app.post("/run_pdf")
-def run_pdf(req: RunRequest, _=Depends(auth_required)):
-    resp = run(req)  # reusa a mesma lógica
+async def run_pdf(req: RunRequest, _=Depends(auth_required)):
+    pdf_bytes = await FLIGHTS.do("run_pdf", req, lambda: build_run_pdf(req))
+    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf",
+                             headers={"Content-Disposition": 'attachment; filename=\"colabIA_resultado.pdf\"'})
+
+async def build_run_pdf(req: RunRequest) -> bytes:
+    resp = await run_chain(req)  # reusa a mesma lógica
     data = resp if isinstance(resp, dict) else resp.model_dump()
     if data.get("status") != "ok":
         raise HTTPException(status_code=400, detail=f"Fluxo bloqueado em {data.get('blocked_step')}: {data.get('reason')}")
@@ -381,22 +917,149 @@ def run_pdf(req: RunRequest, _=Depends(auth_required)):
     resumo = data.get("resumo") or ""
     if not resultado.strip():
         raise HTTPException(status_code=422, detail="Nenhum conteúdo para gerar PDF.")
-    pdf_bytes = make_pdf(title="Resultado do Orquestrador", body=resultado, resumo=resumo)
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf",
-                             headers={"Content-Disposition": 'attachment; filename=\"colabIA_resultado.pdf\"'})
+    return await offload(make_pdf, title="Resultado do Orquestrador", body=resultado, resumo=resumo)
 
 # ============== KB (com auth) ==============
+KB_BULK_BATCH = int(os.getenv("KB_BULK_BATCH", "128"))
+KB_BULK_MAX_ERRORS = 1000  # erros detalhados guardados por carga (o contador segue além disso)
+KB_JOBS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # progresso das últimas cargas
+
+async def _lines(chunks):
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for ln in lines:
+            yield ln
+    if buf:
+        yield buf
+
+async def _upload_chunks(request: Request):
+    # multipart: o Starlette já põe cada arquivo num SpooledTemporaryFile (vai para o disco acima de 1 MB)
+    form = await request.form()
+    for part in form.values():
+        if hasattr(part, "read"):
+            while chunk := await part.read(1 << 16):
+                yield chunk
+            yield b"\n"
+
+def _kb_fail(job: Dict[str, Any], line: int, doc_id: Optional[str], err: Exception):
+    job["failed"] += 1
+    if len(job["errors"]) < KB_BULK_MAX_ERRORS:
+        job["errors"].append({"line": line, "doc_id": doc_id, "error": str(err)[:300]})
+
+async def _kb_flush(batch: List[Tuple[int, KBUpsertReq]], job: Dict[str, Any]):
+    latest = {d.doc_id: (ln, d) for ln, d in batch}  # id repetido no lote: vale a última linha (como em sequência)
+    docs = [(d.doc_id, d.text, d.meta) for _, d in latest.values()]
+    try:
+        await offload(MEM.upsert_long_batch, docs)
+        ok_ids = list(latest)
+    except Exception:
+        # lote rejeitado: refaz um a um para apontar só os documentos com problema
+        ok_ids = []
+        for ln, d in latest.values():
+            try:
+                await offload(MEM.upsert_long_batch, [(d.doc_id, d.text, d.meta)])
+                ok_ids.append(d.doc_id)
+            except Exception as e:
+                _kb_fail(job, ln, d.doc_id, e)
+    job["upserted"] += len(ok_ids)
+    job["batches"] += 1
+    if SEMANTIC_CACHE is not None and ok_ids:
+        SEMANTIC_CACHE.invalidate_docs(ok_ids)
+    logging.info("kb_bulk_upsert %s: %d recebidos, %d gravados, %d erros",
+                 job["job_id"], job["received"], job["upserted"], job["failed"])
+
+@app.post("/kb_bulk_upsert")
+async def kb_bulk_upsert(request: Request, job_id: Optional[str] = None, batch_size: Optional[int] = None,
+                         _=Depends(auth_required)):
+    """Carga em massa: NDJSON (um KBUpsertReq por linha) no corpo ou em arquivo(s) multipart.
+
+    Lê a entrada em fluxo e grava em lotes de batch_size (padrão KB_BULK_BATCH) com um upsert por lote;
+    só um lote fica em memória. Progresso em GET /kb_bulk_upsert/{job_id} enquanto a carga roda.
+    """
+    if not LONG_MEMORY_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Memória longa indisponível no servidor.")
+    size = max(1, batch_size or KB_BULK_BATCH)
+    job = {"job_id": job_id or uuid.uuid4().hex, "done": False, "received": 0, "upserted": 0, "failed": 0,
+           "batches": 0, "errors": [], "started": time.time()}
+    KB_JOBS[job["job_id"]] = job
+    while len(KB_JOBS) > 100:
+        KB_JOBS.popitem(last=False)
+    chunks = _upload_chunks(request) if "multipart/" in request.headers.get("content-type", "") else request.stream()
+    t0 = time.perf_counter()
+    batch: List[Tuple[int, KBUpsertReq]] = []
+    lineno = 0
+    async for ln in _lines(chunks):
+        lineno += 1
+        if not ln.strip():
+            continue
+        job["received"] += 1
+        try:
+            batch.append((lineno, KBUpsertReq(**json.loads(ln))))
+        except Exception as e:
+            _kb_fail(job, lineno, None, e)
+            continue
+        if len(batch) >= size:
+            await _kb_flush(batch, job)
+            batch = []
+    if batch:
+        await _kb_flush(batch, job)
+    secs = time.perf_counter() - t0
+    job.update(done=True, seconds=round(secs, 3), docs_per_s=round(job["upserted"] / secs, 1) if secs else None,
+               errors_truncated=max(0, job["failed"] - len(job["errors"])))
+    return job
+
+@app.get("/kb_bulk_upsert/{job_id}")
+def kb_bulk_progress(job_id: str, _=Depends(auth_required)):
+    job = KB_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Carga não encontrada.")
+    return {k: v for k, v in job.items() if k != "errors"} | {"errors": len(job["errors"])}
+
 @app.post("/kb_upsert", response_model=KBUpsertResp)
 def kb_upsert(req: KBUpsertReq, _=Depends(auth_required)):
-    if not CHROMA_AVAILABLE:
-        raise HTTPException(status_code=503, detail="ChromaDB indisponível no servidor.")
+    if not LONG_MEMORY_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Memória longa indisponível no servidor.")
     MEM.update_long(doc_id=req.doc_id, text=req.text, meta=req.meta or {})
+    if SEMANTIC_CACHE is not None:
+        SEMANTIC_CACHE.invalidate_docs([req.doc_id])
     return KBUpsertResp(ok=True, doc_id=req.doc_id, chroma_enabled=True)
 
+@app.post("/kb_upload")
+async def kb_upload(request: Request, doc_id: str, meta: Optional[str] = None, _=Depends(auth_required)):
+    """Documento longo em texto puro no corpo, fatiado em fluxo: os chunks são gravados em lotes de
+    KB_WRITE_BATCH conforme o upload chega, sem juntar o documento inteiro na memória."""
+    if not LONG_MEMORY_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Memória longa indisponível no servidor.")
+    try:
+        meta_d = json.loads(meta) if meta else {}
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"meta inválido: {e}")
+    t0 = time.perf_counter()
+    ch, dec = MEM.chunker(), codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending: List[Tuple[str, str, Dict[str, Any]]] = []
+    written = 0
+    async for data in request.stream():
+        pending += MEM.chunk_rows(doc_id, await offload(ch.feed, dec.decode(data)), meta_d)
+        if len(pending) >= KB_WRITE_BATCH:
+            await offload(MEM.write_rows, pending)
+            written, pending = written + len(pending), []
+    pending += MEM.chunk_rows(doc_id, ch.feed(dec.decode(b"", final=True)) + ch.close(), meta_d)
+    if pending:
+        await offload(MEM.write_rows, pending)
+        written += len(pending)
+    await offload(MEM.finish_docs, {doc_id: written})
+    if SEMANTIC_CACHE is not None:
+        SEMANTIC_CACHE.invalidate_docs([doc_id])
+    return {"ok": True, "doc_id": doc_id, "chunks": written, "seconds": round(time.perf_counter() - t0, 3)}
+
 @app.post("/kb_query", response_model=KBQueryResp)
-def kb_query(req: KBQueryReq, _=Depends(auth_required)):
-    docs = MEM.retrieve_long(req.query, k=req.k) if CHROMA_AVAILABLE else []
-    return KBQueryResp(ok=True, docs=docs, chroma_enabled=CHROMA_AVAILABLE)
+async def kb_query(req: KBQueryReq, _=Depends(auth_required)):
+    async def compute():
+        docs = await offload(MEM.retrieve_long, req.query, k=req.k) if LONG_MEMORY_AVAILABLE else []
+        return KBQueryResp(ok=True, docs=docs, chroma_enabled=LONG_MEMORY_AVAILABLE)
+    return await FLIGHTS.do("kb_query", req, compute)
 
 # ============== CRM (com auth) ==============
 @app.post("/tool/crm_lookup", response_model=CRMLookupResp)
@@ -440,8 +1103,11 @@ def crm_recommend_offer(req: CRMOfferReq, _=Depends(auth_required)):
 
 # ============== EVAL (com auth) ==============
 @app.post("/eval", response_model=EvalResponse)
-def eval_run(req: EvalRequest, _=Depends(auth_required)):
-    r = run(RunRequest(query=req.query, formato=req.formato))
+async def eval_run(req: EvalRequest, _=Depends(auth_required)):
+    return await FLIGHTS.do("eval", req, lambda: evaluate(req))
+
+async def evaluate(req: EvalRequest) -> EvalResponse:
+    r = await run_chain(RunRequest(query=req.query, formato=req.formato, no_cache=req.no_cache))
     data = r if isinstance(r, dict) else r.model_dump()
     if data.get("status") != "ok":
         raise HTTPException(status_code=400, detail=f"Falhou: {data}")
@@ -0,0 +1,133 @@
+# batch.py
+# Execução em lote: concorrência limitada + token bucket (requisições e tokens por minuto)
+# - RateLimiter.reserve() é thread-safe e não bloqueia: devolve quanto esperar (modelo de reserva,
+#   o saldo pode ficar negativo, então pedidos maiores que o balde também passam, só esperam mais)
+# - acquire() (asyncio) e acquire_sync() (threads) só dormem o tempo devolvido
+# - run_bounded() roda os itens com no máximo `concurrency` em voo e entrega na ordem em que terminam
+from __future__ import annotations
+import asyncio, threading, time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple, Union
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_s: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.level = self.capacity
+        self.ts = time.monotonic()
+
+    def reserve(self, n: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.ts) * self.rate)
+        self.ts = now
+        self.level -= n
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def refund(self, n: float) -> None:
+        self.level = min(self.capacity, self.level + n)
+
+class RateLimiter:
+    """Limites de requisições (rpm) e tokens (tpm) por minuto; 0 = sem limite."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, burst_s: float = 10.0):
+        self.rpm, self.tpm = rpm, tpm
+        self.lock = threading.Lock()
+        self.requests = TokenBucket(rpm, burst_s) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, burst_s) if tpm > 0 else None
+        self.counters = {"acquired": 0, "throttled": 0, "wait_s": 0.0, "tokens_reserved": 0.0}
+
+    def reserve(self, tokens: float = 0.0) -> float:
+        now = time.monotonic()
+        with self.lock:
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            self.counters["acquired"] += 1
+            self.counters["tokens_reserved"] += tokens
+            if wait > 0:
+                self.counters["throttled"] += 1
+                self.counters["wait_s"] += wait
+            return wait
+
+    def settle(self, reserved: float, actual: float) -> None:
+        """Corrige a reserva de tokens com o uso real informado pela API."""
+        if self.tokens is None or actual <= 0:
+            return
+        with self.lock:
+            self.tokens.refund(reserved - actual)  # negativo = cobra a diferença
+            self.counters["tokens_reserved"] += actual - reserved
+
+    async def acquire(self, tokens: float = 0.0) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: float = 0.0) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        with self.lock:
+            c = dict(self.counters)
+        c["wait_s"] = round(c["wait_s"], 3)
+        c["rpm"], c["tpm"] = self.rpm, self.tpm
+        return c
+
+async def _aiter(items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if hasattr(items, "__aiter__"):
+        async for it in items:
+            yield it
+    else:
+        for it in items:
+            yield it
+
+async def run_bounded(items: Union[Iterable[Any], AsyncIterable[Any]], worker: Callable[[Any], Awaitable[Any]],
+                      concurrency: int = 8) -> AsyncIterator[Tuple[int, Any, Any, Optional[BaseException]]]:
+    """Entrega (índice, item, resultado, erro) conforme cada item termina (ordem de conclusão).
+
+    Os itens são consumidos sob demanda (aceita iterável assíncrono, ex.: NDJSON chegando pela rede).
+    Se o consumidor parar no meio, o que estiver em voo é cancelado.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done: asyncio.Queue = asyncio.Queue()
+    running: set = set()
+    end = object()
+
+    async def one(i, item):
+        try:
+            out = (i, item, await worker(item), None)
+        except Exception as e:
+            out = (i, item, None, e)
+        finally:
+            sem.release()
+        await done.put(out)
+
+    async def feed():
+        try:
+            i = 0
+            async for item in _aiter(items):
+                await sem.acquire()
+                t = asyncio.ensure_future(one(i, item))
+                running.add(t)
+                t.add_done_callback(running.discard)
+                i += 1
+            if running:
+                await asyncio.wait(set(running))
+        except Exception as e:  # falha lendo a entrada: reporta, deixa terminar o que já está em voo
+            await done.put((-1, None, None, e))
+            if running:
+                await asyncio.wait(set(running))
+        await done.put(end)
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            out = await done.get()
+            if out is end:
+                break
+            yield out
+    finally:
+        feeder.cancel()
+        for t in list(running):
+            t.cancel()
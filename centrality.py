@@ -0,0 +1,193 @@
+# centrality.py
+# Centralidade (PageRank com damping, a mesma conta do eigen_centrality dos stubs GEM) em grafo esparso
+# - arestas em CSR NumPy: memória O(n + arestas), cada iteração O(arestas) com bincount
+# - para por tolerância (variação L1 entre iterações), não por nº fixo de iterações
+# - depois de editar o grafo, recomeça do vetor anterior (warm start): poucas iterações para convergir
+# - scores persistidos em .npz junto com o grafo; score(chave) é O(1) (dict + índice no array)
+from __future__ import annotations
+import os, time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+def csr_from_coo(n: int, src: np.ndarray, dst: np.ndarray,
+                 weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(indptr, indices, weights) com as arestas ordenadas por origem."""
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int64), weights[order].astype(np.float64)
+
+def power_iteration(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, damping: float = 0.85,
+                    tol: float = 1e-10, max_iter: int = 100,
+                    x0: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int, float]:
+    """PageRank por iteração de potência sobre CSR (linha i = arestas que saem de i, com peso).
+
+    A massa dos nós sem saída é espalhada por igual. Devolve (scores somando 1, iterações, variação L1 final).
+    """
+    n = len(indptr) - 1
+    if n == 0:
+        return np.zeros(0), 0, 0.0
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    out_w = np.bincount(rows, weights=weights, minlength=n)
+    dangling = out_w == 0
+    inv = np.divide(1.0, out_w, out=np.zeros(n), where=~dangling)
+    x = np.full(n, 1.0 / n) if x0 is None or len(x0) != n else np.asarray(x0, dtype=np.float64) / x0.sum()
+    delta = 0.0
+    for it in range(1, max_iter + 1):
+        y = np.bincount(indices, weights=(x * inv)[rows] * weights, minlength=n)
+        y = damping * (y + x[dangling].sum() / n) + (1.0 - damping) / n
+        y /= y.sum()
+        delta = float(np.abs(y - x).sum())
+        x = y
+        if delta < tol:
+            return x, it, delta
+    return x, max_iter, delta
+
+_SHIFT = np.int64(1 << 32)  # código da aresta = origem << 32 | destino
+
+class Centrality:
+    """Grafo com nós nomeados (ex.: "u:ana") e scores de centralidade recalculados sob demanda.
+
+    Arestas consolidadas em arrays (src, dst, w); edições ficam num dict pequeno até o próximo compute().
+    """
+
+    def __init__(self, damping: float = 0.85, tol: float = 1e-9, max_iter: int = 100):
+        self.damping = damping
+        self.tol = tol
+        self.max_iter = max_iter
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.src = np.zeros(0, dtype=np.int64)
+        self.dst = np.zeros(0, dtype=np.int64)
+        self.w = np.zeros(0, dtype=np.float64)
+        self.pending: Dict[Tuple[int, int], Optional[float]] = {}  # None = remoção
+        self.scores = np.zeros(0)
+        self.dirty = False
+        self.gen = 0  # sobe a cada recálculo
+        self.last = {"iters": 0, "delta": 0.0, "seconds": 0.0, "warm": False}
+
+    # ---- edição ----
+    def add_node(self, key: str) -> int:
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.dirty = True
+        return i
+
+    def _pairs(self, e: Sequence, undirected: bool) -> Tuple[Tuple[int, int], ...]:
+        a, b = self.add_node(e[0]), self.add_node(e[1])
+        return ((a, b), (b, a)) if undirected and a != b else ((a, b),)
+
+    def add_edges(self, edges: Iterable[Sequence], undirected: bool = True) -> int:
+        """Arestas (a, b) ou (a, b, peso); nós novos são criados. Devolve quantas arestas foram gravadas."""
+        n = 0
+        for e in edges:
+            w = float(e[2]) if len(e) > 2 else 1.0
+            for pair in self._pairs(e, undirected):
+                self.pending[pair] = w
+                n += 1
+        self.dirty |= bool(n)
+        return n
+
+    def remove_edges(self, edges: Iterable[Sequence], undirected: bool = True) -> int:
+        n = 0
+        for e in edges:
+            if e[0] in self.index and e[1] in self.index:
+                for pair in self._pairs(e, undirected):
+                    self.pending[pair] = None
+                    n += 1
+        self.dirty |= bool(n)
+        return n
+
+    def set_edges(self, edges: Iterable[Sequence], undirected: bool = True) -> bool:
+        """Deixa o grafo com exatamente estas arestas; só marca para recálculo se algo mudou."""
+        want: Dict[Tuple[int, int], float] = {}
+        for e in edges:
+            w = float(e[2]) if len(e) > 2 else 1.0
+            for pair in self._pairs(e, undirected):
+                want[pair] = w
+        self._consolidate()
+        m = len(want)
+        pairs = np.fromiter((v for p in want for v in p), dtype=np.int64, count=2 * m).reshape(m, 2)
+        w = np.fromiter(want.values(), dtype=np.float64, count=m)
+        new_o, old_o = np.argsort(pairs[:, 0] * _SHIFT + pairs[:, 1]), np.argsort(self.src * _SHIFT + self.dst)
+        same = m == len(self.src) and np.array_equal(pairs[new_o, 0], self.src[old_o]) and \
+            np.array_equal(pairs[new_o, 1], self.dst[old_o]) and np.array_equal(w[new_o], self.w[old_o])
+        if not same:
+            self.src, self.dst, self.w = pairs[:, 0].copy(), pairs[:, 1].copy(), w
+            self.dirty = True
+        return not same
+
+    def _consolidate(self) -> None:
+        if not self.pending:
+            return
+        m = len(self.pending)
+        pairs = np.fromiter((v for p in self.pending for v in p), dtype=np.int64, count=2 * m).reshape(m, 2)
+        w = np.fromiter((np.nan if v is None else v for v in self.pending.values()), dtype=np.float64, count=m)
+        keep = ~np.isin(self.src * _SHIFT + self.dst, pairs[:, 0] * _SHIFT + pairs[:, 1])
+        add = ~np.isnan(w)
+        self.src = np.concatenate([self.src[keep], pairs[add, 0]])
+        self.dst = np.concatenate([self.dst[keep], pairs[add, 1]])
+        self.w = np.concatenate([self.w[keep], w[add]])
+        self.pending.clear()
+
+    @property
+    def n_edges(self) -> int:
+        self._consolidate()
+        return len(self.src)
+
+    # ---- cálculo ----
+    def csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self._consolidate()
+        return csr_from_coo(len(self.keys), self.src, self.dst, self.w)
+
+    def compute(self, force: bool = False) -> np.ndarray:
+        """Recalcula se o grafo mudou, partindo dos scores anteriores (nós novos entram com 1/n)."""
+        if not (self.dirty or force) and len(self.scores) == len(self.keys):
+            return self.scores
+        n = len(self.keys)
+        x0 = None
+        if len(self.scores):
+            x0 = np.full(n, 1.0 / max(n, 1))
+            x0[:len(self.scores)] = self.scores[:n]
+        csr = self.csr()
+        t0 = time.perf_counter()
+        self.scores, iters, delta = power_iteration(*csr, damping=self.damping, tol=self.tol,
+                                                    max_iter=self.max_iter, x0=x0)
+        self.last = {"iters": iters, "delta": delta, "seconds": round(time.perf_counter() - t0, 6),
+                     "warm": x0 is not None}
+        self.dirty = False
+        self.gen += 1
+        return self.scores
+
+    def score(self, key: str, default: float = 0.0) -> float:
+        i = self.index.get(key)
+        return float(self.scores[i]) if i is not None and i < len(self.scores) else default
+
+    def stats(self) -> Dict[str, object]:
+        return {"nodes": len(self.keys), "edges": self.n_edges, "gen": self.gen, "dirty": self.dirty,
+                **self.last}
+
+    # ---- persistência ----
+    def save(self, path: str) -> str:
+        self.compute()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=np.asarray(self.keys, dtype=str), src=self.src, dst=self.dst, w=self.w,
+                 scores=self.scores, params=np.asarray([self.damping, self.tol, self.max_iter], dtype=np.float64))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Centrality"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            damping, tol, max_iter = z["params"].tolist()
+            c = cls(damping, tol, int(max_iter))
+            c.keys = z["keys"].tolist()
+            c.index = {k: i for i, k in enumerate(c.keys)}
+            c.src, c.dst, c.w, c.scores = z["src"], z["dst"], z["w"], z["scores"]
+        return c
@@ -0,0 +1,174 @@
+# chunker.py
+# Fatiamento de documentos longos para o KB, em fluxo
+# - Chunker.feed(texto) aceita o documento em pedaços (ex.: blocos de um upload) e devolve os chunks já
+#   fechados; close() devolve o resto. Só a frase incompleta e o chunk em montagem ficam em memória
+#   (linha sem "\n" maior que max_line caracteres é fatiada antes de terminar, ex.: texto extraído de PDF)
+# - quebra em fronteiras de frase; títulos (markdown "#" ou numeração "1.2 Título") fecham o chunk
+#   corrente e viram o cabeçalho dos chunks seguintes
+# - cada chunk mira target_tokens e repete as últimas frases do anterior (até overlap_tokens)
+from __future__ import annotations
+import re
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+_SENT_END = re.compile(r"(?<=[.!?…:;])[\"'”)\]]*\s+")
+_HEADING = re.compile(r"^(#{1,6}\s+\S.*|\d+(\.\d+)*[.)]?\s+[A-ZÀ-Ý].{0,100})$")
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    heading: str
+    tokens: int
+
+def approx_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    return bool(line) and len(line) <= 120 and not line.endswith((".", ",", ";")) and bool(_HEADING.match(line))
+
+class Chunker:
+    def __init__(self, target_tokens: int = 300, overlap_tokens: int = 50,
+                 count: Callable[[str], int] = approx_tokens):
+        self.target = max(16, target_tokens)
+        self.overlap = max(0, min(overlap_tokens, self.target // 2))
+        self.count = count
+        self.buf = ""                                   # texto ainda sem fim de linha
+        self.para = ""                                  # parágrafo corrente (frases ainda não fechadas)
+        self.cur: Deque[Tuple[str, int]] = deque()      # frases do chunk em montagem (texto, tokens)
+        self.cur_tokens = 0
+        self.fresh = 0                                  # frases novas (não herdadas da sobreposição)
+        self.heading = ""
+        self.index = 0
+        self.max_line = 8 * self.target                 # caracteres de linha aberta antes de fatiar
+        self.midline = False                            # buf é continuação de uma linha já consumida
+
+    # ---- entrada ----
+    def feed(self, text: str) -> List[Chunk]:
+        out: List[Chunk] = []
+        self.buf += text
+        *lines, self.buf = self.buf.split("\n")
+        for line in lines:
+            self._line(line, out)
+        if len(self.buf) > self.max_line:
+            self._partial(out)
+        return out
+
+    def close(self) -> List[Chunk]:
+        out: List[Chunk] = []
+        if self.buf or self.midline:
+            self._line(self.buf, out)
+            self.buf = ""
+        self._sentences(self.para, out, final=True)
+        self.para = ""
+        self._emit(out, keep_overlap=False)
+        return out
+
+    def _partial(self, out: List[Chunk]) -> None:
+        """Consome a linha aberta até o último espaço: as frases completas saem sem esperar o "\n"."""
+        i = max(self.buf.rfind(" "), self.buf.rfind("\t"))
+        if i <= 0:  # sem espaço nenhum (ex.: base64): corta onde está
+            i = len(self.buf)
+        head, self.buf = self.buf[:i].strip(), self.buf[i:]
+        if head:
+            self.para = f"{self.para} {head}" if self.para else head
+            self.para = self._sentences(self.para, out, final=False)
+        self.midline = True
+
+    def _line(self, line: str, out: List[Chunk]) -> None:
+        if self.midline:  # fim de uma linha já fatiada: não é título nem linha em branco
+            self.midline = False
+            if line.strip():
+                self.para = f"{self.para} {line.strip()}" if self.para else line.strip()
+                self.para = self._sentences(self.para, out, final=False)
+            return
+        if is_heading(line):
+            self._sentences(self.para, out, final=True)
+            self.para = ""
+            self._emit(out, keep_overlap=False)  # sobreposição não atravessa seções
+            self.heading = line.strip().lstrip("#").strip()
+            return
+        if not line.strip():  # linha em branco fecha o parágrafo
+            self._sentences(self.para, out, final=True)
+            self.para = ""
+            return
+        self.para = f"{self.para} {line.strip()}" if self.para else line.strip()
+        self.para = self._sentences(self.para, out, final=False)
+
+    def _sentences(self, text: str, out: List[Chunk], final: bool) -> str:
+        """Consome as frases completas de text; devolve o resto (frase ainda aberta)."""
+        if not text:
+            return ""
+        parts = _SENT_END.split(text)
+        rest = "" if final else parts.pop()
+        for s in parts:
+            if s.strip():
+                self._add(s.strip(), out)
+        if final and rest.strip():
+            self._add(rest.strip(), out)
+            rest = ""
+        # frase enorme sem pontuação: não deixa o resto crescer sem limite
+        if rest and self.count(rest) > self.target:
+            for piece in self._split_long(rest):
+                self._add(piece, out)
+            rest = ""
+        return rest
+
+    # ---- montagem ----
+    def _split_long(self, text: str) -> Iterator[str]:
+        words, piece, width = text.split(), [], 2 * self.target  # ~meio chunk em caracteres
+        for w in words:
+            if len(w) > 2 * width:  # "palavra" gigante (sem espaços): fatias de tamanho fixo
+                if piece:
+                    yield " ".join(piece)
+                    piece = []
+                yield from (w[i:i + width] for i in range(0, len(w), width))
+                continue
+            piece.append(w)
+            if len(piece) % 16 == 0 and self.count(" ".join(piece)) >= self.target:
+                yield " ".join(piece)
+                piece = []
+        if piece:
+            yield " ".join(piece)
+
+    def _add(self, sentence: str, out: List[Chunk]) -> None:
+        n = self.count(sentence)
+        if n > self.target:
+            pieces = list(self._split_long(sentence))
+            if len(pieces) > 1:  # um pedaço só = não dá para quebrar mais: entra como está
+                for piece in pieces:
+                    self._add(piece, out)
+                return
+        if self.fresh and self.cur_tokens + n > self.target:
+            self._emit(out, keep_overlap=True)
+        self.cur.append((sentence, n))
+        self.cur_tokens += n
+        self.fresh += 1
+
+    def _emit(self, out: List[Chunk], keep_overlap: bool) -> None:
+        if not self.fresh:
+            self.cur.clear()
+            self.cur_tokens = 0
+            return
+        body = " ".join(s for s, _ in self.cur)
+        text = f"{self.heading}\n{body}" if self.heading else body
+        out.append(Chunk(self.index, text, self.heading, self.cur_tokens))
+        self.index += 1
+        # sobreposição: mantém as últimas frases até overlap tokens como início do próximo chunk
+        keep: Deque[Tuple[str, int]] = deque()
+        kept = 0
+        if keep_overlap and self.overlap:
+            for s, n in reversed(self.cur):
+                if kept + n > self.overlap:
+                    break
+                keep.appendleft((s, n))
+                kept += n
+        self.cur, self.cur_tokens, self.fresh = keep, kept, 0
+
+def chunk_text(pieces: Iterable[str], target_tokens: int = 300, overlap_tokens: int = 50,
+               count: Callable[[str], int] = approx_tokens) -> Iterator[Chunk]:
+    """Gerador de chunks sobre um iterável de pedaços de texto (um str inteiro também serve: [texto])."""
+    ch = Chunker(target_tokens, overlap_tokens, count)
+    for piece in pieces:
+        yield from ch.feed(piece)
+    yield from ch.close()
@@ -4,6 +4,7 @@ import re, time, pathlib, json
 from collections import defaultdict
 from tests._utils_io import write_json, read_json, stopwatch
 from tests._metrics import precision_at_k
+from centrality import Centrality
 
 def tokenize(txt): return re.findall(r"[A-Za-zÀ-ÿ0-9]+", txt.lower())
 
@@ -29,30 +30,14 @@ if not state:
 
 nodes = state["nodes"]; edges = [tuple(e) for e in state["edges"]]
 
-def build_idx(nodes):
-    idx = {k:i for i,k in enumerate(nodes.keys())}
-    rev = {i:k for k,i in idx.items()}
-    n = len(idx); adj = [[0]*n for _ in range(n)]
-    for a,b in edges:
-        ia, ib = idx[a], idx[b]
-        adj[ia][ib] = 1; adj[ib][ia] = 1
-    return idx, rev, adj
-
-def eigen_centrality(adj, iters=30, damping=0.85):
-    n = len(adj)
-    v = [1.0/n]*n
-    for _ in range(iters):
-        nv = [0.0]*n
-        for i in range(n):
-            deg = sum(adj[i])
-            if deg:
-                share = v[i]/deg
-                for j in range(n):
-                    if adj[i][j]: nv[j]+=share
-        v = [ (1-damping)/n + damping*nv[i] for i in range(n) ]
-        s = sum(v); 
-        if s: v = [x/s for x in v]
-    return v
+def load_centrality(nodes, edges, path=graph_path + ".centrality.npz"):
+    # scores persistidos ao lado do grafo; edição nas arestas -> recálculo a partir dos scores anteriores
+    cen = Centrality.load(path) or Centrality()
+    for key in nodes: cen.add_node(key)
+    cen.set_edges(edges)
+    if cen.dirty:
+        cen.compute(); cen.save(path)
+    return cen
 
 def text_score(qt, text):
     toks = set(tokenize(text))
@@ -64,11 +49,10 @@ qt = tokenize(query)
 
 # timing
 with stopwatch() as sw:
-    idx, rev, adj = build_idx(nodes)
-    eig = eigen_centrality(adj)
+    cen = load_centrality(nodes, edges)
     scored = []
     for key, meta in nodes.items():
-        s = 0.7*text_score(qt, meta["text"]) + 0.3*eig[idx[key]]
+        s = 0.7*text_score(qt, meta["text"]) + 0.3*cen.score(key)
         scored.append((s, key, meta))
     scored.sort(reverse=True)
     top = scored[:5]
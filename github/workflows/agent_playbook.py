@@ -1,6 +1,7 @@
 # agent_playbook.py
 # Orquestração mínima: planeja -> usa ferramenta -> autocritica -> loga -> (opcional) grava memória
 from __future__ import annotations
+import sqlite3
 from typing import Dict, Any
 from memory_store import connect, upsert_memory
 from experience import experience_log, auto_critique
@@ -13,19 +14,21 @@ def plan_steps(objective: str) -> list[Dict[str,Any]]:
     # acrescente outras ferramentas aqui, ex: "web.search", "code.exec", etc.
     return steps
 
-def run_step(step: Dict[str,Any]) -> str:
-    if step["tool"] == "memory.search":
-        res = hybrid_retrieve(step["input"])
+def run_step(step: Dict[str,Any], con: sqlite3.Connection = None) -> str:
+    if step["tool"] in ("memory.search", "memory.ppr"):
+        # memory.ppr (ou "mode": "ppr" no passo) usa PageRank personalizado em vez dos saltos fixos
+        mode = "ppr" if step["tool"] == "memory.ppr" else step.get("mode")
+        res = hybrid_retrieve(step["input"], con=con, mode=mode)
         # compõe um "resumo" curtinho das top-3 memórias
         capsule = "\n".join([f"- ({n['score']:.2f}) {n['text'][:180]}" for n in res["nodes"][:3]])
         return capsule or "(sem memória relevante)"
     return "(tool não implementada)"
 
 def run_objective(objective: str, persist_memory: bool = True) -> Dict[str,Any]:
-    con = connect()
+    con = connect()  # uma conexão para o objetivo inteiro (busca, log, curadoria, memória)
     timeline = []
     for s in plan_steps(objective):
-        out = run_step(s)
+        out = run_step(s, con)
         crit = auto_critique(objective, out)
         experience_log(objective, s["step"], s["tool"], s.get("input",""), out, crit["ok"], con)
         timeline.append({"step": s, "output": out, "critique": crit})
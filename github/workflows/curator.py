@@ -7,7 +7,7 @@ from memory_store import connect, embed, most_similar
 
 def curator_check(text: str, con: sqlite3.Connection = None) -> Dict[str,Any]:
     close = []
-    own = con or connect()
+    own = con or connect(readonly=True)
     vec = embed(text)
     for nid, score in most_similar(own, vec, top_k=5):
         close.append({"id": nid, "score": round(score, 4)})
@@ -22,7 +22,7 @@ def auto_critique(objective: str, output_s: str) -> Dict[str,Any]:
     return {"overlap": round(overlap,3), "ok": ok}
 
 def reuse_playbook(objective_like: str, limit: int = 5, con: sqlite3.Connection = None) -> List[Dict[str,Any]]:
-    own = con or connect()
+    own = con or connect(readonly=True)
     rows = own.execute("""SELECT objective, step, tool, input, output, ok, ts
                           FROM experiences
                           WHERE ok=1 AND objective LIKE ?
@@ -1,17 +1,74 @@
 # retrieval.py
-# Recuperação híbrida: embedding + vizinhança no grafo + reforço temporal
+# Recuperação híbrida: embedding + BM25 + vizinhança no grafo + reforço temporal
+# - search_memory traz as sementes (fusão vetorial/BM25) e os vizinhos, com hop e peso do caminho
+# - rerank() funde similaridade, peso das arestas, distância em saltos e recência num só ranking,
+#   em arrays NumPy sobre o conjunto de candidatos (limitado por max_candidates)
+# - mode="ppr": PageRank personalizado a partir das sementes (memory_store.ppr_retrieve), sem saltos fixos
 from __future__ import annotations
-import time, sqlite3
-from typing import Dict, Any
-from memory_store import connect, search_memory
+import os, time, sqlite3
+from typing import Dict, Any, List
+
+import numpy as np
+
+from memory_store import connect, search_memory, ppr_retrieve
+
+# Pesos do rerank por sinal (recência: parâmetro recency_boost)
+RERANK_MODE = os.getenv("RETRIEVAL_RERANK", "rrf")  # "rrf" | "weighted"
+RERANK_WEIGHTS = {
+    "sim": float(os.getenv("RETRIEVAL_W_SIM", "1.0")),
+    "edge": float(os.getenv("RETRIEVAL_W_EDGE", "0.3")),
+    "hop": float(os.getenv("RETRIEVAL_W_HOP", "0.3")),
+}
+RERANK_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+MAX_CANDIDATES = int(os.getenv("RETRIEVAL_MAX_CANDIDATES", "128"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bfs")  # "bfs" (saltos + rerank) | "ppr"
+
+def _ranks_desc(x: np.ndarray) -> np.ndarray:
+    """Posição (1 = maior) com empates na mesma posição: vários nós a 1 salto empatam em vez de serem
+    ordenados arbitrariamente."""
+    return np.searchsorted(np.sort(-x), -x, side="left") + 1
+
+def rerank(nodes: List[Dict[str,Any]], weights: Dict[str,float] = None, recency_boost: float = 0.15,
+           mode: str = None, rrf_k: int = None, now: float = None) -> List[Dict[str,Any]]:
+    """Reordena os nós de search_memory pelos quatro sinais; grava o original em "sim" e o final em "score".
+
+    rrf: soma de w*(k+1)/(k+posição) por sinal. weighted: w_sim*sim + w_edge*edge_w + w_hop/(1+hop)
+    + recency_boost/idade_em_dias (a fórmula antiga quando edge e hop têm peso 0).
+    """
+    if not nodes:
+        return nodes
+    w = {**RERANK_WEIGHTS, **(weights or {}), "recency": recency_boost}
+    now = time.time() if now is None else now
+    n = len(nodes)
+    sim = np.fromiter((d["score"] for d in nodes), dtype=np.float64, count=n)
+    edge = np.fromiter((d.get("edge_w", 1.0) for d in nodes), dtype=np.float64, count=n)
+    hop = np.fromiter((d.get("hop", 0) for d in nodes), dtype=np.float64, count=n)
+    ts = np.fromiter((d["ts"] or 0.0 for d in nodes), dtype=np.float64, count=n)
+    signals = {"sim": sim, "edge": edge, "hop": 1.0 / (1.0 + hop),
+               "recency": 1.0 / np.maximum(1.0, (now - ts) / 86400.0)}
+    if (mode or RERANK_MODE) == "rrf":
+        k = RERANK_RRF_K if rrf_k is None else rrf_k
+        score = sum(w[name] * (k + 1) / (k + _ranks_desc(x)) for name, x in signals.items() if w[name])
+    else:
+        score = sum(w[name] * x for name, x in signals.items() if w[name])
+    score = np.broadcast_to(score, (n,))
+    order = np.argsort(-score, kind="stable")
+    out = []
+    for i in order.tolist():
+        d = nodes[i]
+        d["sim"], d["score"] = d["score"], round(float(score[i]), 4)
+        out.append(d)
+    return out
 
 def hybrid_retrieve(query: str, top_k: int = 6, hops: int = 1, recency_boost: float = 0.15,
-                    con: sqlite3.Connection = None) -> Dict[str,Any]:
-    own = con or connect()
-    res = search_memory(own, query, top_k=top_k, expand_hops=hops)
-    now = time.time()
-    for n in res["nodes"]:
-        age_d = max(1.0, (now - n["ts"]) / 86400.0)
-        n["score"] = round(n["score"] + recency_boost / age_d, 4)
-    res["nodes"].sort(key=lambda d: d["score"], reverse=True)
-    return res
\ No newline at end of file
+                    con: sqlite3.Connection = None, fusion: str = None, w_vec: float = None,
+                    w_lex: float = None, weights: Dict[str,float] = None, rerank_mode: str = None,
+                    max_candidates: int = None, mode: str = None) -> Dict[str,Any]:
+    # fusion: "rrf" | "weighted" | "vector" (padrão MEMORY_FUSION; ver memory_store.fuse_scores)
+    own = con or connect(readonly=True)
+    if (mode or RETRIEVAL_MODE) == "ppr":  # o PPR já pondera estrutura; hops/rerank não se aplicam
+        return ppr_retrieve(own, query, top_k=top_k, fusion=fusion, w_vec=w_vec, w_lex=w_lex)
+    res = search_memory(own, query, top_k=top_k, expand_hops=hops, fusion=fusion, w_vec=w_vec, w_lex=w_lex,
+                        max_candidates=max_candidates or MAX_CANDIDATES)
+    res["nodes"] = rerank(res["nodes"], weights, recency_boost, rerank_mode)
+    return res
@@ -0,0 +1,230 @@
+# guardian.py
+# Guardião de política: autômato Aho-Corasick com todos os termos proibidos
+# - construído uma vez a partir do policy.yaml (seção guardian.banned)
+# - recarregado sozinho quando o arquivo muda (checagem de mtime a cada reload_every_s)
+# - varre o texto em uma passada, custo independente do nº de termos
+from __future__ import annotations
+import os, threading, time, logging
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import yaml
+except Exception:  # PyYAML é opcional: sem ele ficam só os termos padrão
+    yaml = None
+
+DEFAULT_BANNED = ["exploit", "malware", "doxxing", "private key", "senha="]
+
+class GuardianMatch(NamedTuple):
+    start: int
+    end: int
+    term: str
+
+def _lower_same_len(text: str) -> str:
+    low = text.lower()
+    if len(low) != len(text):  # raros casos em que lower() muda o comprimento: preserva offsets
+        low = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return low
+
+class Automaton:
+    """Aho-Corasick com transições pré-resolvidas (DFA): no máximo dois dict.get por caractere.
+
+    Com poucos termos (<= small_set) o str.find em C sobre o texto já minúsculo é mais rápido
+    que o laço Python do autômato; acima disso o custo do autômato não depende do nº de termos.
+    """
+    small_set = 32
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = sorted({p.lower() for p in patterns if p})
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pi, p in enumerate(self.patterns):
+            s = 0
+            for ch in p:
+                nxt = goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[s][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                s = nxt
+            out[s].append(pi)
+        # BFS: links de falha e transições herdadas (vira um DFA). As transições da raiz
+        # ficam só em self.root (fallback), senão cada estado copiaria o alfabeto inteiro.
+        root = goto[0]
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [{}] * len(goto)
+        queue = deque(root.values())
+        while queue:
+            s = queue.popleft()
+            f = fail[s]
+            delta[s] = {**delta[f], **goto[s]}
+            out[s] = out[s] + out[f]
+            for ch, nxt in goto[s].items():
+                fail[nxt] = delta[f].get(ch) or root.get(ch, 0)
+                queue.append(nxt)
+        self.root = root
+        self.delta = delta
+        self.out = [tuple(o) for o in out]
+
+    def scan(self, text: str) -> List[GuardianMatch]:
+        low = _lower_same_len(text)
+        pats = self.patterns
+        if len(pats) <= self.small_set:
+            found = []
+            for p in pats:
+                i = low.find(p)
+                while i >= 0:
+                    found.append(GuardianMatch(i, i + len(p), p))
+                    i = low.find(p, i + 1)
+            found.sort(key=lambda m: (m.end, m.start))
+            return found
+        delta, root, out = self.delta, self.root, self.out
+        s, found = 0, []
+        for i, ch in enumerate(low):
+            s = delta[s].get(ch) or root.get(ch, 0)
+            if out[s]:
+                for pi in out[s]:
+                    found.append(GuardianMatch(i + 1 - len(pats[pi]), i + 1, pats[pi]))
+        return found
+
+    def first(self, text: str) -> Optional[GuardianMatch]:
+        """Primeira ocorrência (menor posição final) ou None."""
+        low = _lower_same_len(text)
+        pats = self.patterns
+        if len(pats) <= self.small_set:
+            best = None
+            for p in pats:
+                i = low.find(p)
+                if i >= 0 and (best is None or i + len(p) < best.end):
+                    best = GuardianMatch(i, i + len(p), p)
+            return best
+        delta, root, out = self.delta, self.root, self.out
+        s = 0
+        for i, ch in enumerate(low):
+            s = delta[s].get(ch) or root.get(ch, 0)
+            if out[s]:
+                p = pats[out[s][0]]
+                return GuardianMatch(i + 1 - len(p), i + 1, p)
+        return None
+
+class StreamScanner:
+    """Varredura incremental: o estado do autômato atravessa as fronteiras entre pedaços."""
+
+    def __init__(self, automaton: Automaton):
+        self.a = automaton
+        self.state = 0
+        self.offset = 0
+
+    def feed(self, chunk: str) -> Optional[GuardianMatch]:
+        """Consome um pedaço; devolve a primeira violação (offsets globais) ou None."""
+        a, s, base = self.a, self.state, self.offset
+        delta, root, out, pats = a.delta, a.root, a.out, a.patterns
+        for i, ch in enumerate(_lower_same_len(chunk)):
+            s = delta[s].get(ch) or root.get(ch, 0)
+            if out[s]:
+                p = pats[out[s][0]]
+                self.state, self.offset = s, base + i + 1
+                return GuardianMatch(base + i + 1 - len(p), base + i + 1, p)
+        self.state, self.offset = s, base + len(chunk)
+        return None
+
+class EarlyAbortStats:
+    """Quanto o corte antecipado poupou, estimado pela média das gerações completas de cada etapa."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.full: Dict[str, List[float]] = {}   # etapa -> [n, média de pedaços, média de segundos]
+        self.counters = {"early_aborts": 0, "chunks_before_abort": 0,
+                         "est_tokens_saved": 0.0, "est_seconds_saved": 0.0}
+
+    def completed(self, stage: str, chunks: int, seconds: float) -> None:
+        with self.lock:
+            n, c, t = self.full.get(stage, [0, 0.0, 0.0])
+            n += 1
+            self.full[stage] = [n, c + (chunks - c) / n, t + (seconds - t) / n]
+
+    def aborted(self, stage: str, chunks: int, seconds: float) -> None:
+        with self.lock:
+            _, c, t = self.full.get(stage, [0, 0.0, 0.0])
+            self.counters["early_aborts"] += 1
+            self.counters["chunks_before_abort"] += chunks
+            self.counters["est_tokens_saved"] += max(0.0, c - chunks)  # ~1 token por pedaço no streaming
+            self.counters["est_seconds_saved"] += max(0.0, t - seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            c = dict(self.counters)
+        c["est_tokens_saved"] = round(c["est_tokens_saved"], 1)
+        c["est_seconds_saved"] = round(c["est_seconds_saved"], 3)
+        return c
+
+class Guardian:
+    def __init__(self, path: Optional[str] = "policy.yaml", section: str = "guardian",
+                 defaults: Iterable[str] = DEFAULT_BANNED, reload_every_s: float = 2.0):
+        self.path = path
+        self.section = section
+        self.defaults = list(defaults)
+        self.reload_every_s = reload_every_s
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self.automaton = Automaton(self.defaults)
+        self.reload(force=True)
+
+    def _load_terms(self) -> List[str]:
+        if not self.path or yaml is None or not os.path.exists(self.path):
+            return self.defaults
+        with open(self.path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        sect = data.get(self.section) or {}
+        terms = list(sect.get("banned") or [])
+        for extra in sect.get("banned_files") or []:  # listas grandes em arquivo (um termo por linha)
+            p = os.path.join(os.path.dirname(self.path), extra)
+            with open(p, encoding="utf-8") as f:
+                terms += [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+        return terms or self.defaults
+
+    def reload(self, force: bool = False) -> bool:
+        """Reconstrói o autômato se o arquivo de política mudou. Retorna True se recarregou."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_every_s:
+            return False
+        with self._lock:
+            self._checked = now
+            mtime = os.path.getmtime(self.path) if self.path and os.path.exists(self.path) else None
+            if not force and mtime == self._mtime:
+                return False
+            try:
+                automaton = Automaton(self._load_terms())
+            except Exception as e:
+                # arquivo no meio de uma edição (YAML inválido, banned_files ausente): fica a política anterior
+                # e a mtime não é registrada, então a próxima checagem tenta de novo
+                logging.warning("guardian: falha ao recarregar %s (%s); mantendo a política anterior", self.path, e)
+                return False
+            self._mtime, self.automaton = mtime, automaton  # troca atômica da referência
+        return True
+
+    @property
+    def terms(self) -> List[str]:
+        return self.automaton.patterns
+
+    def scan(self, text: str) -> List[GuardianMatch]:
+        self.reload()
+        return self.automaton.scan(text)
+
+    def check(self, text: str) -> Tuple[bool, str]:
+        self.reload()
+        m = self.automaton.first(text)
+        if m:
+            return False, self.reason(m)
+        return True, "OK"
+
+    def stream(self) -> StreamScanner:
+        """Scanner incremental sobre a versão atual da política (para texto em streaming)."""
+        self.reload()
+        return StreamScanner(self.automaton)
+
+    @staticmethod
+    def reason(m: GuardianMatch) -> str:
+        return f"Conteúdo bloqueado por política ('{m.term}')."
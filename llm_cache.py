@@ -0,0 +1,125 @@
+# llm_cache.py
+# Cache de respostas do LLM endereçado por conteúdo: chave = sha256(modelo, temperatura, mensagens normalizadas)
+# - camada 1: LRU em memória (OrderedDict)
+# - camada 2: SQLite persistente (sobrevive a restarts, compartilhado entre workers)
+# Temperaturas acima de max_temperature não são cacheadas (respostas não determinísticas são opt-in).
+from __future__ import annotations
+import hashlib, json, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    return [{"role": m.get("role", ""), "content": (m.get("content") or "").replace("\r\n", "\n").strip()}
+            for m in messages]
+
+class LLMCache:
+    def __init__(self, path: Optional[str] = "llm_cache.sqlite", max_items: int = 1024,
+                 max_rows: int = 50000, ttl_s: float = 7 * 86400, max_temperature: float = 0.0):
+        self.max_items = max_items
+        self.max_rows = max_rows
+        self.ttl_s = ttl_s
+        self.max_temperature = max_temperature
+        self.lock = threading.Lock()
+        self.mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (ts, value)
+        self.counters = {"hits_memory": 0, "hits_sqlite": 0, "misses": 0, "stores": 0,
+                         "bypassed": 0, "evictions": 0, "expired": 0}
+        self._puts = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL;")
+            self.db.execute("PRAGMA synchronous=NORMAL;")
+            self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache(
+              key TEXT PRIMARY KEY,
+              value TEXT NOT NULL,
+              ts REAL NOT NULL,
+              accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed);
+            """)
+            self.db.commit()
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps({"model": model, "temperature": round(float(temperature), 4),
+                              "messages": normalize_messages(messages)},
+                             ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature: float) -> bool:
+        return temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            item = self.mem.get(key)
+            if item is not None:
+                if now - item[0] <= self.ttl_s:
+                    self.mem.move_to_end(key)
+                    self.counters["hits_memory"] += 1
+                    return item[1]
+                del self.mem[key]
+                self.counters["expired"] += 1
+            if self.db is not None:
+                row = self.db.execute("SELECT ts, value FROM llm_cache WHERE key=?", (key,)).fetchone()
+                if row and now - row[0] <= self.ttl_s:
+                    self.db.execute("UPDATE llm_cache SET accessed=? WHERE key=?", (now, key))
+                    self.db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.counters["hits_sqlite"] += 1
+                    return row[1]
+                if row:
+                    self.db.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                    self.db.commit()
+                    self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, value)
+            self.counters["stores"] += 1
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO llm_cache(key, value, ts, accessed) VALUES(?,?,?,?)",
+                                (key, value, now, now))
+                self._puts += 1
+                if self._puts % 256 == 0:
+                    self._evict_sqlite()
+                self.db.commit()
+
+    def bypass(self) -> None:
+        with self.lock:
+            self.counters["bypassed"] += 1
+
+    def _remember(self, key: str, ts: float, value: str) -> None:
+        self.mem[key] = (ts, value)
+        self.mem.move_to_end(key)
+        while len(self.mem) > self.max_items:
+            self.mem.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _evict_sqlite(self) -> None:
+        # remove expirados e, acima do teto, os menos acessados
+        self.db.execute("DELETE FROM llm_cache WHERE ts < ?", (time.time() - self.ttl_s,))
+        n = self.db.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+        if n > self.max_rows:
+            cur = self.db.execute("DELETE FROM llm_cache WHERE key IN "
+                                  "(SELECT key FROM llm_cache ORDER BY accessed ASC LIMIT ?)", (n - self.max_rows,))
+            self.counters["evictions"] += cur.rowcount
+
+    def clear(self) -> None:
+        with self.lock:
+            self.mem.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM llm_cache")
+                self.db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            c = dict(self.counters)
+            c["memory_items"] = len(self.mem)
+        hits = c["hits_memory"] + c["hits_sqlite"]
+        c["hit_rate"] = round(hits / (hits + c["misses"]), 4) if hits + c["misses"] else 0.0
+        return c
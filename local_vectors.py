@@ -0,0 +1,268 @@
+# local_vectors.py
+# Backend vetorial local (só NumPy) com a mesma interface de coleção que o app usa do Chroma
+# - vetores normalizados em float32 num arquivo memmap (vectors.f32), capacidade dobrada quando enche
+# - ids/documentos/metadados em snapshot.json + log JSONL das escritas seguintes (ops.jsonl): escrita = append,
+#   carga = um json.load do snapshot + replay do log. Quando o log passa do dobro das linhas vivas vira snapshot;
+#   a "geração" no snapshot e no cabeçalho do log diz se o log já está contido no snapshot (queda no meio).
+# - busca exata: produto interno sobre a fatia usada do memmap (sem cópia) + argpartition
+from __future__ import annotations
+import json, operator, os, re, threading, zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+class HashingEmbedding:
+    """Embedding sem modelo: unigramas e bigramas de palavras espalhados por hashing (sinal pelo hash).
+
+    Captura sobreposição lexical (não sinônimos); serve para implantações pequenas e testes.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for r, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            for tok in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[r, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return (out / np.where(norms == 0, 1, norms)).tolist()
+
+_OPS = {"$eq": operator.eq, "$ne": operator.ne, "$gt": operator.gt, "$gte": operator.ge,
+        "$lt": operator.lt, "$lte": operator.le, "$in": lambda v, ref: v in ref,
+        "$nin": lambda v, ref: v not in ref}
+
+def _match(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Subconjunto do filtro `where` do Chroma: $and, $or, igualdade e os operadores de _OPS."""
+    if "$and" in where:
+        return all(_match(meta, w) for w in where["$and"])
+    if "$or" in where:
+        return any(_match(meta, w) for w in where["$or"])
+    for key, cond in where.items():
+        val = meta.get(key)
+        for op, ref in (cond.items() if isinstance(cond, dict) else [("$eq", cond)]):
+            if val is None and op in ("$gt", "$gte", "$lt", "$lte"):
+                return False
+            if not _OPS[op](val, ref):
+                return False
+    return True
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.where(norms == 0, 1, norms)
+
+class LocalCollection:
+    def __init__(self, path: str, embedding_function: Callable[[Sequence[str]], Any], dim: Optional[int] = None):
+        self.path = path
+        self.ef = embedding_function
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.vec_path = os.path.join(path, "vectors.f32")
+        self.log_path = os.path.join(path, "ops.jsonl")
+        self.snap_path = os.path.join(path, "snapshot.json")
+        self.gen = 0
+        self.info_path = os.path.join(path, "info.json")
+        self.rows: Dict[str, int] = {}              # id -> linha no memmap
+        self.id_at: List[Optional[str]] = []        # linha -> id
+        self.docs: Dict[str, str] = {}
+        self.metas: Dict[str, Dict[str, Any]] = {}
+        self.free: List[int] = []
+        self.top = 0                                # linhas já usadas (vivas ou livres)
+        self.log_lines = 0
+        self.dim = dim
+        self.cap = 0
+        self.mat: Optional[np.memmap] = None
+        self.live = np.zeros(0, dtype=bool)
+        self._load()
+
+    # ---- persistência ----
+    def _load(self) -> None:
+        if os.path.exists(self.info_path):
+            with open(self.info_path, encoding="utf-8") as f:
+                info = json.load(f)
+            self.dim, self.cap = info["dim"], info["cap"]
+            self.mat = np.memmap(self.vec_path, dtype=np.float32, mode="r+", shape=(self.cap, self.dim))
+            self.live = np.zeros(self.cap, dtype=bool)
+        if os.path.exists(self.snap_path):
+            with open(self.snap_path, encoding="utf-8") as f:
+                snap = json.load(f)
+            self.gen = snap["gen"]
+            for id_, row, doc, meta in snap["items"]:
+                self._place(id_, row, doc, meta)
+        if os.path.exists(self.log_path):
+            good = 0  # fim da última linha íntegra: o resto é cortado para o próximo append começar limpo
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):  # última linha truncada por queda no meio da escrita
+                        break
+                    if not line.strip():
+                        good += len(line)
+                        continue
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        break
+                    if op["op"] == "gen":
+                        if op["gen"] != self.gen:  # log antigo, já incorporado ao snapshot
+                            good = 0
+                            break
+                        good += len(line)
+                        continue
+                    good += len(line)
+                    self.log_lines += 1
+                    if op["op"] == "put":
+                        self._place(op["id"], op["row"], op["doc"], op["meta"])
+                    else:
+                        self._drop(op["id"])
+                end = f.seek(0, os.SEEK_END)
+            if good == 0:
+                os.remove(self.log_path)  # _append_log recria com o cabeçalho da geração atual
+            elif good < end:
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(good)
+        self.free = [r for r in range(self.top) if not self.live[r]]
+
+    def _place(self, id_: str, row: int, doc: str, meta: Dict[str, Any]) -> None:
+        old = self.rows.get(id_)
+        if old is not None and old != row:
+            self.live[old] = False
+        self.rows[id_], self.docs[id_], self.metas[id_] = row, doc, meta
+        self.live[row] = True
+        if row >= len(self.id_at):
+            self.id_at.extend([None] * (row + 1 - len(self.id_at)))
+        self.id_at[row] = id_
+        self.top = max(self.top, row + 1)
+
+    def _drop(self, id_: str) -> None:
+        row = self.rows.pop(id_, None)
+        if row is not None:
+            self.live[row] = False
+            self.id_at[row] = None
+            self.free.append(row)
+        self.docs.pop(id_, None)
+        self.metas.pop(id_, None)
+
+    def _ensure(self, dim: int, rows: int) -> None:
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(f"dimensão {dim} difere da coleção ({self.dim})")
+        if rows <= self.cap:
+            return
+        cap = max(1024, self.cap)
+        while cap < rows:
+            cap *= 2
+        if self.mat is not None:
+            self.mat.flush()
+            del self.mat
+        with open(self.vec_path, "ab") as f:
+            f.truncate(cap * self.dim * 4)
+        self.mat = np.memmap(self.vec_path, dtype=np.float32, mode="r+", shape=(cap, self.dim))
+        self.live = np.concatenate([self.live, np.zeros(cap - len(self.live), dtype=bool)])
+        self.cap = cap
+        tmp = self.info_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "cap": self.cap}, f)
+        os.replace(tmp, self.info_path)
+
+    def _append_log(self, ops: List[Dict[str, Any]]) -> None:
+        new = not os.path.exists(self.log_path)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            if new:
+                f.write(json.dumps({"op": "gen", "gen": self.gen}) + "\n")
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+        self.log_lines += len(ops)
+        if self.log_lines > 1024 and self.log_lines > 2 * len(self.rows):
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """Grava o estado inteiro em snapshot.json e recomeça o log (nova geração)."""
+        with self.lock:
+            gen = self.gen + 1
+            tmp = self.snap_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"gen": gen, "items": [[i, r, self.docs[i], self.metas[i]] for i, r in self.rows.items()]},
+                          f, ensure_ascii=False)
+            os.replace(tmp, self.snap_path)
+            tmp = self.log_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"op": "gen", "gen": gen}) + "\n")
+            os.replace(tmp, self.log_path)
+            self.gen, self.log_lines = gen, 0
+
+    # ---- interface de coleção (subconjunto do Chroma) ----
+    def count(self) -> int:
+        return len(self.rows)
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+               embeddings: Optional[Sequence[Sequence[float]]] = None) -> None:
+        if len(set(ids)) != len(ids):
+            raise ValueError("ids repetidos no mesmo upsert")
+        vecs = _normalize(np.asarray(embeddings if embeddings is not None else self.ef(documents), dtype=np.float32))
+        metadatas = metadatas or [{} for _ in ids]
+        with self.lock:
+            new = sum(1 for i in ids if i not in self.rows)
+            self._ensure(vecs.shape[1], self.top + max(0, new - len(self.free)))
+            ops = []
+            for id_, doc, meta, vec in zip(ids, documents, metadatas, vecs):
+                row = self.rows.get(id_)
+                if row is None:
+                    row = self.free.pop() if self.free else self.top
+                self.mat[row] = vec
+                self._place(id_, row, doc, meta or {})
+                ops.append({"op": "put", "id": id_, "row": row, "doc": doc, "meta": meta or {}})
+            self.mat.flush()  # vetores no disco antes do log que aponta para eles
+            self._append_log(ops)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+            embeddings: Optional[Sequence[Sequence[float]]] = None) -> None:
+        with self.lock:
+            dup = [i for i in ids if i in self.rows]
+            if dup:
+                raise ValueError(f"ids já existentes: {dup[:5]}")
+            self.upsert(ids, documents, metadatas, embeddings)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        with self.lock:
+            targets = [i for i in (ids or []) if i in self.rows]
+            if where:
+                targets += [i for i, m in self.metas.items() if _match(m, where)]
+            targets = list(dict.fromkeys(targets))
+            for id_ in targets:
+                self._drop(id_)
+            if targets:
+                self._append_log([{"op": "del", "id": i} for i in targets])
+
+    def query(self, query_embeddings: Optional[Sequence[Sequence[float]]] = None,
+              query_texts: Optional[List[str]] = None, n_results: int = 10,
+              include: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        include = include or ["documents", "metadatas", "distances"]
+        q = _normalize(np.asarray(query_embeddings if query_embeddings is not None else self.ef(query_texts),
+                                  dtype=np.float32))
+        out: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self.lock:
+            id_at, n = self.id_at, self.top
+            ok = self.live[:n].copy()
+            if where:
+                ok &= np.fromiter((id_at[r] is not None and _match(self.metas[id_at[r]], where) for r in range(n)),
+                                  dtype=bool, count=n)
+            valid = int(ok.sum())
+            for qv in q:
+                if not valid:
+                    hits, scores = [], np.zeros(0, dtype=np.float32)
+                else:
+                    scores = self.mat[:n] @ qv  # fatia do memmap: sem cópia das linhas
+                    scores[~ok] = -np.inf
+                    k = min(n_results, valid)
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    top = top[np.argsort(-scores[top])]
+                    hits, scores = [id_at[int(t)] for t in top], scores[top]
+                out["ids"].append(hits)
+                out["documents"].append([self.docs[i] for i in hits])
+                out["metadatas"].append([self.metas[i] for i in hits])
+                out["distances"].append([float(1.0 - s) for s in scores])
+        return {k: v for k, v in out.items() if k == "ids" or k in include}
@@ -1,10 +1,36 @@
 # memory_store.py
 # Camada de memória (grafo leve em SQLite) + utilidades
 from __future__ import annotations
-import sqlite3, json, time, math, hashlib
+import sqlite3, json, time, math, hashlib, threading, os, re, queue, atexit, logging
+from collections import deque
 from typing import List, Dict, Any, Tuple, Optional
 
+import numpy as np
+
+from ann_index import IVFIndex
+
 DB_PATH = "memory_store.sqlite"
+SCHEMA_VERSION = 2  # 1 = embeddings em BLOB float32; 2 = índice FTS5 (nodes_fts)
+
+# Busca vetorial: "exact" (varredura NumPy) ou "ivf" (aproximada, ver ann_index.py)
+ANN_MODE = os.getenv("MEMORY_ANN", "exact")
+ANN_NPROBE = int(os.getenv("MEMORY_ANN_NPROBE", "8"))
+
+# Arestas "related" de upsert_memory: calculadas por uma thread em lote (o insert do nó volta na hora).
+# Bancos :memory: (sem segunda conexão possível) e MEMORY_EDGE_WORKER=0 calculam na própria chamada.
+EDGE_WORKER = os.getenv("MEMORY_EDGE_WORKER", "1") == "1"
+EDGE_BATCH = int(os.getenv("MEMORY_EDGE_BATCH", "256"))
+
+# PageRank personalizado (ppr_retrieve): teleporte alpha e tolerância do push (resíduo por grau)
+PPR_ALPHA = float(os.getenv("MEMORY_PPR_ALPHA", "0.15"))
+PPR_EPS = float(os.getenv("MEMORY_PPR_EPS", "1e-4"))
+
+# Busca híbrida em search_memory: "rrf" (reciprocal rank fusion), "weighted" (w_vec*cos + w_lex*BM25
+# normalizado) ou "vector" (só embedding, comportamento antigo)
+FUSION_MODE = os.getenv("MEMORY_FUSION", "rrf")
+FUSION_W_VEC = float(os.getenv("MEMORY_W_VEC", "1.0"))
+FUSION_W_LEX = float(os.getenv("MEMORY_W_LEX", "1.0"))
+RRF_K = int(os.getenv("MEMORY_RRF_K", "60"))
 
 # --- Embedding (stub): troque por uma real quando quiser ---
 def embed(text: str, dim: int = 64) -> List[float]:
@@ -16,22 +42,80 @@ def embed(text: str, dim: int = 64) -> List[float]:
     n = math.sqrt(sum(v*v for v in vals)) or 1.0
     return [v / n for v in vals]
 
+def embed_batch(texts: List[str], dim: int = 64, batch_size: int = 256) -> np.ndarray:
+    # ponto único para trocar por um embedder em lote (API/ONNX); o stub é por texto
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for lo in range(0, len(texts), batch_size):
+        chunk = texts[lo:lo + batch_size]
+        out[lo:lo + len(chunk)] = [embed(t, dim) for t in chunk]
+    return out
+
 def cos(a: List[float], b: List[float]) -> float:
     return sum(x*y for x,y in zip(a,b))
 
-def connect() -> sqlite3.Connection:
-    con = sqlite3.connect(DB_PATH)
-    con.execute("PRAGMA journal_mode=WAL;")
-    con.execute("PRAGMA synchronous=NORMAL;")
-    ensure_schema(con)
+# --- Serialização binária dos embeddings (float32 little-endian) ---
+def pack_vec(vec) -> bytes:
+    return np.asarray(vec, dtype="<f4").tobytes()
+
+def unpack_vec(blob) -> np.ndarray:
+    if isinstance(blob, str):  # linha legada (JSON) ainda não migrada
+        return np.asarray(json.loads(blob), dtype=np.float32)
+    return np.frombuffer(blob, dtype="<f4")
+
+# --- Conexões: schema uma vez por processo, uma conexão por thread (rw e ro) ---
+_SCHEMA_READY: set = set()
+_SCHEMA_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+def _open(path: str, readonly: bool) -> sqlite3.Connection:
+    if readonly:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        con.execute("PRAGMA query_only=1;")
+    else:
+        con = sqlite3.connect(path)
+        con.execute("PRAGMA synchronous=NORMAL;")
+    con.execute("PRAGMA busy_timeout=5000;")
     return con
 
+def _prepare(path: str) -> None:
+    # WAL é persistente no arquivo; DDL/migração rodam só na primeira conexão do processo
+    with _SCHEMA_LOCK:
+        if path in _SCHEMA_READY:
+            return
+        con = sqlite3.connect(path)
+        con.execute("PRAGMA journal_mode=WAL;")
+        ensure_schema(con)
+        con.close()
+        _SCHEMA_READY.add(path)
+
+def connect(readonly: bool = False, pooled: bool = True) -> sqlite3.Connection:
+    """Conexão com DB_PATH. Por padrão reaproveita a conexão da thread atual;
+    readonly=True abre em modo somente leitura (caminhos de busca)."""
+    path = DB_PATH
+    _prepare(path)
+    if not pooled:
+        return _open(path, readonly)
+    pool = getattr(_LOCAL, "pool", None)
+    if pool is None:
+        pool = _LOCAL.pool = {}
+    con = pool.get((path, readonly))
+    if con is None:
+        con = pool[(path, readonly)] = _open(path, readonly)
+    return con
+
+def close_connections() -> None:
+    """Fecha as conexões em cache da thread atual (e grava os índices IVF com mudanças pendentes)."""
+    save_ann_indexes()
+    for con in getattr(_LOCAL, "pool", {}).values():
+        con.close()
+    _LOCAL.pool = {}
+
 def ensure_schema(con: sqlite3.Connection) -> None:
     con.executescript("""
     CREATE TABLE IF NOT EXISTS nodes(
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       text TEXT NOT NULL,
-      embedding TEXT NOT NULL, -- JSON array
+      embedding BLOB NOT NULL, -- float32 empacotado (pack_vec)
       ts REAL NOT NULL DEFAULT (strftime('%s','now')),
       source TEXT DEFAULT NULL,
       meta   TEXT DEFAULT NULL
@@ -58,22 +142,75 @@ def ensure_schema(con: sqlite3.Connection) -> None:
     );
     """)
     con.commit()
+    fts = ensure_fts(con)
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        migrate_embeddings(con)
+    if version < 2 and fts:  # banco anterior ao FTS: indexa o que já existe
+        con.execute("INSERT INTO nodes_fts(nodes_fts) VALUES('rebuild')")
+    if version < SCHEMA_VERSION:
+        con.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        con.commit()
+
+def ensure_fts(con: sqlite3.Connection) -> bool:
+    """Índice FTS5 externo sobre nodes.text, mantido por triggers. False se o SQLite não tem FTS5."""
+    try:
+        con.executescript("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS nodes_fts USING fts5(
+          text, content='nodes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS nodes_fts_ai AFTER INSERT ON nodes BEGIN
+          INSERT INTO nodes_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS nodes_fts_ad AFTER DELETE ON nodes BEGIN
+          INSERT INTO nodes_fts(nodes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS nodes_fts_au AFTER UPDATE OF text ON nodes BEGIN
+          INSERT INTO nodes_fts(nodes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+          INSERT INTO nodes_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+        """)
+        return True
+    except sqlite3.OperationalError:  # compilado sem FTS5: busca fica só vetorial
+        return False
+
+def migrate_embeddings(con: sqlite3.Connection, batch: int = 5000) -> int:
+    """Converte embeddings legados (JSON) para BLOB float32. Idempotente."""
+    done = 0
+    while True:
+        rows = con.execute("SELECT id, embedding FROM nodes WHERE typeof(embedding)='text' LIMIT ?",
+                           (batch,)).fetchall()
+        if not rows:
+            break
+        con.executemany("UPDATE nodes SET embedding=? WHERE id=?",
+                        [(pack_vec(json.loads(e)), nid) for nid, e in rows])
+        done += len(rows)
+    con.commit()
+    return done
 
 def upsert_memory(con: sqlite3.Connection, text: str, source: str = None, meta: Dict[str,Any] = None,
-                  relate_top_k: int = 3, relate_min_cos: float = 0.55) -> int:
+                  relate_top_k: int = 3, relate_min_cos: float = 0.55, background: bool = None) -> int:
+    """Grava o nó e devolve o id. As arestas "related" vão para o EdgeBuilder (background=None segue
+    MEMORY_EDGE_WORKER); use flush_edges() quando precisar delas já gravadas."""
     # tenta achar id existente
     cur = con.execute("SELECT id FROM nodes WHERE text=?", (text,))
     row = cur.fetchone()
     if row:
         return row[0]
     vec = embed(text)
-    emb_json = json.dumps(vec)
-    con.execute("INSERT INTO nodes(text, embedding, source, meta) VALUES(?,?,?,?)",
-                (text, emb_json, source, json.dumps(meta or {})))
-    nid = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+    cur = con.execute("INSERT INTO nodes(text, embedding, source, meta) VALUES(?,?,?,?)",
+                      (text, pack_vec(vec), source, json.dumps(meta or {})))
+    nid = cur.lastrowid
+    # sync antes do add: num processo novo a matriz ainda não tem os nós antigos (o add subiria last_id)
+    _vector_index(con).add(nid, vec)
+    key = _db_key(con)
+    if (EDGE_WORKER if background is None else background) and not key.startswith(":memory:"):
+        con.commit()  # o worker lê o nó pela conexão dele
+        edge_builder(key).submit(nid, vec, relate_top_k, relate_min_cos)
+        return nid
     # cria arestas "related" com os mais próximos
-    rels = most_similar(con, vec, top_k=relate_top_k)
-    for other_id, score in rels:
+    rels = most_similar(con, vec, top_k=relate_top_k + 1)  # +1: o próprio nó já está na matriz
+    for other_id, score in [r for r in rels if r[0] != nid][:relate_top_k]:
         if score < relate_min_cos: 
             continue
         con.execute("INSERT OR IGNORE INTO edges(src,dst,rel,weight) VALUES(?,?,?,?)",
@@ -81,45 +218,692 @@ def upsert_memory(con: sqlite3.Connection, text: str, source: str = None, meta:
         con.execute("INSERT OR IGNORE INTO edges(src,dst,rel,weight) VALUES(?,?,?,?)",
                     (other_id, nid, "related", score))
     con.commit()
+    edge_graph(con, create=False)  # snapshot já carregado: recebe só as arestas novas
     return nid
 
-def most_similar(con: sqlite3.Connection, vec: List[float], top_k: int = 5) -> List[Tuple[int,float]]:
-    rows = con.execute("SELECT id, embedding FROM nodes").fetchall()
-    scored = []
-    for nid, emb_json in rows:
-        v = json.loads(emb_json)
-        scored.append((nid, cos(vec, v)))
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored[:top_k]
+def upsert_memories(con: sqlite3.Connection, texts: List[str], sources: List[str] = None,
+                    metas: List[Dict[str,Any]] = None, relate_top_k: int = 3, relate_min_cos: float = 0.55,
+                    embed_batch_size: int = 256) -> Dict[str,Any]:
+    """Ingestão em lote: dedup numa consulta, insert numa transação e arestas "related" num só passe.
+
+    Retorna {"ids", "inserted", "skipped", "edges", "seconds", "per_s"}; `ids` segue a ordem de `texts`.
+    """
+    t0 = time.perf_counter()
+    sources = sources or [None] * len(texts)
+    metas = metas or [None] * len(texts)
+    existing = dict(con.execute("SELECT text, id FROM nodes WHERE text IN (SELECT value FROM json_each(?))",
+                                (json.dumps(texts),)).fetchall())
+    new_pos, seen = [], set()
+    for i, t in enumerate(texts):
+        if t not in existing and t not in seen:
+            seen.add(t)
+            new_pos.append(i)
+    new_texts = [texts[i] for i in new_pos]
+    edges = 0
+    if new_texts:
+        vecs = embed_batch(new_texts, batch_size=embed_batch_size)
+        with con:  # uma transação para nós + arestas
+            con.executemany("INSERT INTO nodes(text, embedding, source, meta) VALUES(?,?,?,?)",
+                            ((texts[i], pack_vec(v), sources[i], json.dumps(metas[i] or {}))
+                             for i, v in zip(new_pos, vecs)))
+            rows = con.execute("SELECT text, id FROM nodes WHERE text IN (SELECT value FROM json_each(?))",
+                               (json.dumps(new_texts),)).fetchall()
+            new_ids = dict(rows)
+            existing.update(new_ids)
+            ids = np.asarray([new_ids[t] for t in new_texts], dtype=np.int64)
+            all_ids, mat = _vector_index(con).view()  # o sync já traz os nós recém-inseridos
+            pairs = _related_pairs(ids, vecs, all_ids, mat, relate_top_k, relate_min_cos)
+            before = con.total_changes
+            con.executemany("INSERT OR IGNORE INTO edges(src,dst,rel,weight) VALUES(?,?,?,?)", pairs)
+            edges = con.total_changes - before
+        edge_graph(con, create=False)
+    dt = time.perf_counter() - t0
+    return {"ids": [existing[t] for t in texts], "inserted": len(new_texts),
+            "skipped": len(texts) - len(new_texts), "edges": edges,
+            "seconds": round(dt, 4), "per_s": round(len(texts) / dt, 1) if dt else None}
+
+def _related_pairs(ids: np.ndarray, vecs: np.ndarray, all_ids: np.ndarray, mat: np.ndarray, top_k: int,
+                   min_cos: float) -> List[Tuple[int,int,str,float]]:
+    """Linhas (src, dst, "related", cos) nos dois sentidos para os top_k vizinhos de cada vetor."""
+    pairs = []
+    for lo, (top_pos, top_sc) in _block_top_k(vecs, mat, top_k):
+        for r in range(len(top_pos)):
+            nid = int(ids[lo + r])
+            for p, sc in zip(top_pos[r], top_sc[r]):
+                if sc < min_cos:
+                    continue
+                other, w = int(all_ids[p]), float(sc)
+                pairs.append((nid, other, "related", w))
+                pairs.append((other, nid, "related", w))
+    return pairs
+
+class EdgeBuilder:
+    """Thread que calcula as arestas "related" dos nós novos em lote, com conexão própria ao banco.
+
+    submit() só enfileira. O worker junta até `batch` nós pendentes, calcula os vizinhos de todos com um
+    produto matricial por bloco (_block_top_k) e grava as arestas numa transação. flush() espera a fila
+    esvaziar; stats() traz profundidade da fila e atraso (enfileirado -> arestas gravadas).
+    """
+    def __init__(self, path: str, batch: int = 256):
+        self.path = path
+        self.batch = max(1, batch)
+        self.q: "queue.Queue[Tuple[int, Any, int, float, float]]" = queue.Queue()
+        self.cond = threading.Condition()
+        self.waiting: Dict[int, float] = {}  # nid -> instante do submit, em ordem de chegada
+        self.counters = {"submitted": 0, "built": 0, "batches": 0, "edges": 0, "errors": 0}
+        self.lag = {"last_s": 0.0, "max_s": 0.0, "sum_s": 0.0}
+        self.thread = threading.Thread(target=self._run, name="edge-builder", daemon=True)
+        self.thread.start()
+
+    def submit(self, nid: int, vec, top_k: int = 3, min_cos: float = 0.55) -> None:
+        now = time.monotonic()
+        with self.cond:
+            self.waiting[nid] = now
+            self.counters["submitted"] += 1
+        self.q.put((nid, vec, top_k, min_cos, now))
+
+    def _run(self) -> None:
+        con = _open(self.path, readonly=False)
+        while True:
+            items = [self.q.get()]
+            while len(items) < self.batch:
+                try:
+                    items.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                edges = self._build(con, items)
+            except Exception:
+                logging.exception("edge-builder: falha num lote de %d nós", len(items))
+                edges, failed = 0, True
+            else:
+                failed = False
+            now = time.monotonic()
+            with self.cond:
+                for nid, *_, ts in items:
+                    self.waiting.pop(nid, None)
+                    lag = now - ts
+                    self.lag["last_s"], self.lag["sum_s"] = lag, self.lag["sum_s"] + lag
+                    self.lag["max_s"] = max(self.lag["max_s"], lag)
+                self.counters["errors" if failed else "built"] += len(items)
+                self.counters["batches"] += 1
+                self.counters["edges"] += edges
+                self.cond.notify_all()
+
+    def _build(self, con: sqlite3.Connection, items) -> int:
+        all_ids, mat = _vector_index(con).view()
+        alive = set(all_ids[np.isin(all_ids, [it[0] for it in items])].tolist())
+        items = [it for it in items if it[0] in alive]  # apagado antes de o lote rodar: sem arestas
+        pairs = []
+        groups: Dict[Tuple[int, float], List] = {}
+        for it in items:
+            groups.setdefault((it[2], it[3]), []).append(it)
+        for (top_k, min_cos), group in groups.items():
+            ids = np.asarray([it[0] for it in group], dtype=np.int64)
+            vecs = np.asarray([it[1] for it in group], dtype=np.float32)
+            pairs += _related_pairs(ids, vecs, all_ids, mat, top_k, min_cos)
+        with con:
+            before = con.total_changes
+            con.executemany("INSERT OR IGNORE INTO edges(src,dst,rel,weight) VALUES(?,?,?,?)", pairs)
+            edges = con.total_changes - before
+        edge_graph(con, create=False)  # snapshot já carregado neste processo: entra com as arestas novas
+        return edges
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera até todas as arestas enfileiradas estarem gravadas; False se o timeout vencer antes."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.waiting, timeout)
+
+    def stats(self) -> Dict[str,Any]:
+        with self.cond:
+            oldest = next(iter(self.waiting.values()), None)
+            done = self.counters["built"] + self.counters["errors"]
+            return {**self.counters, "queue_depth": len(self.waiting),
+                    "oldest_wait_s": round(time.monotonic() - oldest, 4) if oldest is not None else 0.0,
+                    "lag_last_s": round(self.lag["last_s"], 4), "lag_max_s": round(self.lag["max_s"], 4),
+                    "lag_avg_s": round(self.lag["sum_s"] / done, 4) if done else 0.0}
+
+_BUILDERS: Dict[str, EdgeBuilder] = {}
+
+def edge_builder(path: str) -> EdgeBuilder:
+    with _INDEXES_LOCK:
+        b = _BUILDERS.get(path)
+        if b is None:
+            b = _BUILDERS[path] = EdgeBuilder(path, EDGE_BATCH)
+        return b
+
+def flush_edges(timeout: float = None) -> bool:
+    """Espera as arestas pendentes de todos os bancos (testes, fim de lote, saída do processo)."""
+    return all(b.flush(timeout) for b in list(_BUILDERS.values()))
+
+def edge_queue_stats() -> Dict[str, Dict[str,Any]]:
+    return {path: b.stats() for path, b in list(_BUILDERS.items())}
+
+atexit.register(flush_edges, 30.0)
+
+def _block_top_k(q: np.ndarray, mat: np.ndarray, k: int, q_block: int = 256, m_block: int = 65536):
+    """Top-k de q @ mat.T por blocos; gera (linha_inicial, (posições, scores)) por bloco de q."""
+    k = min(k, len(mat))
+    for lo in range(0, len(q), q_block):
+        qb = q[lo:lo + q_block]
+        best_p = np.zeros((len(qb), 0), dtype=np.int64)
+        best_s = np.zeros((len(qb), 0), dtype=np.float32)
+        for mlo in range(0, len(mat), m_block):
+            sc = qb @ mat[mlo:mlo + m_block].T
+            kk = min(k, sc.shape[1])
+            part = np.argpartition(-sc, kk - 1, axis=1)[:, :kk]
+            cand_p = np.concatenate([best_p, part + mlo], axis=1)
+            cand_s = np.concatenate([best_s, np.take_along_axis(sc, part, axis=1)], axis=1)
+            keep = np.argsort(-cand_s, axis=1, kind="stable")[:, :k]
+            best_p = np.take_along_axis(cand_p, keep, axis=1)
+            best_s = np.take_along_axis(cand_s, keep, axis=1)
+        yield lo, (best_p, best_s)
+
+# --- Matriz de vetores em memória (uma por arquivo de banco) ---
+class VectorMatrix:
+    """Cópia em NumPy de todos os embeddings de `nodes`, sincronizada por id crescente."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.mat: Optional[np.ndarray] = None
+        self.n = 0
+        self.last_id = 0
+
+    def _append(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        if self.mat is None:
+            self.mat = np.zeros((max(1024, len(ids)), vecs.shape[1]), dtype=np.float32)
+            self.ids = np.zeros(len(self.mat), dtype=np.int64)
+        need = self.n + len(ids)
+        if need > len(self.mat):  # cresce em dobro: append amortizado O(1)
+            cap = max(need, 2 * len(self.mat))
+            self.mat = np.resize(self.mat, (cap, self.mat.shape[1]))
+            self.ids = np.resize(self.ids, cap)
+        self.mat[self.n:need] = vecs
+        self.ids[self.n:need] = ids
+        self.n = need
+        self.last_id = max(self.last_id, int(ids.max()))
+
+    def add(self, nid: int, vec) -> None:
+        self.extend(np.asarray([nid], dtype=np.int64), np.asarray(vec, dtype=np.float32)[None, :])
+
+    def extend(self, ids: np.ndarray, vecs: np.ndarray) -> None:
+        # ids em ordem crescente; os já carregados (<= last_id) são ignorados
+        with self.lock:
+            fresh = ids > self.last_id
+            if fresh.any():
+                self._append(ids[fresh], vecs[fresh])
+
+    def remove(self, nid: int) -> None:
+        with self.lock:
+            keep = self.ids[:self.n] != nid
+            if keep.all():
+                return
+            m = int(keep.sum())
+            self.ids[:m] = self.ids[:self.n][keep]
+            self.mat[:m] = self.mat[:self.n][keep]
+            self.n = m
+
+    def since(self, last_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        ids, mat = self.view()
+        lo = int(np.searchsorted(ids, last_id, side="right"))  # ids em ordem crescente
+        return ids[lo:], mat[lo:]
+
+    def scores_for(self, nids: List[int], q) -> Dict[int, float]:
+        """Cosseno de q contra os ids pedidos (busca binária nos ids ordenados)."""
+        ids, mat = self.view()
+        want = np.asarray(sorted(nids), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(ids, want), max(len(ids) - 1, 0))
+        ok = ids[pos] == want if len(ids) else np.zeros(len(want), dtype=bool)
+        sc = mat[pos[ok]] @ np.asarray(q, dtype=np.float32)
+        return dict(zip(want[ok].tolist(), sc.tolist()))
 
-def search_memory(con: sqlite3.Connection, query: str, top_k: int = 5, expand_hops: int = 1) -> Dict[str,Any]:
+    def sync(self, con: sqlite3.Connection) -> None:
+        # só lê linhas novas (inseridas por outra conexão/processo)
+        with self.lock:
+            rows = con.execute("SELECT id, embedding FROM nodes WHERE id > ? ORDER BY id",
+                               (self.last_id,)).fetchall()
+            if rows:
+                self._append(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+                             np.stack([unpack_vec(r[1]) for r in rows]))
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            if self.mat is None:
+                return self.ids[:0], np.zeros((0, 0), dtype=np.float32)
+            return self.ids[:self.n], self.mat[:self.n]
+
+# --- Adjacência "related" em CSR (uma por arquivo de banco) ---
+class EdgeGraph:
+    """Arestas "related" em CSR NumPy (indptr/indices/weights indexados pelo id do nó) + um delta de arestas
+    novas, fundido ao CSR quando cresce. Expansão em saltos sem SQL.
+
+    Sincroniza por rowid crescente de `edges`, como a VectorMatrix faz com `nodes`. `gen` sobe a cada
+    mudança de conteúdo: quem guardou um resultado compara com o gen atual para saber se ficou velho.
+    Remoções (delete_memory) invalidam o snapshot, recarregado inteiro no próximo uso.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gen = 0
+        self.loaded = False
+        self.last_rowid = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.d_src = np.zeros(0, dtype=np.int64)
+        self.d_dst = np.zeros(0, dtype=np.int64)
+        self.d_w = np.zeros(0, dtype=np.float32)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices) + len(self.d_src)
+
+    def sync(self, con: sqlite3.Connection) -> int:
+        """Lê as arestas com rowid novo (carga inteira na 1ª vez); devolve quantas entraram."""
+        with self.lock:
+            rows = con.execute("SELECT rowid, src, dst, weight FROM edges WHERE rowid > ? AND rel='related' "
+                               "ORDER BY rowid", (self.last_rowid,)).fetchall()
+            self.loaded = True
+            if not rows:
+                return 0
+            arr = np.asarray(rows, dtype=np.float64)
+            self.last_rowid = int(arr[-1, 0])
+            self.d_src = np.concatenate([self.d_src, arr[:, 1].astype(np.int64)])
+            self.d_dst = np.concatenate([self.d_dst, arr[:, 2].astype(np.int64)])
+            self.d_w = np.concatenate([self.d_w, arr[:, 3].astype(np.float32)])
+            if len(self.d_src) > max(1024, len(self.indices) // 8):
+                self._compact()
+            self.gen += 1
+            return len(rows)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._reset()
+            self.loaded, self.last_rowid = False, 0
+            self.gen += 1
+
+    def _compact(self) -> None:
+        # CSR + delta -> CSR novo: ordena por origem (estável) e conta o grau de cada id
+        src = np.concatenate([np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr)), self.d_src])
+        dst = np.concatenate([self.indices, self.d_dst])
+        w = np.concatenate([self.weights, self.d_w])
+        order = np.argsort(src, kind="stable")
+        counts = np.bincount(src, minlength=len(self.indptr) - 1) if len(src) else np.zeros(0, dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.indices, self.weights = dst[order], w[order]
+        self.d_src = self.d_src[:0]
+        self.d_dst = self.d_dst[:0]
+        self.d_w = self.d_w[:0]
+
+    def degree(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        with self.lock:
+            n = len(self.indptr) - 1
+            inside = ids < n
+            deg = np.zeros(len(ids), dtype=np.int64)
+            deg[inside] = self.indptr[ids[inside] + 1] - self.indptr[ids[inside]]
+            m = np.isin(self.d_src, ids)
+            if m.any():
+                uniq, inv = np.unique(ids, return_inverse=True)
+                deg += np.bincount(np.searchsorted(uniq, self.d_src[m]), minlength=len(uniq))[inv]
+            return deg
+
+    def neighbors(self, frontier) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Arestas saindo de `frontier`: arrays (src, dst, weight)."""
+        f = np.asarray(frontier, dtype=np.int64)
+        with self.lock:
+            f_in = f[f < len(self.indptr) - 1]
+            starts, ends = self.indptr[f_in], self.indptr[f_in + 1]
+            lens = ends - starts
+            # posições de todas as fatias [start, end) sem laço: arange global menos o deslocamento de cada fatia
+            pos = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens - starts, lens)
+            src, dst, w = np.repeat(f_in, lens), self.indices[pos], self.weights[pos]
+            if len(self.d_src):
+                m = np.isin(self.d_src, f)
+                src = np.concatenate([src, self.d_src[m]])
+                dst = np.concatenate([dst, self.d_dst[m]])
+                w = np.concatenate([w, self.d_w[m]])
+            return src, dst, w
+
+    def _out(self, u: int) -> Tuple[np.ndarray, np.ndarray]:
+        # chamar com self.lock: arestas de u no CSR + as do delta
+        if u < len(self.indptr) - 1:
+            a, b = self.indptr[u], self.indptr[u + 1]
+            dst, w = self.indices[a:b], self.weights[a:b]
+        else:
+            dst, w = self.indices[:0], self.weights[:0]
+        if len(self.d_src):
+            m = self.d_src == u
+            if m.any():
+                dst, w = np.concatenate([dst, self.d_dst[m]]), np.concatenate([w, self.d_w[m]])
+        return dst, np.maximum(w, 0.0)
+
+    def ppr(self, seeds: Dict[int, float], alpha: float = 0.15, eps: float = 1e-4,
+            max_pushes: int = 50000) -> Tuple[Dict[int, float], int]:
+        """PageRank personalizado aproximado por push (Andersen-Chung-Lang), a partir de `seeds` {id: peso}.
+
+        Só visita nós cujo resíduo passa de eps*grau: o custo é ~1/(eps*alpha) pushes, independente do
+        tamanho do grafo. Devolve ({id: score}, nº de pushes); scores somam <= 1.
+        """
+        total = sum(v for v in seeds.values() if v > 0)
+        r = {u: v / total for u, v in seeds.items() if v > 0} if total else {u: 1.0 / len(seeds) for u in seeds}
+        p: Dict[int, float] = {}
+        queue, queued = deque(r), set(r)
+        pushes = 0
+        with self.lock:
+            n_csr = len(self.indptr) - 1
+            d_ids, d_cnt = np.unique(self.d_src, return_counts=True)
+            d_deg = dict(zip(d_ids.tolist(), d_cnt.tolist()))
+            # mesmo grau de degree()/expand(): CSR + arestas ainda no delta
+            deg = lambda v: max(1, (int(self.indptr[v + 1] - self.indptr[v]) if v < n_csr else 0) + d_deg.get(v, 0))
+            while queue and pushes < max_pushes:
+                u = queue.popleft()
+                queued.discard(u)
+                ru = r.get(u, 0.0)
+                if ru <= eps * deg(u):
+                    continue
+                pushes += 1
+                r[u] = 0.0
+                dst, w = self._out(u)
+                wsum = float(w.sum())
+                if wsum <= 0:  # sem saída: o nó fica com o resíduo todo
+                    p[u] = p.get(u, 0.0) + ru
+                    continue
+                p[u] = p.get(u, 0.0) + alpha * ru
+                share = (1.0 - alpha) * ru / wsum
+                for v, wv in zip(dst.tolist(), w.tolist()):
+                    rv = r.get(v, 0.0) + share * wv
+                    r[v] = rv
+                    if v not in queued and rv > eps * deg(v):
+                        queue.append(v)
+                        queued.add(v)
+        return p, pushes
+
+    def expand(self, seeds, hops: int = 1, max_nodes: int = None, min_degree: int = 0,
+               max_degree: int = None) -> Dict[int, Tuple[int, float]]:
+        """Vizinhança de até `hops` saltos: {id: (hop, peso do caminho)}; sementes = (0, 1.0).
+
+        O peso do caminho é o maior produto dos pesos das arestas desde uma semente. max_nodes limita o total
+        (ficam os vizinhos de maior peso); min_degree/max_degree descartam vizinhos pelo grau (ex.: hubs).
+        """
+        out = {int(s): (0, 1.0) for s in seeds}
+        path = dict((nid, 1.0) for nid in out)
+        frontier = np.fromiter(out, dtype=np.int64, count=len(out))
+        for h in range(1, hops + 1):
+            room = None if max_nodes is None else max_nodes - len(out)
+            if not len(frontier) or (room is not None and room <= 0):
+                break
+            src, dst, w = self.neighbors(frontier)
+            pw = np.fromiter((path[s] for s in src.tolist()), dtype=np.float64, count=len(src)) * w
+            new = ~np.isin(dst, np.fromiter(out, dtype=np.int64, count=len(out)))
+            dst, pw = dst[new], pw[new]
+            if not len(dst):
+                break
+            # melhor caminho por destino: ordena por (destino, -peso) e fica com o 1º de cada destino
+            order = np.lexsort((-pw, dst))
+            dst, pw = dst[order], pw[order]
+            first = np.concatenate([[True], dst[1:] != dst[:-1]])
+            dst, pw = dst[first], pw[first]
+            if min_degree or max_degree is not None:
+                deg = self.degree(dst)
+                keep = deg >= min_degree
+                if max_degree is not None:
+                    keep &= deg <= max_degree
+                dst, pw = dst[keep], pw[keep]
+            if room is not None and len(dst) > room:
+                top = np.argsort(-pw, kind="stable")[:room]
+                dst, pw = dst[top], pw[top]
+            for nid, p in zip(dst.tolist(), pw.tolist()):
+                out[nid] = (h, p)
+                path[nid] = p
+            frontier = dst
+        return out
+
+_INDEXES: Dict[str, VectorMatrix] = {}
+_ANN: Dict[str, IVFIndex] = {}
+_GRAPHS: Dict[str, EdgeGraph] = {}
+_INDEXES_LOCK = threading.Lock()
+
+def _db_key(con: sqlite3.Connection) -> str:
+    path = con.execute("PRAGMA database_list").fetchone()[2]
+    return path or f":memory:{id(con)}"
+
+def _vector_index(con: sqlite3.Connection, sync: bool = True) -> VectorMatrix:
+    key = _db_key(con)
+    with _INDEXES_LOCK:
+        vm = _INDEXES.get(key)
+        if vm is None:
+            vm = _INDEXES[key] = VectorMatrix()
+    if sync:
+        vm.sync(con)
+    return vm
+
+def edge_graph(con: sqlite3.Connection, create: bool = True) -> Optional[EdgeGraph]:
+    """Snapshot CSR das arestas "related" do banco, carregado no 1º uso. A cada chamada lê só as arestas com
+    rowid novo (busca no índice do rowid): pega as gravadas depois do nó, pelo EdgeBuilder ou por outro processo."""
+    key = _db_key(con)
+    with _INDEXES_LOCK:
+        g = _GRAPHS.get(key)
+        if g is None:
+            if not create:
+                return None
+            g = _GRAPHS[key] = EdgeGraph()
+    g.sync(con)
+    return g
+
+def _ann_path(key: str) -> Optional[str]:
+    return None if key.startswith(":memory:") else key + ".ivf.npz"
+
+def _ann_index(con: sqlite3.Connection) -> IVFIndex:
+    """Índice IVF do banco: carregado do disco (se houver) e alcançado com os nós novos."""
+    vm = _vector_index(con)
+    key = _db_key(con)
+    with _INDEXES_LOCK:
+        idx = _ANN.get(key)
+        if idx is None:
+            path = _ann_path(key)
+            idx = IVFIndex.load(path, nprobe=ANN_NPROBE) if path else None
+            if idx is None:
+                idx = IVFIndex(vm.view()[1].shape[1] or 64, nprobe=ANN_NPROBE)
+            else:  # descarta nós apagados depois do último save
+                stale = np.setdiff1d(np.fromiter(idx.where, dtype=np.int64), vm.view()[0])
+                for nid in stale.tolist():
+                    idx.remove(nid)
+            _ANN[key] = idx
+    with idx.lock:
+        if idx.needs_training(vm.n):
+            ids, mat = vm.view()
+            idx.train(ids, mat)
+            idx.last_id = vm.last_id
+            save_ann_index(con)
+        elif vm.last_id > idx.last_id:
+            idx.add(*vm.since(idx.last_id))
+    return idx
+
+def save_ann_index(con: sqlite3.Connection) -> Optional[str]:
+    """Persiste o índice IVF ao lado do arquivo SQLite (ex.: memory_store.sqlite.ivf.npz)."""
+    key = _db_key(con)
+    idx, path = _ANN.get(key), _ann_path(key)
+    if idx is None or path is None:
+        return None
+    idx.save(path)
+    return path
+
+def save_ann_indexes() -> List[str]:
+    """Grava os índices IVF com vetores adicionados/removidos desde o último save. Sem isso, o que entrou
+    depois do treino só volta no restart refazendo a atribuição de tudo que passou da marca salva."""
+    with _INDEXES_LOCK:
+        dirty = [(k, idx) for k, idx in _ANN.items() if idx.dirty and _ann_path(k)]
+    for key, idx in dirty:
+        idx.save(_ann_path(key))
+    return [_ann_path(k) for k, _ in dirty]
+
+atexit.register(save_ann_indexes)
+
+def delete_memory(con: sqlite3.Connection, nid: int) -> None:
+    con.execute("DELETE FROM edges WHERE src=? OR dst=?", (nid, nid))
+    con.execute("DELETE FROM nodes WHERE id=?", (nid,))
+    con.commit()
+    key = _db_key(con)
+    _vector_index(con, sync=False).remove(nid)
+    if key in _ANN:
+        _ANN[key].remove(nid)
+    if key in _GRAPHS:
+        _GRAPHS[key].invalidate()
+
+def top_k_scores(mat: np.ndarray, q: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Posições e scores dos top_k de `mat @ q`, ordenados (produto matriz-vetor + argpartition)."""
+    scores = mat @ q
+    if top_k < len(scores):
+        pos = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        pos = np.arange(len(scores))
+    pos = pos[np.argsort(-scores[pos], kind="stable")]
+    return pos, scores[pos]
+
+def most_similar(con: sqlite3.Connection, vec: List[float], top_k: int = 5,
+                 mode: str = None, nprobe: int = None) -> List[Tuple[int,float]]:
+    """Top-k por cosseno. mode="ivf" usa o índice aproximado quando já treinado; "exact" é a referência."""
+    if top_k <= 0:
+        return []
+    q = np.asarray(vec, dtype=np.float32)
+    if (mode or ANN_MODE) == "ivf":
+        idx = _ann_index(con)
+        if idx.trained:
+            ids, scores = idx.search(q, top_k, nprobe=nprobe)
+            return [(int(i), float(s)) for i, s in zip(ids, scores)]
+    ids, mat = _vector_index(con).view()
+    if not len(ids):
+        return []
+    pos, scores = top_k_scores(mat, q, top_k)
+    return [(int(i), float(s)) for i, s in zip(ids[pos], scores)]
+
+# --- Busca lexical (BM25 no FTS5) e fusão com a vetorial ---
+_FTS_TERM = re.compile(r"\w+", re.UNICODE)
+
+def fts_query(text: str, max_terms: int = 32) -> str:
+    """Termos da consulta entre aspas unidos por OR (sem sintaxe FTS5 vinda do usuário)."""
+    terms = list(dict.fromkeys(t.lower() for t in _FTS_TERM.findall(text)))[:max_terms]
+    return " OR ".join(f'"{t}"' for t in terms)
+
+def lexical_search(con: sqlite3.Connection, query: str, top_k: int = 5) -> List[Tuple[int,float]]:
+    """Top-k por BM25 via índice FTS5 (só as linhas que casam são pontuadas); score = -bm25, maior é melhor."""
+    q = fts_query(query)
+    if not q or top_k <= 0:
+        return []
+    try:
+        rows = con.execute("SELECT rowid, -bm25(nodes_fts) FROM nodes_fts WHERE nodes_fts MATCH ? "
+                           "ORDER BY rank LIMIT ?", (q, top_k)).fetchall()
+    except sqlite3.OperationalError:  # sem FTS5 / banco sem nodes_fts
+        return []
+    return [(int(i), float(s)) for i, s in rows]
+
+def fuse_scores(vec: Dict[int,float], lex: Dict[int,float], mode: str = None, w_vec: float = None,
+                w_lex: float = None, rrf_k: int = None) -> Dict[int,float]:
+    """Score único para cada id de `vec` (cosseno de todos os candidatos); `lex` traz o BM25 dos que casaram.
+
+    weighted: w_vec*cos + w_lex*bm25/max(bm25). rrf: soma de w/(k+posição) nas duas listas, escalada por
+    (k+1) para o 1º de uma lista valer w. vector: só o cosseno.
+    """
+    mode = mode or FUSION_MODE
+    w_vec = FUSION_W_VEC if w_vec is None else w_vec
+    w_lex = FUSION_W_LEX if w_lex is None else w_lex
+    if mode == "vector" or not lex:
+        return dict(vec)
+    if mode == "rrf":
+        k = RRF_K if rrf_k is None else rrf_k
+        out = dict.fromkeys(vec, 0.0)
+        for w, ranked in ((w_vec, vec), (w_lex, lex)):
+            for rank, nid in enumerate(sorted(ranked, key=ranked.get, reverse=True), 1):
+                if nid in out:
+                    out[nid] += w * (k + 1) / (k + rank)
+        return out
+    top = max(lex.values()) or 1.0
+    return {nid: w_vec * v + w_lex * lex.get(nid, 0.0) / top for nid, v in vec.items()}
+
+def _seed_hits(con: sqlite3.Connection, query: str, top_k: int, mode: str, w_vec: float, w_lex: float):
+    """Top_k da fusão vetorial + BM25: (hits, cossenos, bm25, qvec, matriz)."""
     qvec = embed(query)
-    hits = most_similar(con, qvec, top_k=top_k)
-    ids = {nid for nid,_ in hits}
-    # expande vizinhança 1 salto
-    frontier = set(ids)
-    for _ in range(expand_hops):
-        if not frontier: break
-        new_ids = set()
-        for nid in frontier:
-            cur = con.execute("SELECT dst FROM edges WHERE src=? AND rel='related'", (nid,))
-            new_ids.update([r[0] for r in cur.fetchall()])
-        frontier = new_ids - ids
-        ids |= new_ids
-    # coleta nós
+    vec_hits = most_similar(con, qvec, top_k=top_k)
+    lex = dict(lexical_search(con, query, top_k)) if mode != "vector" else {}
+    vec = dict(vec_hits)
+    vm = _vector_index(con, sync=False)
+    missing = [nid for nid in lex if nid not in vec]
+    if missing:  # achados só pelo BM25: cosseno direto da matriz
+        vec.update(vm.scores_for(missing, qvec))
+    fused = fuse_scores(vec, lex, mode, w_vec, w_lex)
+    hits = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    return hits, vec, lex, qvec, vm
+
+def _hydrate(con: sqlite3.Connection, ids) -> Dict[int, Dict[str,Any]]:
+    return {nid: {"id": nid, "text": text, "ts": ts, "source": source, "meta": json.loads(meta or "{}")}
+            for nid, text, ts, source, meta in con.execute(
+                "SELECT id, text, ts, source, meta FROM nodes WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(sorted(ids)),))}
+
+def ppr_retrieve(con: sqlite3.Connection, query: str, top_k: int = 5, seeds_k: int = None,
+                 alpha: float = None, eps: float = None, fusion: str = None, w_vec: float = None,
+                 w_lex: float = None) -> Dict[str,Any]:
+    """Busca por PageRank personalizado: sementes = top seeds_k da fusão vetorial/BM25 (peso = score da
+    fusão), propagadas pelas arestas "related" com push local. Mesmo formato de search_memory;
+    `score` é o PPR relativo ao 1º (1.0) e `ppr` o valor absoluto."""
+    mode = fusion or FUSION_MODE
+    hits, vec, lex, _, _ = _seed_hits(con, query, seeds_k or max(top_k, 5), mode, w_vec, w_lex)
+    if not hits:
+        return {"query": query, "hits": [], "nodes": [], "edges": [], "pushes": 0}
+    low = min(s for _, s in hits)
+    seeds = {nid: s - low + 1e-6 if low <= 0 else s for nid, s in hits}  # pesos positivos
+    p, pushes = edge_graph(con).ppr(seeds, PPR_ALPHA if alpha is None else alpha, PPR_EPS if eps is None else eps)
+    ranked = sorted(p.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    top = ranked[0][1] if ranked else 1.0
+    rows = _hydrate(con, [nid for nid, _ in ranked])
+    nodes = [{**rows[nid], "score": round(pr / top, 4), "ppr": pr, "seed": nid in seeds,
+              "vec_score": round(vec.get(nid, 0.0), 4), "lex_score": round(lex.get(nid, 0.0), 4)}
+             for nid, pr in ranked if nid in rows]
+    edges = con.execute(
+        "SELECT src,dst,rel,weight FROM edges WHERE src IN (SELECT value FROM json_each(?)) "
+        "AND dst IN (SELECT value FROM json_each(?))", (json.dumps(list(rows)), json.dumps(list(rows)))).fetchall()
+    return {"query": query, "hits": hits, "nodes": nodes, "pushes": pushes,
+            "edges": [{"src":a,"dst":b,"rel":r,"w":w} for a,b,r,w in edges]}
+
+def search_memory(con: sqlite3.Connection, query: str, top_k: int = 5, expand_hops: int = 1,
+                  fusion: str = None, w_vec: float = None, w_lex: float = None,
+                  max_candidates: int = None) -> Dict[str,Any]:
+    """Sementes = top_k da fusão (vetorial + BM25), depois expansão pelo grafo ("related").
+
+    fusion/w_vec/w_lex sobrepõem MEMORY_FUSION/MEMORY_W_VEC/MEMORY_W_LEX nesta chamada. Cada nó traz
+    `hop` (0 = semente) e `edge_w` (maior produto dos pesos das arestas no caminho desde uma semente).
+    max_candidates limita o total de nós: a expansão fica com os vizinhos de maior edge_w.
+    """
+    mode = fusion or FUSION_MODE
+    hits, vec, lex, qvec, vm = _seed_hits(con, query, top_k, mode, w_vec, w_lex)
+    # expande vizinhança no snapshot CSR em memória (sem SQL por salto)
+    reach = edge_graph(con).expand([nid for nid, _ in hits], expand_hops, max_nodes=max_candidates or None) \
+        if expand_hops > 0 else {nid: (0, 1.0) for nid, _ in hits}
+    ids = set(reach)
+    # vizinhos trazidos pelo grafo: cosseno direto da matriz em memória (sem decodificar BLOB)
+    missing = [nid for nid in ids if nid not in vec]
+    if missing:
+        vec.update(vm.scores_for(missing, qvec))
+    scores = fuse_scores({nid: vec.get(nid, 0.0) for nid in ids}, lex, mode, w_vec, w_lex)
+    # coleta nós numa única consulta
+    id_list = json.dumps(sorted(ids))
     nodes = []
-    for nid in ids:
-        nrow = con.execute("SELECT id, text, embedding, ts, source, meta FROM nodes WHERE id=?", (nid,)).fetchone()
-        if not nrow: continue
-        score = cos(qvec, json.loads(nrow[2]))
+    for nid, text, ts, source, meta in con.execute(
+            "SELECT id, text, ts, source, meta FROM nodes WHERE id IN (SELECT value FROM json_each(?))",
+            (id_list,)):
         nodes.append({
-            "id": nrow[0], "text": nrow[1], "score": round(score, 4),
-            "ts": nrow[3], "source": nrow[4], "meta": json.loads(nrow[5] or "{}")
+            "id": nid, "text": text, "score": round(scores.get(nid, 0.0), 4),
+            "vec_score": round(vec.get(nid, 0.0), 4), "lex_score": round(lex.get(nid, 0.0), 4),
+            "hop": reach[nid][0], "edge_w": round(reach[nid][1], 4),
+            "ts": ts, "source": source, "meta": json.loads(meta or "{}")
         })
     nodes.sort(key=lambda d: d["score"], reverse=True)
     # arestas relevantes
     edges = con.execute(
-        f"SELECT src,dst,rel,weight FROM edges WHERE src IN ({','.join('?'*len(ids))})",
-        tuple(ids)
+        "SELECT src,dst,rel,weight FROM edges WHERE src IN (SELECT value FROM json_each(?))",
+        (id_list,)
     ).fetchall() if ids else []
     return {"query": query, "hits": hits, "nodes": nodes, "edges": [{"src":a,"dst":b,"rel":r,"w":w} for a,b,r,w in edges]}
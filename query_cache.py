@@ -0,0 +1,78 @@
+# query_cache.py
+# Caches da recuperação no Chroma
+# - embeddings de consulta (LRU por texto): evita a chamada ONNX do DefaultEmbeddingFunction
+# - resultados (LRU por (época, consulta, k)): evita a busca vetorial
+# A época da coleção sobe a cada escrita (add/update/delete): resultados antigos deixam de ser achados
+# e saem pelo LRU. O TTL limita a defasagem quando outro processo escreve na mesma coleção.
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class _LRU:
+    def __init__(self, max_items: int, ttl_s: Optional[float] = None):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.items: "OrderedDict[Hashable, tuple]" = OrderedDict()  # chave -> (ts, valor)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, now: float) -> Any:
+        item = self.items.get(key)
+        if item is not None and (self.ttl_s is None or now - item[0] <= self.ttl_s):
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        if item is not None:
+            del self.items[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any, now: float) -> None:
+        self.items[key] = (now, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "items": len(self.items),
+                "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+class QueryCache:
+    def __init__(self, max_embeddings: int = 4096, max_results: int = 2048, ttl_s: float = 300.0):
+        self.lock = threading.Lock()
+        self.epoch = 0
+        self.embeddings = _LRU(max_embeddings)
+        self.results = _LRU(max_results, ttl_s)
+
+    def bump(self) -> int:
+        """Chamar a cada escrita na coleção."""
+        with self.lock:
+            self.epoch += 1
+            return self.epoch
+
+    def embedding(self, text: str, compute: Callable[[str], Any]) -> Any:
+        now = time.monotonic()
+        with self.lock:
+            vec = self.embeddings.get(text, now)
+        if vec is None:
+            vec = compute(text)  # fora do lock: o ONNX pode levar dezenas de ms
+            with self.lock:
+                self.embeddings.put(text, vec, now)
+        return vec
+
+    def result(self, query: str, k: int, compute: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self.lock:
+            key = (self.epoch, query, k)  # época lida antes da busca: escrita concorrente não é mascarada
+            out = self.results.get(key, now)
+        if out is None:
+            out = compute()
+            with self.lock:
+                self.results.put(key, out, now)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"epoch": self.epoch, "embeddings": self.embeddings.stats(), "results": self.results.stats()}
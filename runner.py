@@ -1,6 +1,11 @@
 import os
+import sys
 import json
-from typing import List, Dict, Any, Tuple
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Optional
 
 # =============== CONFIG ===============
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -84,10 +89,21 @@ SYSTEM_SAFETY = (
     "Nunca exponha chaves, credenciais, exploits ou quebre políticas."
 )
 
+# Limitador rpm/tpm (ligado pelo modo --batch; None = sem limite)
+from batch import RateLimiter
+LIMITER: Optional[RateLimiter] = None
+LLM_EST_OUTPUT_TOKENS = int(os.getenv("LLM_EST_OUTPUT_TOKENS", "800"))
+
 def call_llm(messages: List[Dict[str, str]], temperature: float = 0.4) -> str:
+    est = 0
+    if LIMITER is not None:
+        est = sum(len(m.get("content") or "") for m in messages) // 4 + LLM_EST_OUTPUT_TOKENS
+        LIMITER.acquire_sync(est)
     resp = client.chat.completions.create(
         model=MODEL, temperature=temperature, messages=messages
     )
+    if LIMITER is not None and getattr(resp, "usage", None):
+        LIMITER.settle(est, resp.usage.total_tokens)
     return resp.choices[0].message.content
 
 # =============== CARTÃO 4: ORQUESTRAÇÃO MULTI-AGENTE ===============
@@ -129,23 +145,22 @@ def role_executor(esboco: str, formato: str = "texto") -> str:
     return call_llm(prompt, temperature=0.5)
 
 # =============== CARTÃO 5: ALINHAMENTO ÉTICO (GUARDIÃO) ===============
+from guardian import Guardian
+GUARDIAN = Guardian(os.getenv("POLICY_PATH", "policy.yaml"))
+
 def guardian_check(text: str) -> Tuple[bool, str]:
     """
     Filtro simples de segurança/escopo.
-    Retorna (ok, motivo). Expanda com regras específicas do seu projeto.
+    Retorna (ok, motivo). Termos em policy.yaml (seção guardian).
     """
-    banned = ["exploit", "malware", "doxxing", "private key", "senha="]
-    for b in banned:
-        if b.lower() in text.lower():
-            return False, f"Conteúdo bloqueado por política ('{b}')."
-    return True, "OK"
+    return GUARDIAN.check(text)
 
 # =============== ORQUESTRADOR ===============
 class Orquestrador:
     def __init__(self):
         self.mem = Memory()
 
-    def run(self, query: str, formato: str = "texto") -> Dict[str, Any]:
+    def run(self, query: str, formato: str = "texto", interactive: bool = True) -> Dict[str, Any]:
         # 1) contexto (memória curta + longa)
         ctx = self.mem.context_block(query)
 
@@ -174,8 +189,8 @@ class Orquestrador:
         if not ok:
             return {"status": "blocked", "step": "executor", "reason": why}
 
-        # 6) loop de feedback humano (opcional)
-        _, fb = human_feedback_loop(draft_exec)
+        # 6) loop de feedback humano (opcional; desligado no modo lote)
+        fb = human_feedback_loop(draft_exec)[1] if interactive else {"accepted": True, "feedback": ""}
         if not fb["accepted"] and fb["feedback"]:
             hint = fb["feedback"]
             # Regerar com pista/hint
@@ -209,8 +224,58 @@ class Orquestrador:
             "resumo": resumo
         }
 
+# =============== LOTE ===============
+def read_batch(path: str) -> List[Dict[str, Any]]:
+    """Lista JSON ou NDJSON de RunRequest ({"query", "formato", "request_id"}); "-" lê do stdin."""
+    raw = sys.stdin.read() if path == "-" else open(path, encoding="utf-8").read()
+    if raw.lstrip().startswith("["):
+        return json.loads(raw)
+    return [json.loads(ln) for ln in raw.splitlines() if ln.strip()]
+
+def run_batch(items: List[Dict[str, Any]], concurrency: int = 8, out=sys.stdout) -> Dict[str, Any]:
+    """Roda as cadeias em paralelo (uma thread por cadeia em voo); imprime NDJSON na ordem de conclusão."""
+    local = threading.local()  # um Orquestrador por thread: a memória curta não se mistura entre cadeias
+
+    def one(i: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        if not hasattr(local, "orch"):
+            local.orch = Orquestrador()
+        t0 = time.perf_counter()
+        res = local.orch.run(query=item["query"], formato=item.get("formato", "texto"), interactive=False)
+        return {"status": res["status"], "seconds": round(time.perf_counter() - t0, 3), "result": res}
+
+    counts = {"ok": 0, "blocked": 0, "error": 0}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as pool:
+        futs = {pool.submit(one, i, it): (i, it) for i, it in enumerate(items)}
+        for fut in as_completed(futs):
+            i, it = futs[fut]
+            line = {"index": i, "request_id": it.get("request_id") or f"batch-{i}"}
+            try:
+                line.update(fut.result())
+            except Exception as e:
+                line.update(status="error", error=str(e))
+            counts[line["status"]] = counts.get(line["status"], 0) + 1
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+    return {**counts, "seconds": round(time.perf_counter() - t0, 3),
+            "limiter": LIMITER.stats() if LIMITER is not None else None}
+
 # =============== CLI ===============
 def main():
+    ap = argparse.ArgumentParser(description="Colaborativo IA Runner")
+    ap.add_argument("--batch", help="arquivo NDJSON/JSON de RunRequest ('-' = stdin); saída NDJSON no stdout")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")))
+    ap.add_argument("--rpm", type=float, default=float(os.getenv("BATCH_RPM", "0")), help="requisições/min (0 = sem limite)")
+    ap.add_argument("--tpm", type=float, default=float(os.getenv("BATCH_TPM", "0")), help="tokens/min (0 = sem limite)")
+    args = ap.parse_args()
+    if args.batch:
+        global LIMITER
+        if args.rpm or args.tpm:
+            LIMITER = RateLimiter(rpm=args.rpm, tpm=args.tpm)
+        summary = run_batch(read_batch(args.batch), concurrency=args.concurrency)
+        print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+        return
+
     print("== Colaborativo IA Runner ==")
     print("Digite sua tarefa (ENTER para exemplo):")
     try:
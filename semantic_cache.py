@@ -0,0 +1,84 @@
+# semantic_cache.py
+# Cache semântico de respostas: consultas parafraseadas reaproveitam a resposta já gerada
+# - índice NumPy (matriz de embeddings normalizados) das consultas respondidas
+# - acerto quando cosseno >= threshold (e mesmo "namespace", ex.: formato de saída + sessão)
+# - invalidação por documento: cada entrada guarda os doc_ids do KB em que se apoiou
+from __future__ import annotations
+import threading, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+class SemanticCache:
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], threshold: float = 0.92,
+                 max_entries: int = 2000, ttl_s: float = 86400.0):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.lock = threading.Lock()
+        self.vecs = np.zeros((0, 0), dtype=np.float32)
+        self.entries: List[Dict[str, Any]] = []
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "saved_llm_calls": 0}
+
+    def embed(self, query: str) -> np.ndarray:
+        v = np.asarray(self.embed_fn([query])[0], dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def lookup(self, vec: np.ndarray, namespace: str = "") -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.lock:
+            if self.entries:
+                scores = self.vecs @ vec
+                for pos in np.argsort(-scores):  # para no primeiro abaixo do limiar
+                    if scores[pos] < self.threshold:
+                        break
+                    e = self.entries[pos]
+                    if e["namespace"] == namespace and now - e["ts"] <= self.ttl_s:
+                        self.counters["hits"] += 1
+                        self.counters["saved_llm_calls"] += e["llm_calls"]
+                        return {**e, "similarity": float(scores[pos])}
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, vec: np.ndarray, query: str, response: Dict[str, Any], doc_ids: Iterable[str] = (),
+              namespace: str = "", llm_calls: int = 0) -> None:
+        entry = {"query": query, "response": response, "doc_ids": set(doc_ids), "namespace": namespace,
+                 "llm_calls": llm_calls, "ts": time.time()}
+        with self.lock:
+            if not self.entries:
+                self.vecs = vec[None, :].astype(np.float32)
+            else:
+                self.vecs = np.vstack([self.vecs, vec[None, :]])
+            self.entries.append(entry)
+            if len(self.entries) > self.max_entries:  # descarta as mais antigas
+                drop = len(self.entries) - self.max_entries
+                self.entries = self.entries[drop:]
+                self.vecs = self.vecs[drop:]
+            self.counters["stores"] += 1
+
+    def invalidate_docs(self, doc_ids: Iterable[str]) -> int:
+        """Remove as entradas cujas respostas usaram algum dos documentos dados."""
+        ids = set(doc_ids)
+        with self.lock:
+            keep = [i for i, e in enumerate(self.entries) if not (e["doc_ids"] & ids)]
+            dropped = len(self.entries) - len(keep)
+            if dropped:
+                self.entries = [self.entries[i] for i in keep]
+                self.vecs = self.vecs[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+                self.counters["invalidated"] += dropped
+            return dropped
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries, self.vecs = [], np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            c = dict(self.counters)
+            c["entries"] = len(self.entries)
+        total = c["hits"] + c["misses"]
+        c["hit_rate"] = round(c["hits"] / total, 4) if total else 0.0
+        c["threshold"] = self.threshold
+        return c
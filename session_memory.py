@@ -0,0 +1,85 @@
+# session_memory.py
+# Memória curta por sessão: um deque de tamanho fixo por session_id
+# - sessões espalhadas em shards (lock por shard, sem lock global): sessões diferentes não disputam o mesmo lock
+# - cada shard é um OrderedDict em ordem LRU, com teto de sessões e expiração por TTL
+# - memória total limitada por max_sessions × max_entries, não importa quantas sessões apareçam
+from __future__ import annotations
+import threading, time, zlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+DEFAULT_SESSION = "_default"
+
+class _Shard:
+    __slots__ = ("lock", "sessions", "evicted_lru", "evicted_ttl")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, Tuple[float, Deque[str]]]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+class SessionStore:
+    def __init__(self, max_entries: int = 10, max_sessions: int = 10000, ttl_s: float = 3600.0, shards: int = 16):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.per_shard = max(1, -(-max_sessions // len(self.shards)))  # teto dividido entre os shards
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self.shards[zlib.crc32(session_id.encode("utf-8")) % len(self.shards)]
+
+    def _expire(self, sh: _Shard, now: float) -> None:
+        # cabeça do OrderedDict = sessão usada há mais tempo: para no primeiro item ainda válido
+        while sh.sessions:
+            sid, (ts, _) = next(iter(sh.sessions.items()))
+            if now - ts <= self.ttl_s:
+                break
+            del sh.sessions[sid]
+            sh.evicted_ttl += 1
+
+    def push(self, text: str, session_id: Optional[str] = None) -> None:
+        sid = session_id or DEFAULT_SESSION
+        sh, now = self._shard(sid), time.monotonic()
+        with sh.lock:
+            item = sh.sessions.pop(sid, None)
+            dq = item[1] if item and now - item[0] <= self.ttl_s else deque(maxlen=self.max_entries)
+            dq.append(text)
+            sh.sessions[sid] = (now, dq)
+            self._expire(sh, now)
+            while len(sh.sessions) > self.per_shard:
+                sh.sessions.popitem(last=False)
+                sh.evicted_lru += 1
+
+    def get(self, session_id: Optional[str] = None) -> List[str]:
+        """Entradas da sessão, da mais antiga para a mais recente (cópia)."""
+        sid = session_id or DEFAULT_SESSION
+        sh, now = self._shard(sid), time.monotonic()
+        with sh.lock:
+            item = sh.sessions.get(sid)
+            if item is None:
+                return []
+            if now - item[0] > self.ttl_s:
+                del sh.sessions[sid]
+                sh.evicted_ttl += 1
+                return []
+            sh.sessions[sid] = (now, item[1])
+            sh.sessions.move_to_end(sid)
+            return list(item[1])
+
+    def clear(self, session_id: str) -> None:
+        sh = self._shard(session_id)
+        with sh.lock:
+            sh.sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        out = {"sessions": 0, "entries": 0, "evicted_lru": 0, "evicted_ttl": 0}
+        for sh in self.shards:
+            with sh.lock:
+                out["sessions"] += len(sh.sessions)
+                out["entries"] += sum(len(dq) for _, dq in sh.sessions.values())
+                out["evicted_lru"] += sh.evicted_lru
+                out["evicted_ttl"] += sh.evicted_ttl
+        out["max_sessions"] = self.per_shard * len(self.shards)
+        out["max_entries"] = self.max_entries
+        return out
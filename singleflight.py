@@ -0,0 +1,71 @@
+# singleflight.py
+# Coalescência de requisições idênticas concorrentes (padrão "singleflight")
+# - a primeira requisição com uma chave vira "líder" e executa o trabalho
+# - cópias que chegam enquanto ela está em voo aguardam o mesmo resultado (ou a mesma exceção)
+# - nada fica guardado depois que o trabalho termina: não é cache, só deduplicação em voo
+from __future__ import annotations
+import asyncio, hashlib, json, re
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+_WS = re.compile(r"\s+")
+
+# só o texto livre da consulta é normalizado; identificadores (session_id, request_id, formato...) entram
+# exatamente como vieram, senão duas sessões "Ana"/"ana" dividiriam a mesma execução
+TEXT_FIELDS = ("query",)
+
+def _norm(v: Any) -> Any:
+    return _WS.sub(" ", v).strip().casefold() if isinstance(v, str) else v
+
+def default_key(namespace: str, body: Any, text_fields=TEXT_FIELDS) -> str:
+    """sha256 do corpo com chaves ordenadas; nos campos de texto (`text_fields`) espaços colapsados e caixa
+    ignorada, os demais comparados exatamente."""
+    if hasattr(body, "model_dump"):
+        body = body.model_dump()
+    if isinstance(body, dict):
+        body = {k: _norm(v) if k in text_fields else v for k, v in body.items()}
+    payload = json.dumps([namespace, body], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    def __init__(self, key_fn: Callable[[str, Any], str] = default_key, enabled: bool = True):
+        self.key_fn = key_fn
+        self.enabled = enabled
+        self.inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, name: str) -> None:
+        c = self.counters.setdefault(namespace, {"leaders": 0, "coalesced": 0, "errors": 0})
+        c[name] += 1
+
+    async def do(self, namespace: str, body: Any, fn: Callable[[], Awaitable[Any]],
+                 key: Optional[str] = None) -> Any:
+        """Executa fn() uma vez por chave em voo; duplicatas concorrentes recebem o mesmo resultado.
+
+        O trabalho roda numa task própria: se o cliente líder desconectar, as demais cópias não são canceladas.
+        """
+        if not self.enabled:
+            return await fn()
+        k = (namespace, key if key is not None else self.key_fn(namespace, body))
+        fut = self.inflight.get(k)
+        if fut is not None:
+            self._count(namespace, "coalesced")
+            return await asyncio.shield(fut)
+        self._count(namespace, "leaders")
+        task = asyncio.ensure_future(fn())
+        self.inflight[k] = task
+
+        def _done(t: asyncio.Future) -> None:
+            self.inflight.pop(k, None)
+            if t.cancelled() or t.exception() is not None:
+                self._count(namespace, "errors")
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        per = {ns: dict(c) for ns, c in self.counters.items()}
+        leaders = sum(c["leaders"] for c in per.values())
+        coalesced = sum(c["coalesced"] for c in per.values())
+        total = leaders + coalesced
+        return {"enabled": self.enabled, "in_flight": len(self.inflight), "leaders": leaders,
+                "coalesced": coalesced, "coalesce_rate": round(coalesced / total, 4) if total else 0.0,
+                "by_endpoint": per}
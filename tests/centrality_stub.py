@@ -0,0 +1,85 @@
+# tests/centrality_stub.py
+# Centralidade esparsa: confere contra PageRank denso, warm start depois de editar o grafo e ida/volta do .npz
+import json, sys, time, pathlib, tempfile
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from centrality import Centrality
+
+def dense_pagerank(c: Centrality) -> np.ndarray:
+    # mesma conta de power_iteration, em matriz densa: linhas sem saída espalham por igual
+    n = len(c.keys)
+    A = np.zeros((n, n))
+    np.add.at(A, (c.src, c.dst), c.w)
+    out = A.sum(1, keepdims=True)
+    P = np.where(out > 0, A / np.where(out > 0, out, 1.0), 1.0 / n)
+    M = np.eye(n) - c.damping * P.T
+    x = np.linalg.solve(M, np.full(n, (1.0 - c.damping) / n))
+    return x / x.sum()
+
+rng = np.random.default_rng(7)
+n, m = 400, 2400
+edges = [(f"n{a}", f"n{b}", float(w)) for a, b, w in
+         zip(rng.integers(0, n, m), rng.integers(0, n, m), rng.uniform(0.1, 1.0, m)) if a != b]
+
+cold = Centrality(tol=1e-10, max_iter=500)
+cold.add_edges(edges)
+x = cold.compute()
+first = dict(cold.last)
+assert not first["warm"] and first["delta"] < cold.tol, first
+assert abs(x.sum() - 1.0) < 1e-9
+err0 = float(np.abs(x - dense_pagerank(cold)).sum())
+assert err0 < 1e-8, err0
+
+# edição pequena: algumas arestas somem, outras entram
+removed = edges[:4]
+added = [("n1", "n2", 0.5), ("n3", "n5", 0.8)]
+cold.remove_edges(removed)
+cold.add_edges(added)
+assert cold.dirty
+x_warm = cold.compute()
+warm = dict(cold.last)
+assert warm["warm"] and warm["delta"] < cold.tol, warm
+
+# mesmo grafo do zero: o warm start converge ao mesmo vetor em menos iterações
+fresh = Centrality(tol=1e-10, max_iter=500)
+for key in cold.keys:  # mesma numeração de nós
+    fresh.add_node(key)
+fresh.add_edges([e for e in edges if e not in removed] + added)
+x_fresh = fresh.compute()
+assert fresh.keys == cold.keys
+err = float(np.abs(x_warm - x_fresh).sum())
+assert err < 1e-8, err
+assert warm["iters"] < fresh.last["iters"], (warm["iters"], fresh.last["iters"])
+assert float(np.abs(x_warm - dense_pagerank(cold)).sum()) < 1e-8
+
+# nó novo entra com 1/n no vetor inicial e o resultado continua o PageRank exato
+cold.add_edges([("n8", "novo", 1.0)])
+x_new = cold.compute()
+assert cold.last["warm"] and len(x_new) == n + 1 and cold.score("novo") > 0
+assert float(np.abs(x_new - dense_pagerank(cold)).sum()) < 1e-8
+
+# sem mudança não recalcula; set_edges com o mesmo conjunto não marca o grafo
+gen = cold.gen
+cold.compute()
+assert cold.gen == gen
+assert not cold.set_edges([e for e in edges if e not in removed] + added + [("n8", "novo", 1.0)])
+assert not cold.dirty
+
+# persistência: mesmos scores, score(chave) sem recálculo
+with tempfile.TemporaryDirectory() as tmp:
+    path = cold.save(f"{tmp}/sub/centrality.npz")
+    back = Centrality.load(path)
+    assert back is not None and back.keys == cold.keys and back.n_edges == cold.n_edges
+    assert np.array_equal(back.scores, cold.scores)
+    assert back.score("n0") == cold.score("n0") and back.score("nada", -1.0) == -1.0
+    assert not back.dirty and back.compute() is back.scores
+    assert Centrality.load(f"{tmp}/faltando.npz") is None
+
+summary = {"nodes": len(cold.keys), "edges": cold.n_edges, "cold_iters": first["iters"],
+           "warm_iters": warm["iters"], "fresh_iters": fresh.last["iters"], "l1_warm_vs_fresh": err,
+           "ts": time.time()}
+path = pathlib.Path("centrality_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[centrality] ok -> {path}")
@@ -1,7 +1,12 @@
 # tests/gem_rag_stub.py
-import json, math, time, pathlib, re
+import json, math, os, time, pathlib, re, sys
 from collections import defaultdict, Counter
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from centrality import Centrality
+
+CENTRALITY_PATH = os.getenv("GEM_CENTRALITY_PATH", "state/gem_centrality.npz")  # state/ fica fora do git
+
 OUT = pathlib.Path("logs"); OUT.mkdir(exist_ok=True)
 
 # --- Mini "grafo de memória" de exemplo ---
@@ -30,33 +35,16 @@ edges = [
 def tokenize(txt):
     return re.findall(r"[A-Za-zÀ-ÿ0-9]+", txt.lower())
 
-def build_adj(nodes, edges):
-    idx = {k:i for i,k in enumerate(nodes.keys())}
-    rev = {i:k for k,i in idx.items()}
-    n = len(idx)
-    adj = [[0]*n for _ in range(n)]
-    for a,b in edges:
-        ia, ib = idx[a], idx[b]
-        adj[ia][ib] = 1
-        adj[ib][ia] = 1
-    return idx, rev, adj
-
-def eigen_centrality(adj, iters=30, damping=0.85):
-    n = len(adj)
-    v = [1.0/n]*n
-    for _ in range(iters):
-        nv = [0.0]*n
-        for i in range(n):
-            deg = sum(adj[i])
-            if deg:
-                share = v[i]/deg
-                for j in range(n):
-                    if adj[i][j]:
-                        nv[j] += share
-        v = [ (1-damping)/n + damping*nv[i] for i in range(n) ]
-        s = sum(v); 
-        if s: v = [x/s for x in v]
-    return v
+def centrality(nodes, edges):
+    # grafo esparso + scores persistidos: na próxima execução só recalcula se as arestas mudaram (warm start)
+    cen = Centrality.load(CENTRALITY_PATH) or Centrality()
+    for key in nodes:
+        cen.add_node(key)
+    cen.set_edges(edges)
+    if cen.dirty:
+        cen.compute()
+        cen.save(CENTRALITY_PATH)
+    return cen
 
 def text_score(q_tokens, text):
     toks = tokenize(text)
@@ -67,14 +55,12 @@ def text_score(q_tokens, text):
 query = "Plano para atender a Ana hoje com upsell e próxima ação"
 q_tokens = tokenize(query)
 
-idx, rev, adj = build_adj(nodes, edges)
-eig = eigen_centrality(adj)
+cen = centrality(nodes, edges)
 
 scored = []
 for key, meta in nodes.items():
-    i = idx[key]
     s_text = text_score(q_tokens, meta["text"])  # relevância textual
-    s_eig  = eig[i]                              # importância estrutural
+    s_eig  = cen.score(key)                      # importância estrutural (O(1), já calculada)
     score  = 0.7*s_text + 0.3*s_eig              # mistura simples
     scored.append((score, key, meta))
 
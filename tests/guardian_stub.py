@@ -0,0 +1,63 @@
+# tests/guardian_stub.py
+# Guardião: autômato (lista pequena e grande) igual à busca ingênua, scanner em streaming atravessando
+# fronteiras de pedaços e recarga a quente que sobrevive a um policy.yaml inválido
+import json, os, sys, time, pathlib, random, tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from guardian import Automaton, Guardian, StreamScanner
+
+def naive(text, terms):
+    low = text.lower()
+    return sorted((i, i + len(t), t) for t in {t.lower() for t in terms} for i in range(len(low)) if low.startswith(t, i))
+
+rng = random.Random(0)
+alphabet = "abcde "
+results = {}
+for n_terms in (5, 200):  # <= small_set usa str.find; acima, o DFA
+    terms = {"".join(rng.choice(alphabet[:-1]) for _ in range(rng.randint(2, 6))) for _ in range(n_terms)}
+    a = Automaton(terms)
+    for _ in range(50):
+        text = "".join(rng.choice(alphabet) for _ in range(300)).upper()
+        got = sorted((m.start, m.end, m.term) for m in a.scan(text))
+        assert got == naive(text, terms), f"scan divergiu com {n_terms} termos"
+        first = a.first(text)
+        want = min(naive(text, terms), key=lambda m: (m[1], m[0]), default=None)
+        assert (first is None) == (want is None) and (first is None or first.end == want[1])
+    results[f"terms={n_terms}"] = "ok"
+
+# streaming: o termo partido entre pedaços é achado com offsets globais
+a = Automaton(["private key", "malware"] + [f"termo{i}" for i in range(40)])
+text = "resposta longa sem nada... depois vem a PRIVATE KEY aqui"
+pieces = [text[i:i + 3] for i in range(0, len(text), 3)]
+sc, hit, fed = StreamScanner(a), None, 0
+for p in pieces:
+    fed += 1
+    if (hit := sc.feed(p)):
+        break
+assert hit and hit.term == "private key" and text[hit.start:hit.end].lower() == "private key", hit
+assert fed < len(pieces), "o scanner deveria parar antes do último pedaço"
+sc = StreamScanner(a)
+assert all(sc.feed(p) is None for p in ["texto ", "limpo ", "sem termos"])
+results["stream"] = {"chunks_fed": fed, "chunks_total": len(pieces)}
+
+# recarga: YAML quebrado mantém a política anterior; a correção é aplicada na próxima checagem
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "policy.yaml")
+    pathlib.Path(path).write_text('guardian:\n  banned: ["alfa"]\n', encoding="utf-8")
+    g = Guardian(path, reload_every_s=0)
+    assert g.check("texto com ALFA")[0] is False
+    mtime = time.time() + 1
+    pathlib.Path(path).write_text('guardian:\n  banned: ["alfa", "beta"\n', encoding="utf-8")  # edição pela metade
+    os.utime(path, (mtime, mtime))
+    assert g.reload() is False and g.terms == ["alfa"], g.terms
+    assert g.check("beta")[0] is True and g.check("alfa")[0] is False
+    # correção gravada no mesmo instante (mtime igual à da versão quebrada): ainda assim é lida
+    pathlib.Path(path).write_text('guardian:\n  banned: ["alfa", "beta"]\n', encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    assert g.check("beta")[0] is False, "a política corrigida não foi recarregada"
+    results["reload"] = {"terms": g.terms}
+
+summary = {"guardian": results, "ts": time.time()}
+path = pathlib.Path("guardian_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[guardian] ok -> {path}")
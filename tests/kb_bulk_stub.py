@@ -0,0 +1,49 @@
+# tests/kb_bulk_stub.py
+# /kb_bulk_upsert de ponta a ponta (TestClient, backend local de vetores, sem chamadas ao LLM): NDJSON no
+# corpo e multipart, lotes de batch_size, erro por linha sem derrubar a carga, doc_id repetido substituído
+import json, os, sys, time, pathlib, tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+tmp = tempfile.mkdtemp()
+os.environ.update(OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "stub", VECTOR_BACKEND="local",
+                  VECTOR_STORE_PATH=tmp, LLM_CACHE_PATH="", API_ACCESS_TOKEN="")
+CWD = pathlib.Path.cwd()  # resumo vai para o diretório de quem rodou, como nos outros stubs
+os.chdir(ROOT)  # app monta ./static
+from fastapi.testclient import TestClient
+import app
+
+client = TestClient(app.app)
+lines = [json.dumps({"doc_id": f"pol-{i}", "text": f"Política {i}: reembolso em {i % 30 + 1} dias úteis.",
+                     "meta": {"area": "financeiro"}}, ensure_ascii=False) for i in range(300)]
+lines.insert(10, "{quebrado")
+lines.insert(50, json.dumps({"text": "sem doc_id"}))
+lines.append(json.dumps({"doc_id": "pol-0", "text": "Política 0 revisada: frete grátis acima de R$350."}))
+body = "\n".join(lines) + "\n"
+
+r = client.post("/kb_bulk_upsert?job_id=stub&batch_size=64", content=body.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"})
+assert r.status_code == 200, r.text
+job = r.json()
+assert job["done"] and job["received"] == 303 and job["failed"] == 2, job
+assert {e["line"] for e in job["errors"]} == {11, 51}, job["errors"]
+assert job["batches"] == 5 and job["upserted"] == 301, job  # pol-0 repetido em outro lote conta de novo
+prog = client.get("/kb_bulk_upsert/stub").json()
+assert prog["done"] and prog["errors"] == 2
+assert client.get("/kb_bulk_upsert/inexistente").status_code == 404
+
+docs = client.post("/kb_query", json={"query": "frete grátis acima de R$350", "k": 1}).json()["docs"]
+assert docs and "revisada" in docs[0], docs  # a última versão de pol-0 substituiu a primeira
+
+# multipart: o mesmo formato num arquivo anexado
+files = {"file": ("extra.ndjson", "\n".join(json.dumps({"doc_id": f"extra-{i}", "text": f"Anexo {i}."})
+                                             for i in range(20)).encode("utf-8"), "application/x-ndjson")}
+mp = client.post("/kb_bulk_upsert?batch_size=8", files=files).json()
+assert mp["received"] == 20 and mp["upserted"] == 20 and mp["batches"] == 3 and mp["failed"] == 0, mp
+
+summary = {"kb_bulk": {"ndjson": {k: job[k] for k in ("received", "upserted", "failed", "batches", "docs_per_s")},
+                       "multipart": {k: mp[k] for k in ("received", "upserted", "batches")}},
+           "documents": app.MEM.collection.count(), "ts": time.time()}
+path = CWD / "kb_bulk_summary.json"
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[kb_bulk] ok -> {path}")
@@ -0,0 +1,72 @@
+# tests/local_vectors_stub.py
+# Backend vetorial local: o que foi gravado (memmap + snapshot + log) volta igual ao reabrir, inclusive
+# depois de crescer a capacidade, virar snapshot, apagar e reaproveitar linhas; log truncado não derruba a carga
+# nem engole as escritas seguintes
+import json, os, sys, time, pathlib, tempfile
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from local_vectors import LocalCollection, HashingEmbedding
+
+ef = HashingEmbedding(64)
+rng = np.random.default_rng(0)
+
+def state(c):
+    return {i: (c.docs[i], c.metas[i], np.asarray(c.mat[r]).tobytes()) for i, r in c.rows.items()}
+
+with tempfile.TemporaryDirectory() as tmp:
+    c = LocalCollection(tmp, ef)
+    # 3000 itens: capacidade cresce 1024 -> 4096; as remoções fazem o log passar do dobro e virar snapshot
+    for lo in range(0, 3000, 500):
+        ids = [f"d{i}" for i in range(lo, lo + 500)]
+        c.upsert(ids, [f"documento {i} sobre fretes" for i in range(lo, lo + 500)],
+                 [{"grupo": i % 3} for i in range(lo, lo + 500)], embeddings=rng.normal(size=(500, 64)))
+    c.delete(ids=[f"d{i}" for i in range(0, 100)])
+    c.delete(where={"grupo": 2})
+    assert c.gen >= 1 and c.cap == 4096, (c.gen, c.cap)
+    c.upsert(["novo-1", "d5"], ["texto novo", "documento 5 de volta"], [{"grupo": 0}, {"grupo": 1}])
+    before, q = state(c), rng.normal(size=(3, 64))
+    res_before = c.query(query_embeddings=q, n_results=10, where={"grupo": 1})
+
+    reopened = LocalCollection(tmp, ef)
+    assert reopened.count() == c.count() and state(reopened) == before
+    res_after = reopened.query(query_embeddings=q, n_results=10, where={"grupo": 1})
+    assert res_after == res_before
+    assert all(m["grupo"] == 1 for ms in res_after["metadatas"] for m in ms)
+    # linhas apagadas são reaproveitadas: o memmap não cresce com delete + insert
+    top = reopened.top
+    reopened.upsert([f"r{i}" for i in range(50)], [f"reuso {i}" for i in range(50)])
+    assert reopened.top == top
+
+    # queda no meio de uma escrita: última linha do log pela metade é ignorada
+    with open(reopened.log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "id": "quebrado", "row"')
+    again = LocalCollection(tmp, ef)
+    assert "quebrado" not in again.rows and again.count() == reopened.count()
+    # escritas depois da queda não podem colar na linha quebrada: sobrevivem a duas recargas
+    again.upsert(["pos-1", "pos-2"], ["depois da queda", "mais um depois da queda"])
+    again.delete(ids=["d150"])
+    for _ in range(2):
+        again = LocalCollection(tmp, ef)
+        assert {"pos-1", "pos-2"} <= set(again.rows) and "d150" not in again.rows
+        assert again.count() == reopened.count() + 1
+    again.upsert(["d150"], ["documento 150 de volta"], embeddings=[np.asarray(reopened.mat[reopened.rows["d150"]])])
+
+    # log de geração antiga (queda entre gravar o snapshot e trocar o log): descartado e recriado
+    with open(again.log_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "gen", "gen": again.gen - 1}) + "\n")
+    stale = LocalCollection(tmp, ef)
+    stale.upsert(["pos-3"], ["gravado sobre log antigo"])
+    assert "pos-3" in LocalCollection(tmp, ef).rows
+
+    # busca exata: o melhor resultado é o próprio vetor
+    row = again.rows["d150"]
+    hit = again.query(query_embeddings=[np.asarray(again.mat[row])], n_results=1)
+    assert hit["ids"] == [["d150"]] and abs(hit["distances"][0][0]) < 1e-5
+
+    summary = {"local_vectors": {"count": again.count(), "cap": again.cap, "gen": again.gen,
+                                 "files": sorted(os.listdir(tmp))}, "ts": time.time()}
+path = pathlib.Path("local_vectors_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[local_vectors] ok -> {path}")
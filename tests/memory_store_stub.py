@@ -0,0 +1,146 @@
+# tests/memory_store_stub.py
+# Guarda contra N+1: search_memory deve emitir um nº de consultas que não cresce com o grafo nem com hops
+import json, sys, time, pathlib, sqlite3, subprocess, tempfile, threading
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import memory_store as ms
+from ann_index import IVFIndex
+
+def count_queries(con, fn):
+    seen = []
+    # instruções aninhadas ("-- ...": leituras internas do FTS5, triggers) não são idas e voltas do Python
+    con.set_trace_callback(lambda sql: sql.startswith("-- ") or seen.append(sql))
+    try:
+        out = fn()
+    finally:
+        con.set_trace_callback(None)
+    return out, len(seen)
+
+def graph(n):
+    con = sqlite3.connect(":memory:")
+    ms.ensure_schema(con)
+    for i in range(n):
+        # min_cos baixo -> grafo denso (cada nó ligado aos 8 mais próximos)
+        ms.upsert_memory(con, f"memória {i} sobre fretes e clientes", relate_top_k=8, relate_min_cos=-1.0)
+    return con
+
+results = {}
+for n in (50, 400):
+    con = graph(n)
+    for hops in (1, 2, 3):
+        res, q = count_queries(con, lambda: ms.search_memory(con, "fretes e clientes", top_k=5, expand_hops=hops))
+        results[f"n={n},hops={hops}"] = {"queries": q, "nodes": len(res["nodes"])}
+        # PRAGMA database_list (3) + sync da matriz (1) + BM25 (1) + arestas novas do CSR (1) + hidratação/arestas (2):
+        # a expansão roda em memória, então o total não depende de hops
+        assert q <= 8, f"search_memory fez {q} consultas (n={n}, hops={hops})"
+
+# arestas em segundo plano: o upsert volta antes delas; flush_edges() espera o worker gravar
+with tempfile.TemporaryDirectory() as tmp:
+    ms.DB_PATH = f"{tmp}/bg.sqlite"
+    con = ms.connect()
+    ids = [ms.upsert_memory(con, f"nota {i} sobre fretes", relate_min_cos=-1.0, background=True) for i in range(300)]
+    assert ms.flush_edges(timeout=30), "flush_edges estourou o timeout"
+    st = ms.edge_queue_stats()[ms.DB_PATH]
+    assert st["queue_depth"] == 0 and st["built"] == len(ids), st
+    assert con.execute("SELECT COUNT(DISTINCT src) FROM edges").fetchone()[0] == len(ids)
+    results["edge_worker"] = st
+
+    # busca entre o insert e o worker: o snapshot CSR sincroniza antes das arestas existirem; depois do
+    # flush_edges() elas têm de estar nele (sem depender de outra busca para ressincronizar)
+    key = ms._db_key(con)
+    b, gate = ms.edge_builder(key), threading.Event()
+    real = b._build
+    b._build = lambda c, items: (gate.wait(10), real(c, items))[1]
+    nid = ms.upsert_memory(con, "nota nova sobre fretes e prazos", relate_min_cos=-1.0, background=True)
+    ms.search_memory(con, "fretes e prazos", top_k=3, expand_hops=1)
+    g = ms._GRAPHS[key]
+    assert not len(g.neighbors([nid])[0]), "arestas antes do worker?"
+    gate.set()
+    assert ms.flush_edges(timeout=30)
+    b._build = real
+    in_sql = con.execute("SELECT COUNT(*) FROM edges WHERE src=?", (nid,)).fetchone()[0]
+    out_deg = len(g.neighbors([nid])[0])
+    assert in_sql and out_deg == in_sql, (in_sql, out_deg)
+    assert len(g.expand([nid], hops=1)) > 1 and len(g.ppr({nid: 1.0})[0]) > 1
+    results["edge_worker_resync"] = {"edges_sql": in_sql, "out_degree_csr": out_deg}
+    ms.close_connections()
+
+# processo novo sobre um banco existente: o 1º upsert tem de enxergar os nós antigos (matriz carregada antes
+# do add), tanto nas arestas "related" quanto na busca
+with tempfile.TemporaryDirectory() as tmp:
+    ms.DB_PATH = f"{tmp}/reopen.sqlite"
+    old = ms.upsert_memories(ms.connect(), [f"pedido {i} de frete atrasado" for i in range(50)],
+                             relate_top_k=0)["ids"]
+    ms.close_connections()
+    child = f"""
+import sys; sys.path.insert(0, {str(pathlib.Path(__file__).resolve().parents[1])!r})
+import json, memory_store as ms
+ms.DB_PATH = {ms.DB_PATH!r}
+con = ms.connect()
+nid = ms.upsert_memory(con, "pedido novo de frete atrasado", relate_top_k=3, relate_min_cos=-1.0, background=False)
+rel = [d for (d,) in con.execute("SELECT dst FROM edges WHERE src=?", (nid,))]
+hits = [h["id"] for h in ms.search_memory(con, "pedido 7 de frete atrasado", top_k=5)["nodes"]]
+print(json.dumps({{"nid": nid, "related": rel, "hits": hits, "matrix": len(ms._vector_index(con).view()[0])}}))
+"""
+    out = json.loads(subprocess.run([sys.executable, "-c", child], check=True, capture_output=True,
+                                    text=True).stdout.strip().splitlines()[-1])
+    assert out["matrix"] == len(old) + 1, out
+    assert out["related"] and out["nid"] not in out["related"] and set(out["related"]) <= set(old), out
+    assert set(out["hits"]) & set(old), out
+    results["reopen_upsert"] = out
+
+# PPR por push contra a solução densa π = α·s·(I - (1-α)P)⁻¹, com as arestas ainda no delta e já compactadas:
+# o limiar eps*grau tem de usar o mesmo grau nos dois casos (erro L1 <= eps * nº de arestas)
+con = sqlite3.connect(":memory:")
+ms.ensure_schema(con)
+for i in range(60):
+    ms.upsert_memory(con, f"nota {i} sobre {'fretes' if i % 2 else 'reembolsos'} e prazo {i % 7}",
+                     relate_top_k=4, relate_min_cos=-1.0)
+g = ms.edge_graph(con)
+assert len(g.d_src) and not len(g.indices), "esperava arestas só no delta"
+g2 = ms.EdgeGraph()
+g2.sync(con)
+g2._compact()
+src, dst, w = g2.neighbors(np.arange(1, 61))
+N, seeds, alpha, eps = 61, {1: 1.0, 2: 0.5}, 0.15, 1e-4
+P = np.zeros((N, N))
+np.add.at(P, (src, dst), np.maximum(w, 0))  # ppr ignora pesos negativos
+P /= P.sum(1, keepdims=True).clip(1e-12)
+s = np.zeros(N)
+s[list(seeds)] = list(seeds.values())
+pi = np.linalg.solve((np.eye(N) - (1 - alpha) * P).T, alpha * s / s.sum())
+ppr_runs = []
+for gr in (g, g2):
+    p, pushes = gr.ppr(seeds, alpha, eps)
+    v = np.zeros(N)
+    v[list(p)] = list(p.values())
+    err = float(np.abs(v - pi).sum())
+    assert err <= eps * len(src), (err, eps * len(src))
+    ppr_runs.append({"pushes": pushes, "l1_err": round(err, 5)})
+assert ppr_runs[0]["pushes"] == ppr_runs[1]["pushes"], ppr_runs
+results["ppr_dense"] = ppr_runs
+
+# índice IVF: vetores somados depois do treino sobrevivem ao fechamento (save_ann_indexes)
+with tempfile.TemporaryDirectory() as tmp:
+    ms.DB_PATH = f"{tmp}/ivf.sqlite"
+    con = ms.connect()
+    ms.upsert_memories(con, [f"registro {i} de entrega" for i in range(200)], relate_top_k=0)
+    key = ms._db_key(con)
+    ms._ANN[key] = IVFIndex(64, min_train=100)  # treina com poucos nós
+    ms.most_similar(con, ms.embed("entrega"), mode="ivf")  # treino + save
+    ms.upsert_memories(con, [f"registro extra {i}" for i in range(30)], relate_top_k=0)
+    ms.most_similar(con, ms.embed("entrega"), mode="ivf")  # alcança os 30 novos só em memória
+    assert ms._ANN[key].dirty
+    ms.close_connections()
+    saved = IVFIndex.load(ms._ann_path(key))
+    assert len(saved) == 230 and saved.last_id == ms._vector_index(ms.connect()).last_id, (len(saved), saved.last_id)
+    results["ivf_persist"] = {"vectors": len(saved)}
+    del ms._ANN[key]
+    ms.close_connections()
+
+summary = {"query_counts": results, "ts": time.time()}
+path = pathlib.Path("memory_store_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[memory_store] ok -> {path}")
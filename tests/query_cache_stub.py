@@ -0,0 +1,60 @@
+# tests/query_cache_stub.py
+# Cache da recuperação: embedding calculado uma vez por texto, resultado reaproveitado dentro da mesma
+# época, bump() (escrita na coleção) invalida, TTL limita a defasagem e o LRU limita o tamanho
+import json, sys, time, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from query_cache import QueryCache
+
+calls = {"embed": 0, "search": 0}
+docs = ["política de frete"]
+
+def embed(text):
+    calls["embed"] += 1
+    return [float(len(text))]
+
+def search(query, k):
+    calls["search"] += 1
+    return list(docs[:k])
+
+qc = QueryCache(max_embeddings=4, max_results=8, ttl_s=60)
+for _ in range(5):
+    qc.embedding("frete grátis", embed)
+    assert qc.result("frete grátis", 3, lambda: search("frete grátis", 3)) == ["política de frete"]
+assert calls == {"embed": 1, "search": 1}, calls
+
+# k faz parte da chave
+qc.result("frete grátis", 1, lambda: search("frete grátis", 1))
+assert calls["search"] == 2
+
+# escrita: a época sobe e o resultado antigo não é mais servido
+docs.insert(0, "frete grátis acima de R$350")
+assert qc.bump() == 1
+assert qc.result("frete grátis", 3, lambda: search("frete grátis", 3))[0] == "frete grátis acima de R$350"
+assert calls["search"] == 3
+qc.embedding("frete grátis", embed)
+assert calls["embed"] == 1  # embedding da consulta não depende da coleção: continua válido
+
+# época lida antes da busca: escrita durante a busca não fica mascarada na época nova
+def racing():
+    qc.bump()
+    return search("reembolso", 3)
+qc.result("reembolso", 3, racing)
+qc.result("reembolso", 3, lambda: search("reembolso", 3))
+assert calls["search"] == 5, calls
+
+# TTL (escritas de outro processo não sobem a época local)
+short = QueryCache(ttl_s=0.05)
+short.result("q", 1, lambda: search("q", 1)); time.sleep(0.08); short.result("q", 1, lambda: search("q", 1))
+assert calls["search"] == 7
+
+# LRU limitado
+for i in range(10):
+    qc.embedding(f"consulta {i}", embed)
+st = qc.stats()
+assert st["embeddings"]["items"] == 4 and st["results"]["items"] <= 8, st
+
+summary = {"query_cache": st, "calls": calls, "ts": time.time()}
+path = pathlib.Path("query_cache_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[query_cache] ok -> {path}")
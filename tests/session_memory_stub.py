@@ -0,0 +1,54 @@
+# tests/session_memory_stub.py
+# Memória curta por sessão: sessões isoladas (inclusive no mesmo shard e sob threads), ring buffer de
+# tamanho fixo, teto de sessões (LRU) e expiração por TTL
+import json, sys, time, pathlib, threading
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from session_memory import SessionStore, DEFAULT_SESSION
+
+store = SessionStore(max_entries=3, max_sessions=64, ttl_s=60, shards=4)
+for i in range(5):
+    store.push(f"a{i}", "ana")
+    store.push(f"b{i}", "bruno")
+assert store.get("ana") == ["a2", "a3", "a4"] and store.get("bruno") == ["b2", "b3", "b4"]
+assert store.get("carla") == [] and store.get(None) == []
+store.push("padrão")
+assert store.get(None) == ["padrão"] == store.get(DEFAULT_SESSION)
+
+# duas sessões no mesmo shard continuam separadas
+same = [f"s{i}" for i in range(200) if store._shard(f"s{i}") is store._shard("ana")][:2]
+store.push("x", same[0]); store.push("y", same[1])
+assert store.get(same[0]) == ["x"] and store.get(same[1]) == ["y"]
+store.clear(same[0])
+assert store.get(same[0]) == [] and store.get(same[1]) == ["y"]
+
+# threads escrevendo em sessões próprias: nenhuma entrada cruza de sessão
+big = SessionStore(max_entries=50, max_sessions=1000, shards=8)
+def writer(t):
+    for i in range(50):
+        big.push(f"t{t}:{i}", f"sess-{t}")
+threads = [threading.Thread(target=writer, args=(t,)) for t in range(16)]
+for th in threads: th.start()
+for th in threads: th.join()
+for t in range(16):
+    assert big.get(f"sess-{t}") == [f"t{t}:{i}" for i in range(50)], t
+
+# teto de sessões: as menos usadas saem primeiro, o total fica limitado
+lru = SessionStore(max_entries=2, max_sessions=8, shards=1)
+for i in range(20):
+    lru.push("m", f"u{i}")
+st = lru.stats()
+assert st["sessions"] == 8 and st["evicted_lru"] == 12 and lru.get("u19") == ["m"] and lru.get("u0") == []
+
+# TTL: sessão parada expira na leitura e no push de outra sessão do shard
+ttl = SessionStore(ttl_s=0.05, shards=1)
+ttl.push("velho", "s1")
+time.sleep(0.08)
+assert ttl.get("s1") == []
+ttl.push("velho", "s2"); time.sleep(0.08); ttl.push("novo", "s3")
+assert ttl.stats()["sessions"] == 1 and ttl.stats()["evicted_ttl"] == 2
+
+summary = {"session_memory": {"store": store.stats(), "threads": big.stats(), "lru": st}, "ts": time.time()}
+path = pathlib.Path("session_memory_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[session_memory] ok -> {path}")
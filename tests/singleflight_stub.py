@@ -0,0 +1,70 @@
+# tests/singleflight_stub.py
+# Singleflight: cópias concorrentes da mesma chave rodam o trabalho uma vez só; chaves diferentes não se
+# misturam, a exceção do líder chega a todas as cópias e nada fica guardado depois que o voo termina
+import asyncio, json, sys, time, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from singleflight import SingleFlight, default_key
+
+async def main():
+    sf, calls = SingleFlight(), {"n": 0}
+
+    async def work(tag):
+        calls["n"] += 1
+        await asyncio.sleep(0.05)
+        return f"resposta {tag}"
+
+    # corpo normalizado: espaços e caixa não diferenciam as cópias
+    bodies = [{"query": "Plano  de MVP"}, {"query": "plano de mvp "}] * 10
+    outs = await asyncio.gather(*(sf.do("run", b, lambda: work("a")) for b in bodies))
+    assert calls["n"] == 1 and set(outs) == {"resposta a"}, (calls, set(outs))
+    assert default_key("run", bodies[0]) == default_key("run", bodies[1])
+
+    # identificadores não são normalizados: session_id só diferente na caixa = duas execuções
+    calls["n"] = 0
+    ana = [{"query": "Plano de MVP", "session_id": "Ana"}, {"query": "plano de mvp", "session_id": "ana"}]
+    outs = await asyncio.gather(*(sf.do("run", b, lambda b=b: work(b["session_id"])) for b in ana))
+    assert calls["n"] == 2 and outs == ["resposta Ana", "resposta ana"], (calls, outs)
+    assert default_key("run", ana[0]) != default_key("run", ana[1])
+    assert default_key("run", {**ana[0], "query": " plano  DE mvp"}) == default_key("run", ana[0])
+
+    # chaves distintas (outro corpo ou outro endpoint) executam cada uma
+    calls["n"] = 0
+    await asyncio.gather(sf.do("run", {"query": "x"}, lambda: work("x")),
+                         sf.do("run", {"query": "y"}, lambda: work("y")),
+                         sf.do("eval", {"query": "x"}, lambda: work("x")))
+    assert calls["n"] == 3, calls
+
+    # não é cache: depois que o voo termina, a mesma chave roda de novo
+    calls["n"] = 0
+    await sf.do("run", {"query": "x"}, lambda: work("x"))
+    assert calls["n"] == 1 and not sf.inflight
+
+    # erro do líder propaga para todas as cópias
+    async def boom():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("falhou")
+    res = await asyncio.gather(*(sf.do("run", {"query": "z"}, boom) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in res), res
+
+    # o líder cancelado (cliente desconectou) não derruba as cópias
+    calls["n"] = 0
+    leader = asyncio.ensure_future(sf.do("run", {"query": "w"}, lambda: work("w")))
+    await asyncio.sleep(0)
+    copy = asyncio.ensure_future(sf.do("run", {"query": "w"}, lambda: work("w")))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await copy == "resposta w" and calls["n"] == 1
+
+    # desligado: cada chamada executa
+    off, calls["n"] = SingleFlight(enabled=False), 0
+    await asyncio.gather(*(off.do("run", {"query": "x"}, lambda: work("x")) for _ in range(4)))
+    assert calls["n"] == 4
+    return sf.stats()
+
+stats = asyncio.run(main())
+assert stats["by_endpoint"]["run"]["coalesced"] >= 19 and stats["by_endpoint"]["run"]["errors"] == 1, stats
+summary = {"singleflight": stats, "ts": time.time()}
+path = pathlib.Path("singleflight_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[singleflight] ok -> {path}")
@@ -0,0 +1,45 @@
+# tests/token_budget_stub.py
+# Orçamento de contexto: fit_sections nunca passa do orçamento, respeita a prioridade das seções e
+# trunca só o último trecho; a contagem (tiktoken ou len/4) vem do cache na segunda vez
+import json, sys, time, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from token_budget import TokenCounter, fit_sections, TRUNC_MARK
+
+tc = TokenCounter()
+long_doc = " ".join(f"cláusula {i} do contrato de frete com prazo e multa." for i in range(200))
+sections = {
+    "long": [long_doc, "política de reembolso em 7 dias"],
+    "short": [f"[rascunho {i}] ponto de atenção sobre entregas atrasadas" for i in range(10)],
+}
+results = {}
+for budget in (40, 150, 600, 5000):
+    chosen, used = fit_sections(tc, sections, ["long", "short"], budget, per_item_max=400)
+    total = sum(tc.count(t) for ts in chosen.values() for t in ts)
+    assert used == total and used <= budget, (budget, used, total)
+    # prioridade: "short" só entra depois que todo o "long" couber
+    if chosen["short"]:
+        assert len(chosen["long"]) == len(sections["long"]), budget
+    # cortado só o trecho que não cabia; o resto entra inteiro
+    cut = [t for ts in chosen.values() for t in ts if t.endswith(TRUNC_MARK)]
+    assert all(t in sections["long"] + sections["short"] for ts in chosen.values() for t in ts if t not in cut)
+    results[f"budget={budget}"] = {"used": used, "long": len(chosen["long"]), "short": len(chosen["short"]),
+                                   "truncated": len(cut)}
+assert results["budget=5000"]["short"] == 10 and results["budget=5000"]["truncated"] == 1  # per_item_max
+assert results["budget=40"]["short"] == 0
+
+# truncate: prefixo com a marca, dentro do limite
+t = tc.truncate(long_doc, 64)
+assert t.endswith(TRUNC_MARK) and tc.count(t) <= 64 and long_doc.startswith(t[:-len(TRUNC_MARK)])
+assert tc.truncate("curto", 64) == "curto" and tc.truncate(long_doc, 0) == ""
+
+# cache: contagens repetidas não recontam
+before = tc.stats()["hits"]
+for _ in range(5):
+    tc.count(long_doc)
+assert tc.stats()["hits"] == before + 5
+
+summary = {"token_budget": results, "exact": tc.exact, "ts": time.time()}
+path = pathlib.Path("token_budget_summary.json")
+path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+print(f"[token_budget] ok -> {path}")
@@ -0,0 +1,122 @@
+# token_budget.py
+# Contagem de tokens (tiktoken) e montagem de contexto dentro de um orçamento
+# - contagens em cache LRU por texto: entradas da memória curta e documentos do KB são contados uma vez
+# - sem tiktoken (ou sem o arquivo do encoding, que é baixado na 1ª vez) cai na estimativa len/4
+# - fit_sections() preenche as seções por prioridade e trunca o último trecho que não cabe inteiro
+from __future__ import annotations
+import logging, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except Exception:  # opcional: sem ele a contagem é estimada
+    tiktoken = None
+
+TRUNC_MARK = " […]"
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4.1", max_items: int = 4096):
+        self.model = model
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.cache: "OrderedDict[str, int]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+        self._enc = None
+        self._enc_loaded = False
+
+    @property
+    def enc(self):
+        if not self._enc_loaded:
+            self._enc_loaded = True
+            if tiktoken is not None:
+                try:
+                    try:
+                        self._enc = tiktoken.encoding_for_model(self.model)
+                    except KeyError:
+                        self._enc = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logging.warning("tiktoken sem encoding (%s); usando estimativa len/4", e)
+        return self._enc
+
+    @property
+    def exact(self) -> bool:
+        return self.enc is not None
+
+    def count_raw(self, text: str) -> int:
+        """Contagem sem passar pelo cache (para textos vistos uma vez só, ex.: frases no fatiamento)."""
+        enc = self.enc
+        if enc is None:
+            return (len(text) + 3) // 4
+        return len(enc.encode(text, disallowed_special=()))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        with self.lock:
+            n = self.cache.get(text)
+            if n is not None:
+                self.cache.move_to_end(text)
+                self.counters["hits"] += 1
+                return n
+            self.counters["misses"] += 1
+        n = self.count_raw(text)
+        with self.lock:
+            self.cache[text] = n
+            while len(self.cache) > self.max_items:
+                self.cache.popitem(last=False)
+        return n
+
+    def count_messages(self, messages: Sequence[Dict[str, str]]) -> int:
+        # ~4 tokens de envelope por mensagem + 3 de priming da resposta (formato do chat da OpenAI)
+        return sum(4 + self.count(m.get("content") or "") for m in messages) + 3
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Prefixo de text com no máximo max_tokens (incluindo a marca de corte)."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        room = max(0, max_tokens - self.count(TRUNC_MARK))
+        enc = self.enc
+        if enc is None:
+            cut = text[: room * 4]
+        else:
+            cut = enc.decode(enc.encode(text, disallowed_special=())[:room])
+        # corta em fronteira de linha/palavra quando possível, para não deixar meia frase
+        for sep in ("\n", " "):
+            i = cut.rfind(sep)
+            if i > len(cut) // 2:
+                cut = cut[:i]
+                break
+        return cut.rstrip() + TRUNC_MARK
+
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            c = dict(self.counters)
+            c["items"] = len(self.cache)
+        total = c["hits"] + c["misses"]
+        c["hit_rate"] = round(c["hits"] / total, 4) if total else 0.0
+        c["exact"] = self.exact
+        return c
+
+def fit_sections(counter: TokenCounter, sections: Dict[str, List[str]], priority: Sequence[str], budget: int,
+                 per_item_max: Optional[int] = None, min_piece: int = 48) -> Tuple[Dict[str, List[str]], int]:
+    """Escolhe trechos de cada seção, na ordem de prioridade, até esgotar o orçamento.
+
+    Dentro de cada seção a ordem da lista é a ordem de preferência. Um trecho maior que per_item_max
+    (ou que o saldo restante) é truncado, desde que sobrem ao menos min_piece tokens para ele.
+    Devolve ({seção: trechos escolhidos, na ordem da lista de entrada}, tokens usados).
+    """
+    chosen: Dict[str, List[str]] = {name: [] for name in sections}
+    left = budget
+    for name in priority:
+        for text in sections.get(name) or []:
+            if left < min_piece:
+                break
+            cap = min(left, per_item_max or left)
+            if counter.count(text) > cap:
+                text = counter.truncate(text, cap)
+            chosen[name].append(text)
+            left -= counter.count(text)
+    return chosen, budget - left
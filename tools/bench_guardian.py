@@ -0,0 +1,55 @@
+# tools/bench_guardian.py
+# Benchmark do guardião: laço antigo (lower + substring por termo) vs guardian.Automaton
+# Uso: python tools/bench_guardian.py --kb 100 --terms 5 100 1000 5000
+from __future__ import annotations
+import argparse, random, string, sys, time, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from guardian import Automaton, DEFAULT_BANNED
+
+def legacy_guardian_check(text, banned):
+    # cópia da implementação anterior de app.guardian_check
+    for b in banned:
+        if b.lower() in text.lower():
+            return False, f"Conteúdo bloqueado por política ('{b}')."
+    return True, "OK"
+
+def make_terms(n, rng):
+    extra = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14))) for _ in range(n)]
+    return (DEFAULT_BANNED + extra)[:n]
+
+def make_text(kb, rng):
+    words = ["política", "frete", "cliente", "prazo", "pedido", "entrega", "oferta", "whatsapp", "R$350"]
+    out, size = [], 0
+    while size < kb * 1024:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+def timed(fn, reps=5):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1000.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--kb", type=int, default=100)
+    ap.add_argument("--terms", type=int, nargs="+", default=[5, 100, 1000, 5000])
+    args = ap.parse_args()
+    rng = random.Random(0)
+    text = make_text(args.kb, rng)  # texto limpo: pior caso (varre tudo)
+    print(f"texto {len(text) // 1024} KB, sem ocorrências")
+    print(f"{'termos':>7} | {'legado ms':>10} | {'novo ms':>11} | {'build ms':>8}")
+    for n in args.terms:
+        terms = make_terms(n, rng)
+        t_build = timed(lambda: Automaton(terms), 1)
+        ac = Automaton(terms)
+        assert legacy_guardian_check(text, terms)[0] == (ac.first(text) is None)
+        t_old = timed(lambda: legacy_guardian_check(text, terms), 1 if n > 100 else 5)
+        t_new = timed(lambda: ac.first(text))
+        print(f"{n:>7} | {t_old:>10.1f} | {t_new:>11.1f} | {t_build:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# tools/bench_memory_store.py
+# Benchmark de most_similar: legado (JSON + loop Python) vs BLOB float32 + matriz NumPy
+# Uso: python tools/bench_memory_store.py --sizes 10000 100000 1000000
+#      python tools/bench_memory_store.py --ann --nprobe 4 8 16   (exato vs IVF: latência e recall@k)
+from __future__ import annotations
+import argparse, json, sqlite3, sys, tempfile, time, pathlib
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+import memory_store as ms
+
+def legacy_most_similar(con, vec, top_k=5):
+    # cópia fiel da implementação anterior (embedding TEXT/JSON)
+    scored = []
+    for nid, emb_json in con.execute("SELECT id, embedding FROM nodes").fetchall():
+        scored.append((nid, ms.cos(vec, json.loads(emb_json))))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:top_k]
+
+def build_db(path: str, n: int, dim: int, as_json: bool, clusters: int = 0) -> sqlite3.Connection:
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE nodes(id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, ts REAL, source TEXT, meta TEXT)")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) if clusters else None
+    for start in range(0, n, 50_000):
+        m = rng.standard_normal((min(50_000, n - start), dim)).astype(np.float32)
+        if centers is not None:  # dados com estrutura (embeddings reais agrupam por tema)
+            m = 0.5 * m + centers[rng.integers(0, clusters, len(m))]
+        m /= np.linalg.norm(m, axis=1, keepdims=True)
+        enc = (lambda v: json.dumps(v.tolist())) if as_json else ms.pack_vec
+        con.executemany("INSERT INTO nodes(text, embedding) VALUES(?,?)",
+                        ((f"n{start + i}", enc(v)) for i, v in enumerate(m)))
+    con.commit()
+    return con
+
+def timed(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1000.0
+
+def bench_ann(con, n, dim, top_k, nprobes, n_queries=50):
+    rng = np.random.default_rng(1)
+    qs = rng.standard_normal((n_queries, dim)).astype(np.float32)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+    t0 = time.perf_counter()
+    ms.most_similar(con, qs[0], top_k, mode="ivf")  # treina o índice
+    t_train = (time.perf_counter() - t0) * 1000.0
+    truth = [{i for i, _ in ms.most_similar(con, q, top_k, mode="exact")} for q in qs]
+    t_exact = timed(lambda: [ms.most_similar(con, q, top_k, mode="exact") for q in qs], 1) / n_queries
+    for p in nprobes:
+        got = [{i for i, _ in ms.most_similar(con, q, top_k, mode="ivf", nprobe=p)} for q in qs]
+        t_ivf = timed(lambda: [ms.most_similar(con, q, top_k, mode="ivf", nprobe=p) for q in qs], 1) / n_queries
+        recall = np.mean([len(g & t) / top_k for g, t in zip(got, truth)])
+        print(f"{n:>9} | nprobe={p:<4} | exato {t_exact:>7.2f} ms | ivf {t_ivf:>7.2f} ms | "
+              f"recall@{top_k} {recall:.3f} | treino {t_train:.0f} ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--dim", type=int, default=64)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--reps", type=int, default=20)
+    ap.add_argument("--ann", action="store_true", help="compara exato vs IVF em vez do legado")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    ap.add_argument("--clusters", type=int, default=256, help="grupos sintéticos no modo --ann (0 = uniforme)")
+    args = ap.parse_args()
+    if args.ann:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in args.sizes:
+                con = build_db(f"{tmp}/ann_{n}.sqlite", n, args.dim, as_json=False, clusters=args.clusters)
+                bench_ann(con, n, args.dim, args.top_k, args.nprobe)
+                con.close()
+        return
+    q = ms.embed("consulta de benchmark", dim=args.dim)
+    print(f"{'N':>9} | {'legado ms':>10} | {'1ª consulta ms':>14} | {'quente ms':>9} | speedup")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            old = build_db(f"{tmp}/old_{n}.sqlite", n, args.dim, as_json=True)
+            t_old = timed(lambda: legacy_most_similar(old, q, args.top_k), 1)
+            old.close()
+            new = build_db(f"{tmp}/new_{n}.sqlite", n, args.dim, as_json=False)
+            t_cold = timed(lambda: ms.most_similar(new, q, args.top_k), 1)  # inclui carga da matriz
+            t_warm = timed(lambda: ms.most_similar(new, q, args.top_k), args.reps)
+            new.close()
+            print(f"{n:>9} | {t_old:>10.1f} | {t_cold:>14.1f} | {t_warm:>9.2f} | {t_old / t_warm:>6.0f}x")
+
+if __name__ == "__main__":
+    main()